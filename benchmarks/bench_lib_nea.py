@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+
+# Benchmarks for src/lib_nea.py, against the recorded v1 fixtures
+
+from .common import load_fixture, random_points, stub_http
+
+import lib_nea
+
+
+class Parsers:
+    def setup(self):
+        stub_http()
+        self.d_2hr = load_fixture('2hr.json')
+        self.d_24hr = load_fixture('24hr.json')
+        self.d_psi = load_fixture('psi.json')
+        self.periods = self.d_24hr['items'][0]['periods']
+        lib_nea.LATITUDE, lib_nea.LONGITUDE = 1.290270, 103.851959
+
+    def time_parse_2hr(self):
+        lib_nea.parse_2hr(self.d_2hr)
+
+    def time_parse_2hr_snapshot(self):
+        lib_nea.parse_2hr_snapshot(self.d_2hr)
+
+    def time_parse_periods(self):
+        lib_nea.parse_periods(self.periods, by_period=False)
+
+    def time_parse_periods_uncached(self):
+        lib_nea._period_cache.clear()
+        lib_nea.emojify.cache_clear()
+        lib_nea.parse_periods(self.periods, by_period=False)
+
+    def time_emojify_uncached(self):
+        lib_nea.emojify.cache_clear()
+        lib_nea.emojify('Heavy Thundery Showers with Gusty Winds')
+
+    def time_now_cast(self):
+        lib_nea.now_cast(self.d_2hr)
+
+    def time_forecast_24hr(self):
+        lib_nea.forecast_24hr(self.d_24hr)
+
+    def time_forecast_psi_all(self):
+        lib_nea.forecast_psi_all(self.d_psi)
+
+    def time_dashboard(self):
+        lib_nea.dashboard(['2hr', '24hr', 'pm25', 'psi'])
+
+
+class NearestLocation:
+    params = [ 1000, 100000 ]
+    param_names = [ 'points' ]
+    timeout = 120
+
+    def setup(self, n):
+        self.places = load_fixture('2hr.json')['area_metadata']
+        self.index = lib_nea.area_index(self.places)
+        self.points = random_points(n)
+
+    def time_get_nearest_location(self, n):
+        places, index = self.places, self.index
+        for x in self.points:
+            lib_nea.get_nearest_location(x, places, index)
+
+
+class RenderBatch:
+    params = [ 1000, 10000 ]
+    param_names = [ 'users' ]
+
+    def setup(self, n):
+        stub_http()
+        self.feeds = { key: load_fixture(f'{key}.json') for key in [ '2hr', 'pm25', 'psi' ] }
+        self.users = [ (i, lat, lon) for i, (lat, lon) in enumerate(random_points(n)) ]
+
+    def time_render_batch(self, n):
+        lib_nea.NEAClient().render_batch(self.users, ('2hr', 'pm25', 'psi', 'psi_all'), feeds=self.feeds)
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+# Benchmarks for mcp/nea_tools.py, against the recorded v2 fixtures.
+# Skipped when the mcp dependencies (strands, numpy) are not installed.
+
+import itertools
+
+from .common import import_nea_tools, load_fixture, random_points
+
+
+class Conversion:
+    def setup(self):
+        self.nea_tools = import_nea_tools()
+        self.d_2hr = load_fixture('2hr-realtime.json')
+        self.d_24hr = load_fixture('24hr-realtime.json')
+
+    def time_convert_weather_data(self):
+        self.nea_tools.convert_weather_data(self.d_2hr)
+
+    def time_organize_weather_by_region(self):
+        self.nea_tools.organize_weather_by_region(self.d_24hr)
+
+    def time_get_forecast_expiry(self):
+        self.nea_tools.get_forecast_expiry('2hr-realtime', self.d_2hr)
+
+
+class NearestLocation:
+    params = [ 1000, 100000 ]
+    param_names = [ 'points' ]
+    timeout = 120
+
+    def setup(self, n):
+        self.nea_tools = import_nea_tools()
+        self.points = random_points(n)
+        self.latitudes = [ lat for lat, lon in self.points ]
+        self.longitudes = [ lon for lat, lon in self.points ]
+        # Fill the forecast cache before timing
+        self.nea_tools.init_or_refresh_2hr_snapshot()
+
+    def time_get_nearest_location_from_lat_long(self, n):
+        nearest = self.nea_tools.get_nearest_location_from_lat_long
+        for lat, lon in self.points:
+            nearest(lat, lon)
+
+    def time_get_regions_and_areas_from_coordinates(self, n):
+        self.nea_tools.get_regions_and_areas_from_coordinates(self.latitudes, self.longitudes)
+
+
+class Geocode:
+    def setup(self):
+        self.nea_tools = import_nea_tools()
+        self.counter = itertools.count()
+        self.nea_tools.geocode_address('2 Orchard Turn')
+
+    def time_geocode_address_cached(self):
+        self.nea_tools.geocode_address('2 Orchard Turn')
+
+    def time_geocode_address_uncached(self):
+        # A new address every call: cache miss, stubbed OneMap request, parse and store
+        self.nea_tools.geocode_address(f'{next(self.counter)} Orchard Road')
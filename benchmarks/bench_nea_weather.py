@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+# Benchmarks for src/nea_weather.py over a synthetic year of archived
+# 2hr forecasts (data/forecast-*.json, built from the 2hr fixture)
+
+import datetime
+import json
+import os
+import random
+
+from .common import load_fixture
+
+import nea_weather
+
+
+START = datetime.datetime(2023, 1, 1)
+END = datetime.datetime(2023, 12, 31)
+ITEMS_PER_DAY = 48
+
+
+def write_forecast_year():
+    d = load_fixture('2hr.json')
+    areas = [ area['name'] for area in d['area_metadata'] ]
+    conditions = sorted({ forecast['forecast'] for forecast in d['items'][0]['forecasts'] })
+    rng = random.Random(0)
+    os.makedirs('data', exist_ok=True)
+    for x in nea_weather.get_datetime_array(START, END):
+        items = []
+        for i in range(ITEMS_PER_DAY):
+            t = x + datetime.timedelta(minutes=30 * i)
+            items.append({
+                'update_timestamp': t.strftime('%Y-%m-%dT%H:%M:%S+08:00'),
+                'timestamp': t.strftime('%Y-%m-%dT%H:%M:%S+08:00'),
+                'valid_period': {
+                    'start': t.strftime('%Y-%m-%dT%H:%M:%S+08:00'),
+                    'end': (t + datetime.timedelta(hours=2)).strftime('%Y-%m-%dT%H:%M:%S+08:00')
+                },
+                'forecasts': [ {'area': area, 'forecast': rng.choice(conditions)} for area in areas ]
+            })
+        with open(nea_weather.forecast_filename(x.strftime('%Y-%m-%d')), 'w') as f:
+            json.dump({'area_metadata': d['area_metadata'], 'items': items, 'api_info': d['api_info']}, f)
+
+
+class ForecastYear:
+    timeout = 600
+    number = 1
+    repeat = (1, 3, 300)
+
+    def setup_cache(self):
+        # Runs once; the directory is passed to every benchmark below
+        write_forecast_year()
+        return os.getcwd()
+
+    def setup(self, root):
+        os.chdir(root)
+        for filename in [ 'forecasts.csv', nea_weather.manifest_filename('forecasts.csv'),
+                          nea_weather.keys_filename('forecasts.csv') ]:
+            if os.path.isfile(filename):
+                os.remove(filename)
+
+    def time_parse_forecasts(self, root):
+        nea_weather.parse_forecasts('forecasts.csv', START, END)
+
+    def peakmem_parse_forecasts(self, root):
+        nea_weather.parse_forecasts('forecasts.csv', START, END)
+
+    def time_iter_forecast_rows(self, root):
+        files = nea_weather.iter_forecast_files(START, END)
+        for row in nea_weather.iter_forecast_rows(nea_weather.iter_forecast_items(files)):
+            pass
+
+    def time_iter_forecast_snapshots(self, root):
+        for snapshot in nea_weather.iter_forecast_snapshots(nea_weather.iter_forecast_files(START, END)):
+            pass
@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+
+# Re-records the benchmark fixtures from the live APIs:
+#
+#   python benchmarks/record_fixtures.py
+#
+# Every feed in lib_nea.urls and forecast_feeds.url_list is fetched once and
+# written to benchmarks/fixtures/, plus one OneMap search for geocoding.
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+import nea_http
+import lib_nea
+
+from forecast_feeds import url_list
+
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# Same as nea_tools.ONEMAP_URL (importing nea_tools would fetch the feeds already)
+ONEMAP_URL = 'https://developers.onemap.sg/commonapi/search'
+
+
+def record(name, url, params=None):
+    response = nea_http.get(url, params=params)
+    response.raise_for_status()
+    filename = os.path.join(FIXTURES, name)
+    with open(filename, 'w') as f:
+        json.dump(response.json(), f, indent=1, ensure_ascii=False)
+    print(f'{url} -> {filename}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Re-record the benchmark fixtures from the live APIs')
+    parser.add_argument('--address', default='2 Orchard Turn', help='Address for the OneMap search fixture')
+    args = parser.parse_args()
+
+    for key, url in lib_nea.urls.items():
+        record(f'{key}.json', url)
+    for id, url in url_list.items():
+        record(f'{id}.json', url)
+    record('onemap-search.json', ONEMAP_URL, {'searchVal': args.address, 'returnGeom': 'Y', 'getAddrDetails': 'Y'})
@@ -6,6 +6,10 @@ class WeatherApp {
         this.map = null;
         this.userMarker = null;
         this.darkMode = false;
+        // Base URL of a local nea_server.py (e.g. 'http://localhost:8080'), if any:
+        // all three forecasts then come from its combined, browser-cacheable endpoint
+        this.apiBase = window.NEA_API_BASE || null;
+        this.combined = null;
         this.init();
     }
 
@@ -70,22 +74,47 @@ class WeatherApp {
         }
     }
 
+    fetchCombined() {
+        // One request for all three feeds: the loaders share the same promise,
+        // which is dropped after a failure (to retry) or after 5 minutes (to refresh)
+        if (!this.combined) {
+            this.combined = fetch(`${this.apiBase}/api/forecast`).then(response => {
+                if (!response.ok) {
+                    throw new Error(`HTTP ${response.status}`);
+                }
+                return response.json();
+            });
+            this.combined.catch(() => { this.combined = null; });
+            setTimeout(() => { this.combined = null; }, 5 * 60 * 1000);
+        }
+        return this.combined;
+    }
+
+    async fetchFeed(name, url) {
+        if (this.apiBase) {
+            const data = await this.fetchCombined();
+            if (!data[name]) {
+                throw new Error(`${name} forecast unavailable`);
+            }
+            return data[name];
+        }
+        const response = await fetch(url);
+        return await response.json();
+    }
+
     async fetch2HourForecast() {
-        const response = await fetch('https://api-open.data.gov.sg/v2/real-time/api/two-hr-forecast');
-        const data = await response.json();
+        const data = await this.fetchFeed('2hr', 'https://api-open.data.gov.sg/v2/real-time/api/two-hr-forecast');
         console.log('Full 2-hour API response:', data); // Debug log to see all available data
         return this.convert2HourData(data);
     }
 
     async fetch24HourForecast() {
-        const response = await fetch('https://api-open.data.gov.sg/v2/real-time/api/twenty-four-hr-forecast');
-        const data = await response.json();
+        const data = await this.fetchFeed('24hr', 'https://api-open.data.gov.sg/v2/real-time/api/twenty-four-hr-forecast');
         return this.organize24HourData(data);
     }
 
     async fetch4DayOutlook() {
-        const response = await fetch('https://api-open.data.gov.sg/v2/real-time/api/four-day-outlook');
-        return await response.json();
+        return await this.fetchFeed('4day', 'https://api-open.data.gov.sg/v2/real-time/api/four-day-outlook');
     }
 
     convert2HourData(data) {
@@ -4,15 +4,20 @@ import os
 import boto3
 import chainlit as cl
 import logging
+import threading
+import time
 
 from botocore.config import Config
 from strands import Agent
 from strands.models.bedrock import BedrockModel
 
-from nea_tools import get_weather_for_singapore_address #, geocode_address
-from weather_tools import get_current_weather, get_hourly_forecast, get_forecast_3hour
+# The async tool variants keep slow upstream APIs from blocking the event loop
+# (and with it every other chat session)
+from nea_tools import get_weather_for_singapore_address_async #, geocode_address_async
+from weather_tools import get_current_weather_async, get_hourly_forecast_async, get_forecast_3hour_async
 
 logger = logging.getLogger('__name__')
+logger.setLevel(logging.INFO)
 logging.getLogger("strands").setLevel(logging.INFO)
 logging.basicConfig(
     format="%(levelname)s | %(name)s | %(message)s",
@@ -41,50 +46,116 @@ You have access to tools that can fetch current weather data and forecasts, as w
 When providing weather information, include relevant details like temperature, conditions, etc.
 """
 
+# ----- Shared Clients -----
+# The boto3 session and the Bedrock models (each holding a botocore client) are
+# created once per process and shared by every chat session. Only the Agent
+# objects, which hold the conversation, are created per session.
+_clients_lock = threading.Lock()
+_boto_session = None
+_models = {}
+
+
+def get_boto_session():
+    global _boto_session
+    if _boto_session is None:
+        with _clients_lock:
+            if _boto_session is None:
+                if AWS_ACCESS_KEY and AWS_SECRET_ACCESS_KEY and AWS_SESSION_TOKEN:
+                    _boto_session = boto3.Session(
+                        aws_access_key_id=AWS_ACCESS_KEY,
+                        aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+                        aws_session_token=AWS_SESSION_TOKEN,
+                        region_name=AWS_DEFAULT_REGION
+                    )
+                else:
+                    _boto_session = boto3.Session()
+    return _boto_session
+
+
+def get_model(model_id=BEDROCK_MODEL_ID):
+    """
+    Returns the shared BedrockModel for `model_id`, creating it on first use
+    """
+    model = _models.get(model_id)
+    if model is None:
+        session = get_boto_session()
+        with _clients_lock:
+            model = _models.get(model_id)
+            if model is None:
+                model = _models[model_id] = BedrockModel(
+                    model_id=model_id,
+                    max_tokens=2048,
+                    boto_client_config=Config(
+                        read_timeout=120,
+                        connect_timeout=120,
+                        retries=dict(max_attempts=3, mode="adaptive"),
+                    ),
+                    boto_session=session
+                )
+    return model
+
+
+# ----- Session Metrics -----
+session_stats = {'count': 0, 'sum_ms': 0.0, 'max_ms': 0.0, 'last_ms': 0.0}
+
+
+def record_session_latency(seconds):
+    ms = seconds * 1000
+    with _clients_lock:
+        session_stats['count'] += 1
+        session_stats['sum_ms'] += ms
+        session_stats['max_ms'] = max(session_stats['max_ms'], ms)
+        session_stats['last_ms'] = ms
+        mean_ms = session_stats['sum_ms'] / session_stats['count']
+    logger.info(f'Agent session created in {ms:.1f} ms (sessions={session_stats["count"]}, mean={mean_ms:.1f} ms, max={session_stats["max_ms"]:.1f} ms)')
+
+
 # Initialize the agent
 def init_agent():
-    # Create AWS session
-    if AWS_ACCESS_KEY and AWS_SECRET_ACCESS_KEY and AWS_SESSION_TOKEN:
-        session = boto3.Session(
-            aws_access_key_id=AWS_ACCESS_KEY,
-            aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-            aws_session_token=AWS_SESSION_TOKEN,
-            region_name=AWS_DEFAULT_REGION
-        )
-    else:
-        session = boto3.Session()
-
-    # Configure Bedrock model
-    model = BedrockModel(
-        model_id=BEDROCK_MODEL_ID,
-        max_tokens=2048,
-        boto_client_config=Config(
-            read_timeout=120,
-            connect_timeout=120,
-            retries=dict(max_attempts=3, mode="adaptive"),
-        ),
-        boto_session=session
-    )
+    # Shared model client, created once per process (see get_model)
+    model = get_model()
 
     # Create agent with our weather tools
     nea_agent = Agent(
         model = model,
         system_prompt = SYSTEM_PROMPT_NEA,
-        tools = [ get_weather_for_singapore_address ] # , geocode_address ]
+        tools = [ get_weather_for_singapore_address_async ] # , geocode_address_async ]
     )
 
     agent = Agent(
         model = model,
         system_prompt = SYSTEM_PROMPT,
-        tools = [ get_current_weather, get_hourly_forecast, get_forecast_3hour, nea_agent ]
+        tools = [ get_current_weather_async, get_hourly_forecast_async, get_forecast_3hour_async, nea_agent ]
     )
     return agent
 
 
+def warm_up():
+    """
+    Creates the shared clients and resolves AWS credentials ahead of the
+    first chat session, so that it does not pay for them
+    """
+    t0 = time.perf_counter()
+    try:
+        get_boto_session().get_credentials()
+        get_model()
+        init_agent()
+    except Exception as e:
+        logger.warning(f'Warm-up failed: {e}')
+        return
+    logger.info(f'Warm-up done in {(time.perf_counter() - t0) * 1000:.1f} ms')
+
+
+# Warm up in the background when the app is loaded, without delaying startup
+threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
+
+
 @cl.on_chat_start
 async def on_chat_start(show_welcome_message = False):
-    # Initialize the agent
+    # Initialize the agent (the model clients are shared, only the Agent state is new)
+    t0 = time.perf_counter()
     agent = init_agent()
+    record_session_latency(time.perf_counter() - t0)
     
     # Store the agent in the user session
     cl.user_session.set("agent", agent)
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+
+import argparse
+import csv
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+
+# Sentinel returned by GeocodeCache.lookup() when nothing is cached for a key.
+# A cached negative result is returned as None instead.
+MISS = object()
+
+DEFAULT_DB_FILE = os.getenv('NEA_GEOCODE_DB', 'geocode-cache.sqlite3')
+
+
+def is_sg_postal(address_or_postal: str) -> bool:
+    """
+    Returns True if the input looks like a Singapore postal code (6 digits)
+    """
+    x = address_or_postal.strip()
+    return x.isdigit() and len(x) == 6
+
+
+def normalize_address(address_or_postal: str) -> str:
+    """
+    Normalizes an address or postal code into a cache key.
+
+    Postal codes become 'postal:<6 digits>'. Addresses are lowercased,
+    stripped of punctuation and have their whitespace collapsed, so that
+    'Orchard Road, Singapore' and 'orchard road singapore' share a key.
+    """
+    x = address_or_postal.strip()
+    if is_sg_postal(x):
+        return f'postal:{x}'
+    x = re.sub(r'[^\w\s#-]', ' ', x.lower())
+    x = re.sub(r'\s+', ' ', x).strip()
+    return f'addr:{x}'
+
+
+class GeocodeCache:
+    """
+    Persistent geocode store backed by SQLite, with an in-memory LRU in front.
+
+    Positive results are kept indefinitely (coordinates of an address do not
+    change); negative results ("no match") are kept for `negative_ttl` seconds
+    so that unknown addresses are retried eventually.
+
+    Args:
+        db_file (str): Path to the SQLite database (':memory:' for a throwaway store)
+        lru_size (int): Number of entries kept in the in-memory LRU
+        negative_ttl (float): Lifetime of a negative result in seconds
+    """
+
+    def __init__(self, db_file: str = DEFAULT_DB_FILE, lru_size: int = 4096, negative_ttl: float = 86400):
+        self.lru_size = lru_size
+        self.negative_ttl = negative_ttl
+        self.stats = {'lru_hits': 0, 'db_hits': 0, 'misses': 0}
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_file, check_same_thread=False)
+        if db_file != ':memory:':
+            self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS geocode ('
+            ' key TEXT PRIMARY KEY,'
+            ' latitude REAL,'
+            ' longitude REAL,'
+            ' source TEXT,'
+            ' updated REAL NOT NULL)'
+        )
+        self._db.commit()
+
+    def _lru_put(self, key, value):
+        self._lru[key] = value
+        self._lru.move_to_end(key)
+        if len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def lookup(self, address_or_postal: str):
+        """
+        Looks up a cached geocode result.
+
+        Returns:
+            tuple[float, float]: (latitude, longitude) for a cached positive result
+            None: for a cached negative result that has not expired
+            MISS: if nothing usable is cached
+        """
+        key = normalize_address(address_or_postal)
+        now = time.time()
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is not None:
+                coords, expires = entry
+                if expires is None or expires > now:
+                    self._lru.move_to_end(key)
+                    self.stats['lru_hits'] += 1
+                    return coords
+                del self._lru[key]
+
+            row = self._db.execute(
+                'SELECT latitude, longitude, updated FROM geocode WHERE key = ?', (key,)
+            ).fetchone()
+            if row is not None:
+                latitude, longitude, updated = row
+                if latitude is not None:
+                    coords, expires = (latitude, longitude), None
+                else:
+                    coords, expires = None, updated + self.negative_ttl
+                if expires is None or expires > now:
+                    self._lru_put(key, (coords, expires))
+                    self.stats['db_hits'] += 1
+                    return coords
+
+            self.stats['misses'] += 1
+            return MISS
+
+    def store(self, address_or_postal: str, coords: Optional[Tuple[float, float]],
+              source: str = '', postal: Optional[str] = None):
+        """
+        Stores a geocode result. Pass coords=None to record a negative result.
+
+        If the geocoder also reported the postal code of the match, it is
+        stored under its own key so later postal-code lookups hit the cache.
+        """
+        now = time.time()
+        keys = [ normalize_address(address_or_postal) ]
+        if coords is not None and postal and is_sg_postal(postal):
+            keys.append(normalize_address(postal))
+        latitude, longitude = coords if coords is not None else (None, None)
+        expires = None if coords is not None else now + self.negative_ttl
+
+        with self._lock:
+            self._db.executemany(
+                'INSERT OR REPLACE INTO geocode VALUES (?, ?, ?, ?, ?)',
+                [ (key, latitude, longitude, source, now) for key in keys ]
+            )
+            self._db.commit()
+            for key in keys:
+                self._lru_put(key, (coords, expires))
+
+    def preload_csv(self, csv_file: str, source: str = 'csv') -> int:
+        """
+        Bulk loads postal codes from a CSV file so a deployment can warm the
+        store offline. The CSV needs a header with a postal code column
+        ('postal', 'postal_code' or 'POSTAL') and latitude / longitude columns
+        ('latitude'/'lat', 'longitude'/'lon'/'lng', case-insensitive).
+
+        Returns:
+            int: Number of rows loaded
+        """
+        now = time.time()
+        with open(csv_file, newline='') as f:
+            reader = csv.DictReader(f)
+            columns = { name.lower(): name for name in (reader.fieldnames or []) }
+            postal_col = columns.get('postal') or columns.get('postal_code')
+            lat_col = columns.get('latitude') or columns.get('lat')
+            lon_col = columns.get('longitude') or columns.get('lon') or columns.get('lng')
+            if not (postal_col and lat_col and lon_col):
+                raise ValueError(f'{csv_file} needs postal, latitude and longitude columns (found {reader.fieldnames})')
+
+            rows = []
+            for row in reader:
+                postal = row[postal_col].strip().zfill(6)
+                if not is_sg_postal(postal):
+                    continue
+                rows.append((f'postal:{postal}', float(row[lat_col]), float(row[lon_col]), source, now))
+
+        with self._lock:
+            self._db.executemany('INSERT OR REPLACE INTO geocode VALUES (?, ?, ?, ?, ?)', rows)
+            self._db.commit()
+        return len(rows)
+
+    def get_stats(self):
+        """
+        Returns a copy of the hit/miss counters, plus the number of stored entries.
+        """
+        with self._lock:
+            stats = dict(self.stats)
+            stats['lru_size'] = len(self._lru)
+            stats['db_size'] = self._db.execute('SELECT COUNT(*) FROM geocode').fetchone()[0]
+        return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Warm the geocode cache from a CSV of postal codes')
+    parser.add_argument('csv_file')
+    parser.add_argument('--db', default=DEFAULT_DB_FILE)
+    args = parser.parse_args()
+
+    n = GeocodeCache(args.db).preload_csv(args.csv_file)
+    print(f'Loaded {n} postal codes into {args.db}')
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+
+# Local HTTP API for the web front-end (index.html / script.js), so browsers
+# get the NEA forecasts from one place instead of each calling data.gov.sg:
+#
+#   python nea_server.py --port 8080 --static_dir ..
+#
+#   GET /api/forecast   2hr + 24hr + 4-day payloads in one response
+#   GET /api/2hr        two-hr-forecast payload
+#   GET /api/24hr       twenty-four-hr-forecast payload
+#   GET /api/4day       four-day-outlook payload
+#   GET /api/stats      cache statistics
+#
+# Upstream payloads come through a ForecastCache (see forecast_feeds), so each feed
+# is fetched once per validity period however many clients there are. Each
+# response body is serialized and compressed (gzip, and brotli if installed)
+# once per feed version; clients get an ETag (per encoding), and a Cache-Control max-age that
+# runs until the earliest expiry of the feeds in the response.
+
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+
+from aiohttp import web
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from forecast_feeds import ForecastCache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Endpoint name -> feed id in forecast_feeds.url_list
+FEEDS = {
+    '2hr': '2hr-realtime',
+    '24hr': '24hr-realtime',
+    '4day': '4day-realtime'
+}
+
+# Endpoint name -> the feeds it combines
+ENDPOINTS = dict({ name: [ name ] for name in FEEDS }, forecast=list(FEEDS))
+
+# Front-end files served with --static_dir, relative to it. Nothing else in the
+# directory (the repository, with its databases and data/) is reachable.
+STATIC_FILES = [
+    'index.html',
+    'script.js',
+    'style.css',
+    'apple-touch-icon.png',
+    'html/weather.html',
+    'html/weather.js',
+    'html/weather.css'
+]
+
+MIN_MAX_AGE = 10            # seconds, also used when a feed is unavailable
+BROTLI_QUALITY = 5
+
+
+ENTITY_TAG = re.compile(r'\*|(?:W/)?"[^"]*"')
+
+
+def encode_body(data):
+    """
+    Serializes `data` and returns {content encoding: (body, ETag)} for every
+    supported encoding. Each encoding is a different representation, so each
+    gets its own strong ETag (the hash of the json, plus the encoding).
+    """
+    body = json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode()
+    digest = hashlib.sha1(body).hexdigest()[:20]
+    bodies = {'identity': body, 'gzip': gzip.compress(body, compresslevel=6)}
+    if brotli is not None:
+        bodies['br'] = brotli.compress(body, quality=BROTLI_QUALITY)
+    return { encoding: (x, f'"{digest}"' if encoding == 'identity' else f'"{digest}-{encoding}"')
+             for encoding, x in bodies.items() }
+
+
+def etag_matches(if_none_match, etag):
+    """
+    Whether an If-None-Match header matches `etag`: '*', or one of its
+    entity tags equal to `etag` by weak comparison (W/ prefixes ignored)
+    """
+    for tag in ENTITY_TAG.findall(if_none_match):
+        if tag == '*' or tag.removeprefix('W/') == etag:
+            return True
+    return False
+
+
+def choose_encoding(accept_encoding, bodies):
+    accepted = { x.split(';')[0].strip().lower() for x in accept_encoding.split(',') }
+    for encoding in [ 'br', 'gzip' ]:
+        if encoding in accepted and encoding in bodies:
+            return encoding
+    return 'identity'
+
+
+class ForecastServer:
+    """
+    Serves the forecast endpoints, keeping one encoded response per endpoint
+    and feed version.
+
+    Args:
+        cache (ForecastCache): Source of the feed payloads (raw, unprocessed)
+    """
+
+    def __init__(self, cache=None):
+        self.cache = cache or ForecastCache()
+        self.stats = {'requests': 0, 'not_modified': 0, 'encodes': 0, 'errors': 0}
+        self._responses = {}
+        self._locks = { name: asyncio.Lock() for name in ENDPOINTS }
+
+    async def get_response(self, name):
+        """
+        Returns (bodies, max_age) for endpoint `name`, re-encoding
+        only when one of its feeds has a new payload
+        """
+        feeds = ENDPOINTS[name]
+        payloads = await asyncio.gather(*[ self.cache.get_async(FEEDS[feed]) for feed in feeds ])
+        if all(payload is None for payload in payloads):
+            raise RuntimeError('feed unavailable')
+        now = time.time()
+        expiries = [ self.cache.expires(FEEDS[feed]) for feed in feeds ]
+        max_age = min([ e - now for e in expiries if e is not None ] or [ MIN_MAX_AGE ])
+        max_age = max(int(max_age), MIN_MAX_AGE)
+
+        async with self._locks[name]:
+            cached = self._responses.get(name)
+            if cached is not None and len(cached[0]) == len(payloads) and \
+                    all(a is b for a, b in zip(cached[0], payloads)):
+                return cached[1], max_age
+
+            if len(feeds) == 1:
+                data = payloads[0]
+            else:
+                data = dict(zip(feeds, payloads))
+            # Compressing (brotli in particular) takes a few ms: keep it off the event loop
+            bodies = await asyncio.to_thread(encode_body, data)
+            self._responses[name] = (payloads, bodies)
+            self.stats['encodes'] += 1
+            return bodies, max_age
+
+    async def handle_forecast(self, request):
+        name = request.match_info['name']
+        if name not in ENDPOINTS:
+            raise web.HTTPNotFound()
+        self.stats['requests'] += 1
+        try:
+            bodies, max_age = await self.get_response(name)
+        except Exception as e:
+            self.stats['errors'] += 1
+            print(f'Error building /api/{name}: {e}')
+            raise web.HTTPBadGateway()
+
+        encoding = choose_encoding(request.headers.get('Accept-Encoding', ''), bodies)
+        body, etag = bodies[encoding]
+        headers = {
+            'ETag': etag,
+            'Cache-Control': f'public, max-age={max_age}',
+            'Vary': 'Accept-Encoding',
+            'Access-Control-Allow-Origin': '*'
+        }
+        if etag_matches(request.headers.get('If-None-Match', ''), etag):
+            self.stats['not_modified'] += 1
+            return web.Response(status=304, headers=headers)
+
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        return web.Response(body=body, headers=headers, content_type='application/json')
+
+    async def handle_stats(self, request):
+        return web.json_response({'server': dict(self.stats), 'forecast_cache': self.cache.get_stats()})
+
+
+def make_app(static_dir=None, cache=None):
+    server = ForecastServer(cache)
+    app = web.Application()
+    app.router.add_get('/api/stats', server.handle_stats)
+    app.router.add_get('/api/{name}', server.handle_forecast)
+    if static_dir:
+        for name in STATIC_FILES:
+            filename = os.path.join(static_dir, name)
+            if os.path.isfile(filename):
+                handler = lambda request, filename=filename: web.FileResponse(filename)
+                app.router.add_get(f'/{name}', handler)
+                if name == 'index.html':
+                    app.router.add_get('/', handler)
+    app['server'] = server
+    return app
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve the NEA forecasts to the web front-end')
+    parser.add_argument('--host', default='127.0.0.1', help='Use 0.0.0.0 to accept connections from other machines')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--static_dir', help='Also serve the front-end files (STATIC_FILES) from this directory (e.g. ..)')
+    args = parser.parse_args()
+
+    web.run_app(make_app(args.static_dir), host=args.host, port=args.port, backlog=4096)
@@ -1,14 +1,28 @@
 #!/usr/bin/env python3
 
+import asyncio
 import json
 import math
-import requests
 import os
+import sys
+import time
 import urllib.parse
 
 from strands import tool
 from typing import Dict, Any, Optional
 
+from geocode_cache import GeocodeCache, MISS, is_sg_postal, normalize_address
+from tool_cache import memoize_tool
+
+# Modules shared with the nea-pythonista library live in ../src
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from nea_geo import nearest_points
+from nea_model import ForecastSnapshot, RegionForecastSnapshot, area_table
+# Re-exported: the feed functions used to live here
+from forecast_feeds import (ForecastCache, get_forecast, get_forecast_async, get_forecast_expiry,
+                            parse_timestamp, publish_intervals, url_list)
+import nea_http
+
 
 collection_ids = {
     '2hr-historical': 2179,
@@ -18,12 +32,6 @@ collection_ids = {
 }
 valid_collection_ids = [ id for id in collection_ids.values() ]
 
-url_list = {
-    '2hr-realtime': 'https://api-open.data.gov.sg/v2/real-time/api/two-hr-forecast',
-    '24hr-realtime': 'https://api-open.data.gov.sg/v2/real-time/api/twenty-four-hr-forecast',
-    '4day-realtime': 'https://api-open.data.gov.sg/v2/real-time/api/four-day-outlook'
-}
-
 # Approximate center points for each region in Singapore
 region_coordinates = {
     'north': {'latitude': 1.41, 'longitude': 103.82},   # Woodlands/Yishun area
@@ -55,9 +63,9 @@ def get_collection_metadata(collection_id: int):
         return None
 
     URL_TEMPLATE = "https://api-production.data.gov.sg/v2/public/api/collections/{collection_id}/metadata"
-    url = URL_TEMPLATE.format(collection_id)
+    url = URL_TEMPLATE.format(collection_id=collection_id)
 
-    response = requests.get(url)
+    response = nea_http.get(url)
     if response.status_code == 200:
         return response.json()
     else:
@@ -65,34 +73,15 @@ def get_collection_metadata(collection_id: int):
         return None
 
 
-def get_forecast(id: str):
-    """
-    Get weather forecast data from the data.gov.sg API based on the forecast type ID.
-    
-    Args:
-        id (str): The forecast type ID ('2hr-realtime', '24hr-realtime', or '4day-realtime')
-        
-    Returns:
-        dict: JSON response containing the forecast data if successful, None otherwise
-    """
-    if id in url_list:
-        url = url_list[id]
-        response = requests.get(url)
-        if response.status_code == 200:
-            return response.json()
-        else:
-            print(f'Error parsing json data from {url}. Status code: {response.status_code}')
-            return None
-    else:
-        print(f'Error: {id} not found in url_list')
-        return None
-
-
 def save_json(response, filename):
     with open(filename, 'w') as f:
         f.write(json.dumps(response, indent=2))
 
 
+forecast_cache = ForecastCache()
+geocode_cache = GeocodeCache()
+
+
 def convert_weather_data(data):
     """
     Convert the weather data from the input file format to the required output format.
@@ -102,35 +91,16 @@ def convert_weather_data(data):
         output_file (str): Path to save the output JSON file
     """
     
-    # Create a dictionary to map area names to their coordinates
-    area_coords = {}
-    for area in data['data']['area_metadata']:
-        area_coords[area['name']] = {
-            'latitude': area['label_location']['latitude'],
-            'longitude': area['label_location']['longitude']
-        }
-    
-    # Extract the forecast data and valid period
-    forecasts = data['data']['items'][0]['forecasts']
-    valid_period = data['data']['items'][0]['valid_period']
-    start_time = valid_period['start']
-    end_time = valid_period['end']
-    
-    # Create the new data structure
-    weather_data_2hr = []
-    
-    for forecast_item in forecasts:
-        area_name = forecast_item['area']
-        if area_name in area_coords:
-            weather_data_2hr.append({
-                'location_name': area_name,
-                'latitude': area_coords[area_name]['latitude'],
-                'longitude': area_coords[area_name]['longitude'],
-                'forecast': forecast_item['forecast'],
-                'start': start_time,
-                'end': end_time
-            })
-    return weather_data_2hr
+    return get_2hr_snapshot(data).to_records()
+
+
+def get_2hr_snapshot(data):
+    """
+    Returns the 2hr forecast as a compact ForecastSnapshot: one condition code
+    per area of the (static, reused) area table, plus the validity period.
+    """
+    table = area_table(data['data']['area_metadata'])
+    return ForecastSnapshot.from_item(table, data['data']['items'][0])
 
 
 def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float):
@@ -150,6 +120,42 @@ def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float):
     return c * r
 
 
+ONEMAP_URL = "https://developers.onemap.sg/commonapi/search"
+NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
+
+
+def onemap_params(address_or_postal: str):
+    return {'searchVal': address_or_postal, 'returnGeom': 'Y', 'getAddrDetails': 'Y'}
+
+
+def nominatim_params(address_or_postal: str):
+    return {'q': address_or_postal, 'format': 'json', 'limit': 1}
+
+
+def parse_onemap_response(address_or_postal: str, data):
+    """
+    Returns the coordinates of the first OneMap result (caching it), or None
+    """
+    if data.get('found') > 0:
+        # Get the first result
+        result = data['results'][0]
+        coords = float(result['LATITUDE']), float(result['LONGITUDE'])
+        geocode_cache.store(address_or_postal, coords, source='onemap', postal=result.get('POSTAL'))
+        return coords
+    return None
+
+
+def parse_nominatim_response(address_or_postal: str, data):
+    """
+    Returns the coordinates of the first Nominatim result (caching it), or None
+    """
+    if data and len(data) > 0:
+        coords = float(data[0]['lat']), float(data[0]['lon'])
+        geocode_cache.store(address_or_postal, coords, source='nominatim')
+        return coords
+    return None
+
+
 @tool
 def geocode_address(address_or_postal: str):
     """
@@ -162,46 +168,98 @@ def geocode_address(address_or_postal: str):
     Returns:
         tuple[float, float]: (latitude, longitude) coordinates or None if geocoding fails
     """
+    # Repeated addresses and postal codes are answered from the geocode cache
+    cached = geocode_cache.lookup(address_or_postal)
+    if cached is not MISS:
+        return cached
+
+    # Only cache a negative result if both geocoders actually answered
+    lookup_failed = False
+
     # First try OneMap API for Singapore addresses
     try:
-        # Check if input is a Singapore postal code (6 digits)
-        is_sg_postal = address_or_postal.isdigit() and len(address_or_postal) == 6
-        
-        # Construct the OneMap API URL
-        encoded_address = urllib.parse.quote(address_or_postal)
-        onemap_url = f"https://developers.onemap.sg/commonapi/search?searchVal={encoded_address}&returnGeom=Y&getAddrDetails=Y"
-        
-        response = requests.get(onemap_url)
+        response = nea_http.get(ONEMAP_URL, params=onemap_params(address_or_postal))
         if response.status_code == 200:
-            data = response.json()
-            if data.get('found') > 0:
-                # Get the first result
-                result = data['results'][0]
-                return float(result['LATITUDE']), float(result['LONGITUDE'])
+            coords = parse_onemap_response(address_or_postal, response.json())
+            if coords:
+                return coords
+        else:
+            lookup_failed = True
     except Exception as e:
         print(f"OneMap API error: {e}")
-    
+        lookup_failed = True
+
+    # A 6 digit postal code is Singapore-only, so Nominatim will not do better
+    if is_sg_postal(address_or_postal) and not lookup_failed:
+        geocode_cache.store(address_or_postal, None, source='onemap')
+        return None
+
     # Fall back to Nominatim API for non-Singapore addresses
     try:
-        # Use Nominatim API with proper user-agent
-        nominatim_url = "https://nominatim.openstreetmap.org/search"
-        headers = {
-            'User-Agent': 'NEA Weather App/1.0'
-        }
-        params = {
-            'q': address_or_postal,
-            'format': 'json',
-            'limit': 1
-        }
-        
-        response = requests.get(nominatim_url, headers=headers, params=params)
+        response = nea_http.get(NOMINATIM_URL, params=nominatim_params(address_or_postal))
         if response.status_code == 200:
-            data = response.json()
-            if data and len(data) > 0:
-                return float(data[0]['lat']), float(data[0]['lon'])
+            coords = parse_nominatim_response(address_or_postal, response.json())
+            if coords:
+                return coords
+        else:
+            lookup_failed = True
     except Exception as e:
         print(f"Nominatim API error: {e}")
+        lookup_failed = True
+
+    if not lookup_failed:
+        geocode_cache.store(address_or_postal, None, source='nominatim')
+    return None
+
+
+@tool(name='geocode_address')
+async def geocode_address_async(address_or_postal: str):
+    """
+    Converts a Singapore address or postal code to latitude and longitude coordinates
+    using the OneMap API (for Singapore addresses) or Nominatim API (for global addresses).
     
+    Args:
+        address_or_postal (str): Address or postal code to geocode
+        
+    Returns:
+        tuple[float, float]: (latitude, longitude) coordinates or None if geocoding fails
+    """
+    # Async version of geocode_address(), sharing its cache
+    cached = geocode_cache.lookup(address_or_postal)
+    if cached is not MISS:
+        return cached
+
+    lookup_failed = False
+    try:
+        status, data = await nea_http.aget_json(ONEMAP_URL, params=onemap_params(address_or_postal))
+        if status == 200:
+            coords = parse_onemap_response(address_or_postal, data)
+            if coords:
+                return coords
+        else:
+            lookup_failed = True
+    except Exception as e:
+        print(f"OneMap API error: {e}")
+        lookup_failed = True
+
+    if is_sg_postal(address_or_postal) and not lookup_failed:
+        geocode_cache.store(address_or_postal, None, source='onemap')
+        return None
+
+    try:
+        status, data = await nea_http.aget_json(NOMINATIM_URL, params=nominatim_params(address_or_postal))
+        if status == 200:
+            coords = parse_nominatim_response(address_or_postal, data)
+            if coords:
+                return coords
+        else:
+            lookup_failed = True
+    except Exception as e:
+        print(f"Nominatim API error: {e}")
+        lookup_failed = True
+
+    if not lookup_failed:
+        geocode_cache.store(address_or_postal, None, source='nominatim')
     return None
 
 
@@ -217,22 +275,23 @@ def get_nearest_location_from_lat_long(lat: float, long: float):
     Returns:
         dict: Dictionary containing weather information for the nearest location
     """
-    # List of dictionaries containing weather data for different locations
-    weather_data_2hr = init_or_refresh_2hr_data()
+    # Compact snapshot of the weather data for the different locations
+    snapshot = init_or_refresh_2hr_snapshot()
+    if not snapshot:
+        return None
 
-    # Find the nearest location
-    nearest_location = None
-    min_distance = float('inf')
-    
-    for location in weather_data_2hr:
-        distance = haversine_distance(
-            lat, long, 
-            location['latitude'], 
-            location['longitude'])
-        if distance < min_distance:
-            min_distance = distance
-            nearest_location = location
-    return nearest_location
+    # Find the nearest location (the indices are built once per snapshot)
+    i, distance = snapshot.table.index.nearest(lat, long)
+    record = snapshot.record(i)
+    if record is not None:
+        return record
+
+    # The nearest area has no forecast in this poll: search the areas that do
+    weather_data_2hr = snapshot.to_records()
+    if not weather_data_2hr:
+        return None
+    i, distance = snapshot.records_index().nearest(lat, long)
+    return weather_data_2hr[i]
 
 
 
@@ -287,6 +346,55 @@ def get_region_from_coordinates(latitude: float, longitude: float) -> str:
     return nearest_region
 
 
+def get_regions_and_areas_from_coordinates(latitudes, longitudes, weather_data_2hr=None):
+    """
+    Batch version of get_region_from_coordinates() and
+    get_nearest_location_from_lat_long(), for mapping large numbers of
+    coordinates at once (e.g. customer locations for a nightly report).
+
+    Distances to the region centres and to the 2hr forecast areas are computed
+    with vectorized NumPy operations rather than per-point math calls.
+
+    Args:
+        latitudes (array-like): Latitude coordinates
+        longitudes (array-like): Longitude coordinates
+        weather_data_2hr (list): Output of convert_weather_data(); fetched with
+            init_or_refresh_2hr_data() if not given
+
+    Returns:
+        dict: NumPy arrays with one entry per input point:
+            'region' (region name), 'region_distance' (km to the region centre),
+            'area' (nearest 2hr forecast area), 'area_distance' (km to that area)
+    """
+    import numpy as np
+
+    if weather_data_2hr is None:
+        weather_data_2hr = init_or_refresh_2hr_data() or []
+
+    regions = list(region_coordinates.keys())
+    areas = [ location['location_name'] for location in weather_data_2hr ]
+    ref_latitudes = [ region_coordinates[r]['latitude'] for r in regions ] + \
+        [ float(location['latitude']) for location in weather_data_2hr ]
+    ref_longitudes = [ region_coordinates[r]['longitude'] for r in regions ] + \
+        [ float(location['longitude']) for location in weather_data_2hr ]
+
+    latitudes = np.asarray(latitudes, dtype=float).ravel()
+    longitudes = np.asarray(longitudes, dtype=float).ravel()
+
+    n_regions = len(regions)
+    result = {}
+    for key, names, ref in [ ('region', regions, slice(0, n_regions)),
+                             ('area', areas, slice(n_regions, None)) ]:
+        if not names:
+            result[key] = np.full(len(latitudes), None, dtype=object)
+            result[f'{key}_distance'] = np.full(len(latitudes), np.nan)
+            continue
+        i, distance = nearest_points(latitudes, longitudes, ref_latitudes[ref], ref_longitudes[ref])
+        result[key] = np.asarray(names, dtype=object)[i]
+        result[f'{key}_distance'] = distance
+    return result
+
+
 def get_region_from_address(address_or_postal: str) -> str:
     """
     Maps an address or postal code to one of the five regions in Singapore
@@ -310,6 +418,20 @@ def get_region_from_address(address_or_postal: str) -> str:
         return None
 
 
+async def get_region_from_address_async(address_or_postal: str) -> str:
+    """
+    Async version of get_region_from_address()
+    """
+    coords = await geocode_address_async(address_or_postal)
+    
+    if coords:
+        latitude, longitude = coords
+        return get_region_from_coordinates(latitude, longitude)
+    else:
+        print(f"Could not geocode address: {address_or_postal}")
+        return None
+
+
 def organize_weather_by_region(data):
     """
     Organizes 24hr weather forecast data by regions (west, east, central, south, north).
@@ -323,41 +445,48 @@ def organize_weather_by_region(data):
     if not data or 'data' not in data or 'records' not in data['data'] or not data['data']['records']:
         return None
     
-    # Get the first record (most recent forecast)
-    record = data['data']['records'][0]
-    
-    # Extract general weather information
-    general_info = record.get('general', {})
-    
-    # Initialize the result structure
-    result = {
-        'timestamp': record.get('timestamp'),
-        'date': record.get('date'),
-        'updatedTimestamp': record.get('updatedTimestamp'),
-        'general': general_info,
-        'regions': {
-            'west': {'forecasts': []},
-            'east': {'forecasts': []},
-            'central': {'forecasts': []},
-            'south': {'forecasts': []},
-            'north': {'forecasts': []}
-        }
-    }
-    
-    # Process each time period
-    for period in record.get('periods', []):
-        time_period = period.get('timePeriod', {})
-        regions_data = period.get('regions', {})
-        
-        # For each region, add the forecast for this time period
-        for region in ['west', 'east', 'central', 'south', 'north']:
-            if region in regions_data:
-                forecast_entry = {
-                    'timePeriod': time_period,
-                    'forecast': regions_data[region]
-                }
-                result['regions'][region]['forecasts'].append(forecast_entry)
+    # Get the first record (most recent forecast), stored as condition codes
+    # per (period, region) and converted back to dicts here
+    return RegionForecastSnapshot.from_record(data['data']['records'][0]).to_dict()
+
+
+def get_24hr_snapshot(data):
+    """
+    Returns the 24hr forecast as a compact RegionForecastSnapshot, or None
+    """
+    if not data or 'data' not in data or 'records' not in data['data'] or not data['data']['records']:
+        return None
+    return RegionForecastSnapshot.from_record(data['data']['records'][0])
+
+
+def get_region_weather(weather_data_24hr, region: str, location: Dict[str, Any]):
+    """
+    Builds the result of get_weather_for_singapore_address() /
+    get_weather_for_singapore_coordinates() for one region.
+
+    Args:
+        weather_data_24hr (dict): Weather data organized by regions from organize_weather_by_region()
+        region (str): Region name
+        location (dict): Describes the requested location, e.g. {'address': ...}
+
+    Returns:
+        dict: Weather forecast data for the region, or None if weather_data_24hr
+              doesn't contain region information
+    """
+    # Check if weather_data_24hr has the required structure
+    if not weather_data_24hr or 'regions' not in weather_data_24hr or region not in weather_data_24hr['regions']:
+        return None
     
+    # Create a result dictionary with general info and region-specific forecasts
+    result = dict(location)
+    result.update({
+        'region': region,
+        'timestamp': weather_data_24hr.get('timestamp'),
+        'date': weather_data_24hr.get('date'),
+        'updatedTimestamp': weather_data_24hr.get('updatedTimestamp'),
+        'general': weather_data_24hr.get('general', {}),
+        'forecasts': weather_data_24hr['regions'][region].get('forecasts', [])
+    })
     return result
 
 
@@ -379,24 +508,25 @@ def get_weather_for_singapore_coordinates(latitude: float, longitude: float):
     # Get the region for the coordinates
     region = get_region_from_coordinates(latitude, longitude)
     
-    # Check if weather_data_24hr has the required structure
-    if not weather_data_24hr or 'regions' not in weather_data_24hr or region not in weather_data_24hr['regions']:
-        return None
-    
-    # Create a result dictionary with general info and region-specific forecasts
-    result = {
-        'coordinates': {'latitude': latitude, 'longitude': longitude},
-        'region': region,
-        'timestamp': weather_data_24hr.get('timestamp'),
-        'date': weather_data_24hr.get('date'),
-        'updatedTimestamp': weather_data_24hr.get('updatedTimestamp'),
-        'general': weather_data_24hr.get('general', {}),
-        'forecasts': weather_data_24hr['regions'][region].get('forecasts', [])
-    }
-    
-    return result
+    return get_region_weather(weather_data_24hr, region,
+                              {'coordinates': {'latitude': latitude, 'longitude': longitude}})
+
+def region_weather_expiry(result):
+    # A region's forecast is valid as long as the 24hr forecast it came from
+    return forecast_cache.expires('24hr-realtime')
+
+
+def restore_address(result, arguments):
+    """
+    A cached result is shared by every spelling of an address (see
+    normalize_address): give each caller its own spelling back
+    """
+    return dict(result, address=arguments['address_or_postal'])
+
 
 @tool
+@memoize_tool(name='get_weather_for_singapore_address', ttl=region_weather_expiry,
+              normalizers={'address_or_postal': normalize_address}, restore=restore_address)
 def get_weather_for_singapore_address(address_or_postal: str):
     """
     Returns the Singapore weather forecast data for the region nearest
@@ -404,7 +534,6 @@ def get_weather_for_singapore_address(address_or_postal: str):
     
     Args:
         address_or_postal (str): Address or postal code
-        weather_data_24hr (dict): Weather data organized by regions from organize_weather_by_region()
         
     Returns:
         dict: Weather forecast data for the nearest region or None if geocoding fails
@@ -418,41 +547,82 @@ def get_weather_for_singapore_address(address_or_postal: str):
     if not region:
         return None
     
-    # Check if weather_data_24hr has the required structure
-    if not weather_data_24hr or 'regions' not in weather_data_24hr or region not in weather_data_24hr['regions']:
+    return get_region_weather(weather_data_24hr, region, {'address': address_or_postal})
+
+
+@tool(name='get_weather_for_singapore_address')
+@memoize_tool(name='get_weather_for_singapore_address', ttl=region_weather_expiry,
+              normalizers={'address_or_postal': normalize_address}, restore=restore_address)
+async def get_weather_for_singapore_address_async(address_or_postal: str):
+    """
+    Returns the Singapore weather forecast data for the region nearest
+    to the given address or postal code.
+    
+    Args:
+        address_or_postal (str): Address or postal code
+        
+    Returns:
+        dict: Weather forecast data for the nearest region or None if geocoding fails
+              or if weather_data_24hr doesn't contain region information
+    """
+    # Async version of get_weather_for_singapore_address(): the forecast and
+    # the geocoding lookups run concurrently without blocking the event loop
+    weather_data_24hr, region = await asyncio.gather(
+        init_or_refresh_24hr_data_async(),
+        get_region_from_address_async(address_or_postal)
+    )
+    
+    if not region:
         return None
     
-    # Create a result dictionary with general info and region-specific forecasts
-    result = {
-        'address': address_or_postal,
-        'region': region,
-        'timestamp': weather_data_24hr.get('timestamp'),
-        'date': weather_data_24hr.get('date'),
-        'updatedTimestamp': weather_data_24hr.get('updatedTimestamp'),
-        'general': weather_data_24hr.get('general', {}),
-        'forecasts': weather_data_24hr['regions'][region].get('forecasts', [])
-    }
-    return result
+    return get_region_weather(weather_data_24hr, region, {'address': address_or_postal})
 
 
-def init_or_refresh_2hr_data():
-    response = get_forecast('2hr-realtime')
+def process_2hr_data(response):
     save_json(response, 'weather-data-2hr-raw.json')
 
-    weather_data_2hr = convert_weather_data(response)
-    save_json(weather_data_2hr, 'weather-data-2hr-clean.json')
+    snapshot = get_2hr_snapshot(response)
+    save_json(snapshot.to_records(), 'weather-data-2hr-clean.json')
 
-    return weather_data_2hr
+    return snapshot
 
 
-def init_or_refresh_24hr_data():
-    response_24hr = get_forecast('24hr-realtime')
+def process_24hr_data(response_24hr):
     save_json(response_24hr, 'weather-data-24hr-raw.json')
     
-    weather_data_24hr = organize_weather_by_region(response_24hr)
-    save_json(weather_data_24hr, 'weather-data-24hr-clean.json')
+    snapshot = get_24hr_snapshot(response_24hr)
+    save_json(snapshot.to_dict() if snapshot else None, 'weather-data-24hr-clean.json')
+
+    return snapshot
+
+
+def init_or_refresh_2hr_snapshot():
+    # Only fetches (and rewrites the json files) when the cached forecast has expired
+    return forecast_cache.get('2hr-realtime', process_2hr_data)
+
 
-    return weather_data_24hr
+def init_or_refresh_24hr_snapshot():
+    return forecast_cache.get('24hr-realtime', process_24hr_data)
+
+
+def init_or_refresh_2hr_data():
+    snapshot = init_or_refresh_2hr_snapshot()
+    return snapshot.to_records() if snapshot else None
+
+
+def init_or_refresh_24hr_data():
+    snapshot = init_or_refresh_24hr_snapshot()
+    return snapshot.to_dict() if snapshot else None
+
+
+async def init_or_refresh_2hr_data_async():
+    snapshot = await forecast_cache.get_async('2hr-realtime', process_2hr_data)
+    return snapshot.to_records() if snapshot else None
+
+
+async def init_or_refresh_24hr_data_async():
+    snapshot = await forecast_cache.get_async('24hr-realtime', process_24hr_data)
+    return snapshot.to_dict() if snapshot else None
 
 def demo():
     # Example of using the geocoding and weather lookup functions
@@ -477,6 +647,35 @@ def demo():
         for forecast in region_weather['forecasts']:
             print(f"  {forecast['timePeriod']['start']} to {forecast['timePeriod']['end']}: {forecast['forecast']}")
 
+def demo_batch(n=50000, seed=0):
+    """
+    Times get_regions_and_areas_from_coordinates() against the scalar
+    functions over `n` random points in Singapore. The results are checked
+    against each other offline in tests/test_nea_tools.py.
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    latitudes = rng.uniform(1.22, 1.47, n)
+    longitudes = rng.uniform(103.6, 104.05, n)
+    weather_data_2hr = init_or_refresh_2hr_data() or []
+
+    t0 = time.perf_counter()
+    get_regions_and_areas_from_coordinates(latitudes, longitudes, weather_data_2hr)
+    t_batch = time.perf_counter() - t0
+
+    n_scalar = min(n, 2000)
+    t0 = time.perf_counter()
+    for k in range(n_scalar):
+        lat, lon = latitudes[k], longitudes[k]
+        get_region_from_coordinates(lat, lon)
+        for location in weather_data_2hr:
+            haversine_distance(lat, lon, float(location['latitude']), float(location['longitude']))
+    t_scalar = (time.perf_counter() - t0) * n / n_scalar
+
+    print(f'{n} points: batch {t_batch:.3f}s, scalar (extrapolated) {t_scalar:.3f}s, speedup {t_scalar / t_batch:.0f}x')
+
+
 def demo_agent():
     SYSTEM_PROMPT_NEA = """
     You are a helpful weather assistant that can provide weather information for Singapore.
@@ -535,4 +734,5 @@ weather_data_24hr = init_or_refresh_24hr_data()
 
 if __name__ == '__main__':
     # demo()
+    # demo_batch()
     demo_agent()
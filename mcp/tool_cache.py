@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+
+import asyncio
+import functools
+import inspect
+import os
+import threading
+import time
+
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+
+# Size of the grid (in degrees) that coordinates are rounded to before they are
+# used as a cache key: 0.01 degrees is about 1.1 km around Singapore
+COORDINATE_GRID = float(os.getenv('TOOL_CACHE_GRID', '0.01'))
+
+# Every ToolCache, by tool name (see get_tool_cache_stats)
+tool_caches = {}
+
+
+def round_to_grid(x: float, grid: Optional[float] = None) -> float:
+    """
+    Rounds a latitude or longitude to the nearest multiple of `grid` degrees
+    """
+    grid = grid or COORDINATE_GRID
+    return round(round(float(x) / grid) * grid, 6)
+
+
+def normalize_text(x: str) -> str:
+    return ' '.join(str(x).lower().split())
+
+
+class ToolCache:
+    """
+    Memoizes the results of one tool function, keyed by its normalized
+    arguments, so that repeated tool calls (within a conversation or across
+    users) are answered without calling the upstream API again.
+
+    Each result expires according to `ttl`, which is either a number of
+    seconds or a function of the result returning its expiry time in epoch
+    seconds (or None to fall back to `default_ttl`). None results and
+    exceptions are never cached. Concurrent calls with the same key share a
+    single upstream call, including its exception if it fails.
+
+    Cached results are shared between callers: do not modify them.
+
+    Args:
+        name (str): Name of the tool, used in the statistics
+        ttl (float | callable): Lifetime in seconds, or result -> expiry time
+        normalizers (dict): {argument name: function} applied to arguments to build the
+            key; an argument mapped to None is left out of the key (e.g. API keys)
+        max_size (int): Number of results kept (least recently used are evicted)
+        default_ttl (float): Lifetime used when `ttl` cannot tell
+        min_ttl (float): Minimum lifetime, for results that are already past their validity
+        max_ttl (float): Maximum lifetime
+        restore (callable): (result, arguments) -> result, applied to every result
+            returned, to put back arguments the key normalized away (e.g. the
+            caller's own spelling of an address that the result echoes)
+    """
+
+    def __init__(self, name: str, ttl=600, normalizers: Optional[Dict[str, Optional[Callable]]] = None,
+                 max_size: int = 1024, default_ttl: float = 600, min_ttl: float = 30, max_ttl: float = 6 * 3600,
+                 restore: Optional[Callable] = None):
+        self.name = name
+        self.ttl = ttl
+        self.normalizers = normalizers or {}
+        self.max_size = max_size
+        self.default_ttl = default_ttl
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.restore = restore
+        self.stats = {'hits': 0, 'misses': 0, 'shared': 0, 'stores': 0, 'expired': 0, 'evictions': 0, 'errors': 0}
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._async_inflight = {}
+        self._lock = threading.Lock()
+
+    def make_key(self, signature: inspect.Signature, args, kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = []
+        for name, value in bound.arguments.items():
+            if name in self.normalizers:
+                normalize = self.normalizers[name]
+                if normalize is None:
+                    continue
+                value = normalize(value)
+            key.append((name, value))
+        return tuple(key)
+
+    def expiry(self, result, now: float) -> float:
+        if callable(self.ttl):
+            try:
+                expires = self.ttl(result)
+            except (KeyError, IndexError, TypeError, ValueError):
+                expires = None
+            if expires is None:
+                expires = now + self.default_ttl
+        else:
+            expires = now + self.ttl
+        return min(max(expires, now + self.min_ttl), now + self.max_ttl)
+
+    def lookup(self, key):
+        """
+        Returns (True, result) for a live cached result, or (False, None)
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > time.time():
+                    self._entries.move_to_end(key)
+                    self.stats['hits'] += 1
+                    return True, entry[0]
+                del self._entries[key]
+                self.stats['expired'] += 1
+            self.stats['misses'] += 1
+            return False, None
+
+    def store(self, key, result):
+        if result is None:
+            return
+        now = time.time()
+        expires = self.expiry(result, now)
+        with self._lock:
+            self._entries[key] = (result, expires)
+            self._entries.move_to_end(key)
+            self.stats['stores'] += 1
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def call(self, func, key, args, kwargs):
+        found, result = self.lookup(key)
+        if found:
+            return result
+
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = threading.Event()
+                flight.outcome = None
+        if not leader:
+            flight.wait()
+            return self.shared_outcome(flight.outcome, func, args, kwargs)
+
+        try:
+            result = func(*args, **kwargs)
+            self.store(key, result)
+            flight.outcome = (result, None)
+            return result
+        except Exception as e:
+            with self._lock:
+                self.stats['errors'] += 1
+            flight.outcome = (None, e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            flight.set()
+
+    async def call_async(self, func, key, args, kwargs):
+        found, result = self.lookup(key)
+        if found:
+            return result
+
+        with self._lock:
+            # Futures belong to one event loop: callers on other loops get their own flight
+            flight_key = (asyncio.get_running_loop(), key)
+            flight = self._async_inflight.get(flight_key)
+            leader = flight is None
+            if leader:
+                flight = self._async_inflight[flight_key] = flight_key[0].create_future()
+        if not leader:
+            outcome = await asyncio.shield(flight)
+            if outcome is None:
+                return await func(*args, **kwargs)
+            return self.shared_outcome(outcome, func, args, kwargs)
+
+        outcome = None
+        try:
+            result = await func(*args, **kwargs)
+            self.store(key, result)
+            outcome = (result, None)
+            return result
+        except Exception as e:
+            with self._lock:
+                self.stats['errors'] += 1
+            outcome = (None, e)
+            raise
+        finally:
+            with self._lock:
+                del self._async_inflight[flight_key]
+            flight.set_result(outcome)
+
+    def shared_outcome(self, outcome, func, args, kwargs):
+        """
+        Returns (or raises) the outcome of the leader's call to a caller that
+        waited for it. If the leader never finished (e.g. it was cancelled),
+        the caller makes the call itself.
+        """
+        if outcome is None:
+            return func(*args, **kwargs)
+        with self._lock:
+            self.stats['shared'] += 1
+        result, error = outcome
+        if error is not None:
+            raise error
+        return result
+
+    def restore_arguments(self, result, signature, args, kwargs):
+        if self.restore is None or result is None:
+            return result
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        return self.restore(result, bound.arguments)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Returns a copy of the counters, plus the number of cached results
+        and the hit rate
+        """
+        with self._lock:
+            stats = dict(self.stats)
+            stats['size'] = len(self._entries)
+        calls = stats['hits'] + stats['misses']
+        stats['hit_rate'] = (stats['hits'] + stats['shared']) / calls if calls else 0.0
+        return stats
+
+
+def memoize_tool(name: Optional[str] = None, ttl=600, normalizers: Optional[Dict[str, Optional[Callable]]] = None,
+                 **kwargs):
+    """
+    Decorator memoizing a (sync or async) tool function with a ToolCache.
+    Apply it below @tool, so that the tool keeps the function's name,
+    signature and docstring:
+
+        @tool
+        @memoize_tool(ttl=600, normalizers={'lat': round_to_grid, 'lon': round_to_grid})
+        def get_current_weather(lat: float, lon: float): ...
+
+    Tools registered under the same `name` (e.g. a sync tool and its async
+    version) share one cache. The ToolCache is available as `.cache`.
+    """
+    def decorator(func):
+        cache_name = name or func.__name__
+        cache = tool_caches.get(cache_name)
+        if cache is None:
+            cache = tool_caches[cache_name] = ToolCache(cache_name, ttl=ttl, normalizers=normalizers, **kwargs)
+        signature = inspect.signature(func)
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kw):
+                result = await cache.call_async(func, cache.make_key(signature, args, kw), args, kw)
+                return cache.restore_arguments(result, signature, args, kw)
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kw):
+                result = cache.call(func, cache.make_key(signature, args, kw), args, kw)
+                return cache.restore_arguments(result, signature, args, kw)
+
+        wrapper.cache = cache
+        return wrapper
+    return decorator
+
+
+def get_tool_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Returns the statistics of every tool cache, by tool name
+    """
+    return { name: cache.get_stats() for name, cache in tool_caches.items() }
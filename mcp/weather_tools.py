@@ -1,46 +1,104 @@
 #!/usr/bin/env python
 
+import hashlib
 import os
-import requests
+import sys
 
 from strands import tool
+from tool_cache import memoize_tool, normalize_text, round_to_grid
 from typing import Dict, Any, Optional
 
+# The shared HTTP client lives in ../src
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+import nea_http
+
 # Get API key from environment variable for security
 # You should set this with: export OPENWEATHERMAP_API_KEY="your_api_key"
 API_KEY = os.getenv('OPENWEATHERMAP_API_KEY', None)
 
-@tool
-def get_current_weather(lat: float, lon: float, units: str = 'metric', api_key: Optional[str] = None) -> Dict[Any, Any]:
+CURRENT_WEATHER_URL = "https://api.openweathermap.org/data/2.5/weather"
+HOURLY_FORECAST_URL = "https://pro.openweathermap.org/data/2.5/forecast/hourly"
+FORECAST_3HOUR_URL = "https://api.openweathermap.org/data/2.5/forecast"
+
+
+def get_params(lat: float, lon: float, units: str, api_key: Optional[str], **kwargs) -> Dict[str, Any]:
     """
-    Get current weather data for a specific location.
-    
-    Args:
-        lat: Latitude of the location
-        lon: Longitude of the location
-        units: Units of measurement. Options: 'standard', 'metric', or 'imperial'
-        api_key: OpenWeatherMap API key (optional, will use env var if not provided)
-    
-    Returns:
-        Dictionary containing current weather data
+    Builds the query parameters shared by all OpenWeatherMap requests
     """
     key = api_key or API_KEY
     if not key:
         raise ValueError("OpenWeatherMap API key not found. Set OPENWEATHERMAP_API_KEY environment variable or provide api_key parameter.")
     
-    url = f"https://api.openweathermap.org/data/2.5/weather"
     params = {
         'lat': lat,
         'lon': lon,
         'appid': key,
         'units': units
     }
-    
-    response = requests.get(url, params=params)
+    params.update(kwargs)
+    return params
+
+
+def fetch(url: str, params: Dict[str, Any]) -> Dict[Any, Any]:
+    response = nea_http.get(url, params=params)
     response.raise_for_status()
     return response.json()
 
+
+async def fetch_async(url: str, params: Dict[str, Any]) -> Dict[Any, Any]:
+    status, data = await nea_http.aget_json(url, params=params)
+    if status >= 400:
+        raise RuntimeError(f"OpenWeatherMap request to {url} failed with status code {status}: {data}")
+    return data
+
+
+# ----- Tool result caching -----
+# Results are cached per grid cell (see tool_cache.COORDINATE_GRID), units,
+# count and API key. The key is part of the cache key (as a digest, so that it
+# is not kept in memory) so that a result fetched with one key is never served
+# to a caller without a key, or with a key the API would reject.
+def api_key_digest(api_key: Optional[str]) -> Optional[str]:
+    key = api_key or API_KEY
+    return hashlib.sha256(key.encode()).hexdigest() if key else None
+
+
+owm_normalizers = {
+    'lat': round_to_grid,
+    'lon': round_to_grid,
+    'units': normalize_text,
+    'api_key': api_key_digest
+}
+
+
+def current_weather_expiry(data: Dict[Any, Any]) -> float:
+    # OpenWeatherMap updates current conditions about every 10 minutes
+    return data['dt'] + 600
+
+
+def forecast_expiry(data: Dict[Any, Any]) -> float:
+    # A forecast is superseded once its first timestamp has passed
+    return data['list'][0]['dt']
+
+
 @tool
+@memoize_tool(name='get_current_weather', ttl=current_weather_expiry, normalizers=owm_normalizers)
+def get_current_weather(lat: float, lon: float, units: str = 'metric', api_key: Optional[str] = None) -> Dict[Any, Any]:
+    """
+    Get current weather data for a specific location.
+    
+    Args:
+        lat: Latitude of the location
+        lon: Longitude of the location
+        units: Units of measurement. Options: 'standard', 'metric', or 'imperial'
+        api_key: OpenWeatherMap API key (optional, will use env var if not provided)
+    
+    Returns:
+        Dictionary containing current weather data
+    """
+    return fetch(CURRENT_WEATHER_URL, get_params(lat, lon, units, api_key))
+
+@tool
+@memoize_tool(name='get_hourly_forecast', ttl=forecast_expiry, normalizers=owm_normalizers)
 def get_hourly_forecast(lat: float, lon: float, units: str = 'metric', cnt: int = 96, api_key: Optional[str] = None) -> Dict[Any, Any]:
     """
     Get hourly weather forecast for 4 days (96 hours).
@@ -55,24 +113,11 @@ def get_hourly_forecast(lat: float, lon: float, units: str = 'metric', cnt: int
     Returns:
         Dictionary containing hourly forecast data
     """
-    key = api_key or API_KEY
-    if not key:
-        raise ValueError("OpenWeatherMap API key not found. Set OPENWEATHERMAP_API_KEY environment variable or provide api_key parameter.")
-    
-    url = f"https://pro.openweathermap.org/data/2.5/forecast/hourly"
-    params = {
-        'lat': lat,
-        'lon': lon,
-        'appid': key,
-        'units': units,
-        'cnt': min(cnt, 96)  # Ensure we don't exceed the maximum
-    }
-    
-    response = requests.get(url, params=params)
-    response.raise_for_status()
-    return response.json()
+    # Ensure we don't exceed the maximum
+    return fetch(HOURLY_FORECAST_URL, get_params(lat, lon, units, api_key, cnt=min(cnt, 96)))
 
 @tool
+@memoize_tool(name='get_forecast_3hour', ttl=forecast_expiry, normalizers=owm_normalizers)
 def get_forecast_3hour(lat: float, lon: float, units: str = 'metric', cnt: int = 40, api_key: Optional[str] = None) -> Dict[Any, Any]:
     """
     Get 3-hour step weather forecast for 5 days (40 timestamps).
@@ -87,19 +132,60 @@ def get_forecast_3hour(lat: float, lon: float, units: str = 'metric', cnt: int =
     Returns:
         Dictionary containing 3-hour forecast data
     """
-    key = api_key or API_KEY
-    if not key:
-        raise ValueError("OpenWeatherMap API key not found. Set OPENWEATHERMAP_API_KEY environment variable or provide api_key parameter.")
+    # Ensure we don't exceed the maximum
+    return fetch(FORECAST_3HOUR_URL, get_params(lat, lon, units, api_key, cnt=min(cnt, 40)))
+
+
+# ----- Async versions, registered with the agent under the same tool names -----
+@tool(name='get_current_weather')
+@memoize_tool(name='get_current_weather', ttl=current_weather_expiry, normalizers=owm_normalizers)
+async def get_current_weather_async(lat: float, lon: float, units: str = 'metric', api_key: Optional[str] = None) -> Dict[Any, Any]:
+    """
+    Get current weather data for a specific location.
     
-    url = f"https://api.openweathermap.org/data/2.5/forecast"
-    params = {
-        'lat': lat,
-        'lon': lon,
-        'appid': key,
-        'units': units,
-        'cnt': min(cnt, 40)  # Ensure we don't exceed the maximum
-    }
+    Args:
+        lat: Latitude of the location
+        lon: Longitude of the location
+        units: Units of measurement. Options: 'standard', 'metric', or 'imperial'
+        api_key: OpenWeatherMap API key (optional, will use env var if not provided)
     
-    response = requests.get(url, params=params)
-    response.raise_for_status()
-    return response.json()
+    Returns:
+        Dictionary containing current weather data
+    """
+    return await fetch_async(CURRENT_WEATHER_URL, get_params(lat, lon, units, api_key))
+
+@tool(name='get_hourly_forecast')
+@memoize_tool(name='get_hourly_forecast', ttl=forecast_expiry, normalizers=owm_normalizers)
+async def get_hourly_forecast_async(lat: float, lon: float, units: str = 'metric', cnt: int = 96, api_key: Optional[str] = None) -> Dict[Any, Any]:
+    """
+    Get hourly weather forecast for 4 days (96 hours).
+    
+    Args:
+        lat: Latitude of the location
+        lon: Longitude of the location
+        units: Units of measurement. Options: 'standard', 'metric', or 'imperial'
+        cnt: Number of timestamps to return (max 96 for 4 days)
+        api_key: OpenWeatherMap API key (optional, will use env var if not provided)
+    
+    Returns:
+        Dictionary containing hourly forecast data
+    """
+    return await fetch_async(HOURLY_FORECAST_URL, get_params(lat, lon, units, api_key, cnt=min(cnt, 96)))
+
+@tool(name='get_forecast_3hour')
+@memoize_tool(name='get_forecast_3hour', ttl=forecast_expiry, normalizers=owm_normalizers)
+async def get_forecast_3hour_async(lat: float, lon: float, units: str = 'metric', cnt: int = 40, api_key: Optional[str] = None) -> Dict[Any, Any]:
+    """
+    Get 3-hour step weather forecast for 5 days (40 timestamps).
+    
+    Args:
+        lat: Latitude of the location
+        lon: Longitude of the location
+        units: Units of measurement. Options: 'standard', 'metric', or 'imperial'
+        cnt: Number of timestamps to return (max 40 for 5 days)
+        api_key: OpenWeatherMap API key (optional, will use env var if not provided)
+    
+    Returns:
+        Dictionary containing 3-hour forecast data
+    """
+    return await fetch_async(FORECAST_3HOUR_URL, get_params(lat, lon, units, api_key, cnt=min(cnt, 40)))
@@ -0,0 +1,285 @@
+#!/usr/bin/env python
+
+# Dense array storage for historical PSI, PM2.5 and UV index readings.
+#
+# These feeds publish one reading per region, per hour and per metric, so
+# each feed-year is stored as a single NumPy array of shape
+# (region, hour of the year, metric), NaN where there is no reading:
+#
+#   data/air-quality/psi-2024.npz       6 regions x 8784 hours x 12 metrics
+#   data/air-quality/pm25-2024.npz      6 regions x 8784 hours x 1 metric
+#   data/air-quality/uv-2024.npz        1 region  x 8784 hours x 1 metric
+#   data/air-quality/manifest.json      hours stored per feed and date
+#
+# A year of PSI is 2.5 MB of float32 and loads with a single read, so trends
+# over several years are computed with NumPy reductions instead of parsing
+# json or pivoting long tables. Hours are in Singapore time.
+
+import datetime
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+
+DEFAULT_ROOT = 'data/air-quality'
+SGT = datetime.timezone(datetime.timedelta(hours=8))
+
+REGIONS = ('national', 'central', 'north', 'south', 'east', 'west')
+
+PSI_METRICS = (
+    'psi_twenty_four_hourly',
+    'pm25_twenty_four_hourly',
+    'pm25_sub_index',
+    'pm10_twenty_four_hourly',
+    'pm10_sub_index',
+    'o3_eight_hour_max',
+    'o3_sub_index',
+    'co_eight_hour_max',
+    'co_sub_index',
+    'so2_twenty_four_hourly',
+    'so2_sub_index',
+    'no2_one_hour_max'
+)
+
+# endpoint: path under nea_weather.base_url
+# window: first and last hour of the day with a published reading, inclusive
+#         (the UV index is only published from 7am to 7pm)
+# hours: number of hours with a reading for a day to count as complete,
+#        derived from the window
+FEEDS = {
+    'psi': {'endpoint': 'environment/psi', 'regions': REGIONS, 'metrics': PSI_METRICS, 'window': (0, 23)},
+    'pm25': {'endpoint': 'environment/pm25', 'regions': REGIONS, 'metrics': ('pm25_one_hourly',), 'window': (0, 23)},
+    'uv': {'endpoint': 'environment/uv-index', 'regions': ('national',), 'metrics': ('uv_index',), 'window': (7, 19)}
+}
+for spec in FEEDS.values():
+    spec['hours'] = spec['window'][1] - spec['window'][0] + 1
+
+# Number of fetches of a day that was already over after which it is no
+# longer retried, even if some of its hours are still missing (NEA has gaps
+# that are never filled)
+MAX_ATTEMPTS = 3
+
+
+# ----- Indexing -----
+def hours_in_year(year):
+    return (datetime.datetime(year + 1, 1, 1) - datetime.datetime(year, 1, 1)).days * 24
+
+
+def year_start(year):
+    return datetime.datetime(year, 1, 1, tzinfo=SGT)
+
+
+def hour_index(timestamp):
+    """
+    Returns (year, hour of the year) in Singapore time for an ISO 8601 timestamp
+    """
+    t = datetime.datetime.fromisoformat(timestamp).astimezone(SGT)
+    return t.year, int((t - year_start(t.year)).total_seconds() // 3600)
+
+
+def decode(feed, data):
+    """
+    Decodes one response of `feed` into flat arrays (year, hour, region,
+    metric, value), with regions and metrics as indices into FEEDS[feed].
+    Unknown regions and metrics are skipped.
+
+    Returns:
+        dict: {'year', 'hour', 'region', 'metric', 'value'} of numpy arrays
+    """
+    regions = { name: i for i, name in enumerate(FEEDS[feed]['regions']) }
+    metrics = { name: i for i, name in enumerate(FEEDS[feed]['metrics']) }
+    rows = []
+    for item in data.get('items', []):
+        if feed == 'uv':
+            # Each item repeats the readings of the previous hours of the day
+            for reading in item.get('index', []):
+                rows.append((reading.get('timestamp'), 'national', 'uv_index', reading.get('value')))
+            continue
+        for metric, values in item.get('readings', {}).items():
+            for region, value in values.items():
+                rows.append((item.get('timestamp'), region, metric, value))
+
+    columns = { key: [] for key in ['year', 'hour', 'region', 'metric', 'value'] }
+    for timestamp, region, metric, value in rows:
+        if timestamp is None or value is None or region not in regions or metric not in metrics:
+            continue
+        year, hour = hour_index(timestamp)
+        columns['year'].append(year)
+        columns['hour'].append(hour)
+        columns['region'].append(regions[region])
+        columns['metric'].append(metrics[metric])
+        columns['value'].append(value)
+    return {
+        'year': np.array(columns['year'], dtype=np.int16),
+        'hour': np.array(columns['hour'], dtype=np.int16),
+        'region': np.array(columns['region'], dtype=np.int8),
+        'metric': np.array(columns['metric'], dtype=np.int8),
+        'value': np.array(columns['value'], dtype=np.float32)
+    }
+
+
+def hours_by_date(decoded):
+    """
+    Returns {date: number of distinct hours with a reading}
+    """
+    counts = {}
+    for year, hour in set(zip(decoded['year'].tolist(), decoded['hour'].tolist())):
+        date = (year_start(year) + datetime.timedelta(hours=hour)).strftime('%Y-%m-%d')
+        counts[date] = counts.get(date, 0) + 1
+    return counts
+
+
+# ----- Storage -----
+def year_filename(feed, year, root=DEFAULT_ROOT):
+    return os.path.join(root, f'{feed}-{year}.npz')
+
+
+def empty_year(feed, year):
+    spec = FEEDS[feed]
+    return np.full((len(spec['regions']), hours_in_year(year), len(spec['metrics'])), np.nan, dtype=np.float32)
+
+
+def load_year(feed, year, root=DEFAULT_ROOT):
+    """
+    Returns the (region, hour, metric) array of one feed-year, all NaN if
+    nothing was stored yet
+    """
+    filename = year_filename(feed, year, root)
+    if not os.path.isfile(filename):
+        return empty_year(feed, year)
+    with np.load(filename) as f:
+        spec = FEEDS[feed]
+        if tuple(f['regions']) != spec['regions'] or tuple(f['metrics']) != spec['metrics']:
+            raise ValueError(f'{filename}: regions or metrics do not match FEEDS[{feed!r}]')
+        return f['values']
+
+
+def save_year(feed, year, values, root=DEFAULT_ROOT):
+    os.makedirs(root, exist_ok=True)
+    spec = FEEDS[feed]
+    filename = year_filename(feed, year, root)
+    tmp_filename = filename + '.tmp.npz'
+    np.savez(tmp_filename, values=values, regions=np.array(spec['regions']), metrics=np.array(spec['metrics']))
+    os.replace(tmp_filename, filename)
+
+
+def apply(arrays, feed, decoded, root=DEFAULT_ROOT):
+    """
+    Writes decoded readings into `arrays` ({(feed, year): values}), loading
+    feed-years from `root` as needed
+    """
+    for year in np.unique(decoded['year']).tolist():
+        key = (feed, year)
+        if key not in arrays:
+            arrays[key] = load_year(feed, year, root)
+        mask = decoded['year'] == year
+        arrays[key][decoded['region'][mask], decoded['hour'][mask], decoded['metric'][mask]] = decoded['value'][mask]
+
+
+def manifest_filename(root=DEFAULT_ROOT):
+    return os.path.join(root, 'manifest.json')
+
+
+def load_manifest(root=DEFAULT_ROOT):
+    """
+    Returns {feed: {date: {'hours', 'complete', 'fetched', 'attempts'}}}
+    """
+    filename = manifest_filename(root)
+    if not os.path.isfile(filename):
+        return {}
+    with open(filename) as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, root=DEFAULT_ROOT):
+    os.makedirs(root, exist_ok=True)
+    filename = manifest_filename(root)
+    tmp_filename = filename + '.tmp'
+    with open(tmp_filename, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_filename, filename)
+
+
+def fetched_date(entry):
+    return datetime.datetime.fromtimestamp(entry.get('fetched', 0), SGT).strftime('%Y-%m-%d')
+
+
+def record(manifest, feed, date, hours, fetched):
+    """
+    Records in `manifest` that `date` of `feed` was fetched at `fetched`
+    (epoch seconds) with `hours` hours of readings. 'attempts' counts the
+    fetches made after the day was over.
+    """
+    previous = manifest.setdefault(feed, {}).get(date, {})
+    entry = { 'hours': hours, 'complete': hours >= FEEDS[feed]['hours'], 'fetched': fetched }
+    entry['attempts'] = previous.get('attempts', 0) + 1 if date < fetched_date(entry) else 0
+    manifest[feed][date] = entry
+
+
+def is_done(date, entry):
+    """
+    A day is done when it is complete, or when it was already over when it
+    was fetched and either had no readings at all (NEA has no data for it)
+    or was fetched MAX_ATTEMPTS times (its gaps are permanent)
+    """
+    if entry is None:
+        return False
+    if entry.get('complete'):
+        return True
+    if date >= fetched_date(entry):
+        return False
+    return entry.get('hours') == 0 or entry.get('attempts', 0) >= MAX_ATTEMPTS
+
+
+def incomplete_dates(feed, dates, manifest):
+    """
+    Returns the dates of `feed` that were never fetched or were incomplete
+    """
+    days = manifest.get(feed, {})
+    return [ date for date in dates if not is_done(date, days.get(date)) ]
+
+
+# ----- Read -----
+def read(feed, start, end, regions=None, metrics=None, root=DEFAULT_ROOT):
+    """
+    Reads the hourly readings of `feed` from `start` to `end` (inclusive
+    dates, as datetime, date or 'YYYY-MM-DD'), optionally only for the given
+    `regions` and `metrics`.
+
+    Returns:
+        tuple: (pd.DatetimeIndex of the hours, values array of shape
+            (region, hour, metric)), in the order of `regions` and `metrics`
+    """
+    spec = FEEDS[feed]
+    regions = list(regions or spec['regions'])
+    metrics = list(metrics or spec['metrics'])
+    r = [ spec['regions'].index(x) for x in regions ]
+    m = [ spec['metrics'].index(x) for x in metrics ]
+    start = pd.Timestamp(str(start)[:10], tz=SGT)
+    end = pd.Timestamp(str(end)[:10], tz=SGT) + pd.Timedelta(days=1)
+
+    parts = []
+    for year in range(start.year, end.year + 1):
+        first = max(start, pd.Timestamp(year_start(year)))
+        last = min(end, pd.Timestamp(year_start(year + 1)))
+        if first >= last:
+            continue
+        i = int((first - pd.Timestamp(year_start(year))).total_seconds() // 3600)
+        j = int((last - pd.Timestamp(year_start(year))).total_seconds() // 3600)
+        values = load_year(feed, year, root)
+        parts.append(values[r, i:j, :][:, :, m])
+
+    hours = pd.date_range(start, end, freq='h', inclusive='left')
+    if not parts:
+        return hours, np.full((len(r), 0, len(m)), np.nan, dtype=np.float32)
+    return hours, np.concatenate(parts, axis=1)
+
+
+def read_frame(feed, metric, start, end, regions=None, root=DEFAULT_ROOT):
+    """
+    One metric as a DataFrame with one row per hour and one column per region
+    """
+    hours, values = read(feed, start, end, regions=regions, metrics=[metric], root=root)
+    return pd.DataFrame(values[:, :, 0].T, index=hours, columns=list(regions or FEEDS[feed]['regions']))
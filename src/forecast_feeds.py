@@ -0,0 +1,302 @@
+#!/usr/bin/env python
+
+# The realtime (v2) forecast feeds of data.gov.sg: their urls, fetching
+# (through the snapshot store when nea_poller.py runs) and an in-process
+# cache whose entries expire with the validity of each payload.
+#
+# Importing this module has no side effects (no fetch, no files, no
+# database), so small services such as mcp/nea_server.py can use the cache
+# without importing the agent tools in mcp/nea_tools.py.
+
+import asyncio
+import datetime
+import threading
+import time
+
+from typing import Dict, Any, Optional
+
+import nea_http
+from snapshot_store import get_snapshot
+
+
+url_list = {
+    '2hr-realtime': 'https://api-open.data.gov.sg/v2/real-time/api/two-hr-forecast',
+    '24hr-realtime': 'https://api-open.data.gov.sg/v2/real-time/api/twenty-four-hr-forecast',
+    '4day-realtime': 'https://api-open.data.gov.sg/v2/real-time/api/four-day-outlook'
+}
+
+# How often NEA publishes a new payload for each feed (seconds). Used together
+# with the payload's own validity to decide when a cached copy goes stale.
+publish_intervals = {
+    '2hr-realtime': 30 * 60,
+    '24hr-realtime': 6 * 3600,
+    '4day-realtime': 12 * 3600
+}
+
+def get_forecast(id: str):
+    """
+    Get weather forecast data from the data.gov.sg API based on the forecast type ID.
+    
+    Args:
+        id (str): The forecast type ID ('2hr-realtime', '24hr-realtime', or '4day-realtime')
+        
+    Returns:
+        dict: JSON response containing the forecast data if successful, None otherwise
+    """
+    if id in url_list:
+        # Written by nea_poller.py, when a snapshot store is configured
+        data = get_snapshot(id)
+        if data is not None:
+            return data
+
+        url = url_list[id]
+        try:
+            # Conditional request: an unchanged feed is served from the last parsed copy
+            status, data = nea_http.get_json_revalidated(url)
+        except Exception as e:
+            print(f'Error fetching {url}: {e}')
+            return None
+        if status == 200:
+            return data
+        else:
+            print(f'Error parsing json data from {url}. Status code: {status}')
+            return None
+    else:
+        print(f'Error: {id} not found in url_list')
+        return None
+
+
+async def get_forecast_async(id: str):
+    """
+    Async version of get_forecast(), which does not block the event loop
+    while waiting for data.gov.sg.
+    """
+    if id not in url_list:
+        print(f'Error: {id} not found in url_list')
+        return None
+    data = get_snapshot(id)
+    if data is not None:
+        return data
+    url = url_list[id]
+    try:
+        status, data = await nea_http.aget_json_revalidated(url)
+    except Exception as e:
+        print(f'Error fetching {url}: {e}')
+        return None
+    if status == 200:
+        return data
+    print(f'Error parsing json data from {url}. Status code: {status}')
+    return None
+
+
+
+def parse_timestamp(value: Optional[str]) -> Optional[float]:
+    """
+    Converts an ISO 8601 timestamp from the data.gov.sg API
+    (e.g. '2024-07-10T14:00:00+08:00') to epoch seconds.
+
+    Returns:
+        float: Epoch seconds, or None if the value is missing or malformed
+    """
+    if not value:
+        return None
+    try:
+        return datetime.datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def get_forecast_expiry(id: str, data: Dict[str, Any]) -> Optional[float]:
+    """
+    Works out when a forecast payload goes stale, based on the validity
+    information inside the payload itself.
+
+    The 2hr feed carries a valid_period; the 24hr feed carries a timePeriod
+    per period; all v2 feeds carry an updatedTimestamp / update_timestamp.
+    A payload expires at the earlier of the end of its first validity window
+    and its last update time plus the feed's publish interval.
+
+    Args:
+        id (str): The forecast type ID ('2hr-realtime', '24hr-realtime', or '4day-realtime')
+        data (dict): JSON response returned by get_forecast()
+
+    Returns:
+        float: Expiry time in epoch seconds, or None if it cannot be determined
+    """
+    try:
+        payload = data['data']
+    except (KeyError, TypeError):
+        return None
+
+    candidates = []
+    interval = publish_intervals.get(id)
+    if payload.get('items'):
+        item = payload['items'][0]
+        candidates.append(parse_timestamp(item.get('valid_period', {}).get('end')))
+        updated = parse_timestamp(item.get('update_timestamp'))
+    elif payload.get('records'):
+        record = payload['records'][0]
+        periods = record.get('periods') or []
+        if periods:
+            candidates.append(parse_timestamp(periods[0].get('timePeriod', {}).get('end')))
+        updated = parse_timestamp(record.get('updatedTimestamp'))
+    else:
+        updated = None
+
+    if updated is not None and interval is not None:
+        candidates.append(updated + interval)
+
+    candidates = [ t for t in candidates if t is not None ]
+    return min(candidates) if candidates else None
+
+
+class ForecastCache:
+    """
+    In-process cache for the realtime forecast feeds, keyed by feed id
+    ('2hr-realtime', '24hr-realtime', '4day-realtime').
+
+    Entries expire according to the validity of the payload they hold
+    (see get_forecast_expiry) rather than a fixed timer. Refreshes are
+    single-flight: while one caller is fetching a feed, concurrent callers
+    for the same feed wait for that fetch instead of starting their own.
+    If a refresh fails, the stale entry (if any) keeps being served.
+
+    get_async() is the asyncio equivalent of get(); it shares the same
+    entries, and its single-flight covers callers on the same event loop.
+
+    Args:
+        fetch (callable): Function taking a feed id and returning the JSON payload or None
+        fetch_async (callable): Coroutine function equivalent of `fetch`
+        min_ttl (float): Minimum lifetime of an entry in seconds, so that a payload which
+            is already past its validity (NEA publishing late) is not refetched on every call
+        max_ttl (float): Maximum lifetime of an entry in seconds
+    """
+
+    def __init__(self, fetch=None, fetch_async=None, min_ttl: float = 60, max_ttl: float = 6 * 3600):
+        self.fetch = fetch or get_forecast
+        self.fetch_async = fetch_async or get_forecast_async
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.stats = {'hits': 0, 'misses': 0, 'refreshes': 0, 'shared': 0, 'errors': 0}
+        self._entries = {}
+        self._inflight = {}
+        self._async_inflight = {}
+        self._lock = threading.Lock()
+
+    def get(self, id: str, process=None):
+        """
+        Returns the cached value for feed `id`, refreshing it if it has expired.
+
+        Args:
+            id (str): The forecast type ID
+            process (callable): Optional function applied to the raw payload once per
+                refresh; its result is what gets cached and returned
+
+        Returns:
+            The (processed) forecast data, or None if the feed could not be fetched
+        """
+        with self._lock:
+            entry = self._entries.get(id)
+            if entry is not None and entry['expires'] > time.time():
+                self.stats['hits'] += 1
+                return entry['value']
+            self.stats['misses'] += 1
+            flight = self._inflight.get(id)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[id] = threading.Event()
+
+        if not leader:
+            flight.wait()
+            with self._lock:
+                self.stats['shared'] += 1
+                entry = self._entries.get(id)
+            return entry['value'] if entry is not None else None
+
+        try:
+            return self._refresh(id, process, entry)
+        finally:
+            with self._lock:
+                del self._inflight[id]
+            flight.set()
+
+    async def get_async(self, id: str, process=None):
+        """
+        Async version of get(). The fetch is awaited and `process` (which may
+        write files) runs in a worker thread, so the event loop is never blocked.
+        """
+        with self._lock:
+            entry = self._entries.get(id)
+            if entry is not None and entry['expires'] > time.time():
+                self.stats['hits'] += 1
+                return entry['value']
+            self.stats['misses'] += 1
+            # Futures belong to one event loop: callers on other loops get their own flight
+            flight_key = (asyncio.get_running_loop(), id)
+            flight = self._async_inflight.get(flight_key)
+            leader = flight is None
+            if leader:
+                flight = self._async_inflight[flight_key] = flight_key[0].create_future()
+
+        if not leader:
+            await asyncio.shield(flight)
+            with self._lock:
+                self.stats['shared'] += 1
+                entry = self._entries.get(id)
+            return entry['value'] if entry is not None else None
+
+        try:
+            data = await self.fetch_async(id)
+            return await asyncio.to_thread(self._store, id, data, process, entry)
+        finally:
+            with self._lock:
+                del self._async_inflight[flight_key]
+            flight.set_result(None)
+
+    def _refresh(self, id, process, stale_entry):
+        return self._store(id, self.fetch(id), process, stale_entry)
+
+    def _store(self, id, data, process, stale_entry):
+        now = time.time()
+        if data is None:
+            with self._lock:
+                self.stats['errors'] += 1
+                if stale_entry is not None:
+                    stale_entry['expires'] = now + self.min_ttl
+            return stale_entry['value'] if stale_entry is not None else None
+
+        value = process(data) if process is not None else data
+        expires = get_forecast_expiry(id, data)
+        if expires is None:
+            expires = now + publish_intervals.get(id, self.min_ttl)
+        expires = min(max(expires, now + self.min_ttl), now + self.max_ttl)
+
+        with self._lock:
+            self.stats['refreshes'] += 1
+            self._entries[id] = {'value': value, 'expires': expires, 'fetched': now}
+        return value
+
+    def expires(self, id: str) -> Optional[float]:
+        """
+        Returns the expiry time (epoch seconds) of the entry for feed `id`, or None
+        """
+        with self._lock:
+            entry = self._entries.get(id)
+            return entry['expires'] if entry is not None else None
+
+    def invalidate(self, id: Optional[str] = None):
+        """
+        Drops the entry for feed `id`, or every entry if no id is given.
+        """
+        with self._lock:
+            if id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(id, None)
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Returns a copy of the hit/miss/refresh counters.
+        """
+        with self._lock:
+            return dict(self.stats)
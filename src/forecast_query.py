@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+
+# Queries over the archived 2 hour forecasts in the Parquet store
+# (forecast_store.py), e.g. "how often was Bedok showing Thundery Showers at
+# 3pm in June":
+#
+#   python nea_weather.py --start 2024-01-01 --end 2025-01-01 --to_parquet
+#   python forecast_query.py --build
+#   python forecast_query.py --area Bedok --condition "Thundery Showers" --hour 15 --start 2024-06-01 --end 2024-06-30
+#   python forecast_query.py --area Bedok --start 2024-06-01 --end 2024-06-30 --by hour
+#
+# Questions about condition frequencies are answered from precomputed hourly
+# counts (date, hour, area, forecast, count), one Parquet file per month:
+#
+#   data/aggregates/month=2024-06/hourly.parquet
+#
+# A month of counts is a few tens of thousands of rows at most, and month,
+# area and hour filters are pushed down to pyarrow, so a query over years of
+# history only reads the matching counts, never the forecasts themselves.
+# Daily counts are the hourly counts summed over the hours.
+#
+# build_aggregates() only recomputes the months whose forecast partitions
+# changed since their counts were written. Hours are in Singapore time, by
+# forecast timestamp.
+
+import argparse
+import datetime
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+import forecast_store
+
+
+DEFAULT_AGG_ROOT = 'data/aggregates'
+AGG_FILENAME = 'hourly.parquet'
+
+agg_schema = pa.schema([
+    ('date', pa.date32()),
+    ('hour', pa.int8()),
+    ('area', pa.dictionary(pa.int16(), pa.string())),
+    ('forecast', pa.dictionary(pa.int16(), pa.string())),
+    ('count', pa.int32()),
+])
+
+agg_partitioning = ds.partitioning(pa.schema([('month', pa.string())]), flavor='hive')
+
+
+
+# ----- Aggregates -----
+def month_of(date_str):
+    return date_str[:7]
+
+
+def agg_filename(month, agg_root=DEFAULT_AGG_ROOT):
+    return os.path.join(agg_root, f'month={month}', AGG_FILENAME)
+
+
+def partition_mtime(root, date_str):
+    """
+    Returns the last modification time of the forecast partition for `date_str`
+    """
+    directory = os.path.join(root, f'date={date_str}')
+    mtimes = [ os.path.getmtime(os.path.join(directory, name))
+               for name in os.listdir(directory) if name.endswith('.parquet') ]
+    return max(mtimes, default=0)
+
+
+def stale_months(root=forecast_store.DEFAULT_ROOT, agg_root=DEFAULT_AGG_ROOT):
+    """
+    Returns the sorted months whose hourly counts are missing or older than
+    one of their forecast partitions
+    """
+    months = {}
+    for date_str in forecast_store.list_dates(root):
+        if date_str == 'unknown':
+            continue
+        month = month_of(date_str)
+        months[month] = max(months.get(month, 0), partition_mtime(root, date_str))
+
+    stale = []
+    for month, mtime in months.items():
+        filename = agg_filename(month, agg_root)
+        if not os.path.isfile(filename) or os.path.getmtime(filename) < mtime:
+            stale.append(month)
+    return sorted(stale)
+
+
+def hourly_counts(df):
+    """
+    Counts forecasts by (date, hour, area, forecast) in a long-format
+    DataFrame from forecast_store.read_forecasts()
+    """
+    if df.empty:
+        return pd.DataFrame(columns=agg_schema.names)
+    timestamp = df['timestamp']
+    counts = df.assign(date=timestamp.dt.date, hour=timestamp.dt.hour) \
+        .groupby(['date', 'hour', 'area', 'forecast'], observed=True, sort=True) \
+        .size().rename('count').reset_index()
+    return counts[counts['count'] > 0]
+
+
+def build_month(month, root=forecast_store.DEFAULT_ROOT, agg_root=DEFAULT_AGG_ROOT):
+    """
+    Recomputes the hourly counts of one month ('YYYY-MM') from the forecasts
+
+    Returns:
+        int: Number of count rows written
+    """
+    first = datetime.date.fromisoformat(f'{month}-01')
+    last = (first + datetime.timedelta(days=31)).replace(day=1) - datetime.timedelta(days=1)
+    df = forecast_store.read_forecasts(root, first, last, columns=['timestamp', 'area', 'forecast'])
+    counts = hourly_counts(df)
+
+    filename = agg_filename(month, agg_root)
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    tmp_filename = os.path.join(os.path.dirname(filename), f'.{AGG_FILENAME}.tmp')
+    table = pa.Table.from_pandas(counts, schema=agg_schema, preserve_index=False)
+    pq.write_table(table, tmp_filename)
+    os.replace(tmp_filename, filename)
+    return len(counts)
+
+
+def build_aggregates(root=forecast_store.DEFAULT_ROOT, agg_root=DEFAULT_AGG_ROOT, force=False):
+    """
+    Brings the hourly counts up to date with the forecast store: only months
+    with new or rewritten partitions are recomputed, unless `force` is True
+
+    Returns:
+        list: The months that were rebuilt
+    """
+    if force:
+        months = sorted({ month_of(d) for d in forecast_store.list_dates(root) if d != 'unknown' })
+    else:
+        months = stale_months(root, agg_root)
+    for month in months:
+        n_rows = build_month(month, root, agg_root)
+        print(f'{month}: {n_rows} hourly counts')
+    return months
+
+
+
+# ----- Queries -----
+def to_date(x):
+    if x is None or isinstance(x, datetime.date):
+        return x.date() if isinstance(x, datetime.datetime) else x
+    return datetime.date.fromisoformat(x)
+
+
+def read_counts(agg_root=DEFAULT_AGG_ROOT, start=None, end=None, areas=None, hours=None, conditions=None):
+    """
+    Reads the hourly counts between `start` and `end` (inclusive dates, as
+    datetime, date or 'YYYY-MM-DD'), optionally only for the given `areas`,
+    `hours` (0-23) and forecast `conditions`.
+
+    Returns:
+        pd.DataFrame: Columns date, hour, area, forecast, count
+    """
+    if not os.path.isdir(agg_root):
+        return pd.DataFrame(columns=agg_schema.names)
+    start, end = to_date(start), to_date(end)
+
+    expr = None
+    for condition in [
+        ds.field('month') >= start.strftime('%Y-%m') if start is not None else None,
+        ds.field('month') <= end.strftime('%Y-%m') if end is not None else None,
+        ds.field('date') >= start if start is not None else None,
+        ds.field('date') <= end if end is not None else None,
+        ds.field('area').isin(list(areas)) if areas is not None else None,
+        ds.field('hour').isin(list(hours)) if hours is not None else None,
+        ds.field('forecast').isin(list(conditions)) if conditions is not None else None,
+    ]:
+        if condition is not None:
+            expr = condition if expr is None else expr & condition
+
+    dataset = ds.dataset(agg_root, format='parquet', partitioning=agg_partitioning,
+                         schema=agg_schema.append(pa.field('month', pa.string())))
+    return dataset.to_table(columns=agg_schema.names, filter=expr).to_pandas()
+
+
+def condition_frequency(area, condition, start=None, end=None, hours=None, agg_root=DEFAULT_AGG_ROOT):
+    """
+    How often `area` was forecast to have `condition` between `start` and
+    `end`, optionally only at the given `hours`
+
+    Returns:
+        dict: {'count', 'total', 'frequency'}, where total is the number of
+            forecasts for the area in that period
+    """
+    df = read_counts(agg_root, start, end, areas=[area], hours=hours)
+    total = int(df['count'].sum())
+    count = int(df.loc[df['forecast'] == condition, 'count'].sum())
+    return {
+        'count': count,
+        'total': total,
+        'frequency': count / total if total else None
+    }
+
+
+def condition_table(area=None, start=None, end=None, by='hour', hours=None, normalize=True,
+                    agg_root=DEFAULT_AGG_ROOT):
+    """
+    Frequency (or count) of every forecast condition, by `by`: 'hour' (0-23),
+    'date', 'month' or 'area'
+
+    Returns:
+        pd.DataFrame: One row per `by` value, one column per condition
+    """
+    df = read_counts(agg_root, start, end, areas=[area] if area else None, hours=hours)
+    if by == 'month':
+        df['month'] = pd.to_datetime(df['date']).dt.strftime('%Y-%m')
+    table = df.pivot_table(index=by, columns='forecast', values='count', aggfunc='sum',
+                           fill_value=0, observed=True)
+    table.columns = table.columns.astype(str)
+    if normalize:
+        table = table.div(table.sum(axis=1), axis=0)
+    return table
+
+
+def read_area_forecasts(area, start=None, end=None, root=forecast_store.DEFAULT_ROOT):
+    """
+    The individual forecasts for `area` between `start` and `end` (inclusive
+    datetimes or dates), for questions the counts cannot answer
+    """
+    df = forecast_store.read_forecasts(root, to_date(start), to_date(end), areas=[area])
+    df = df.sort_values('timestamp')
+    if isinstance(start, datetime.datetime):
+        df = df[df['timestamp'] >= pd.Timestamp(start, tz=forecast_store.TIMEZONE)]
+    if isinstance(end, datetime.datetime):
+        df = df[df['timestamp'] <= pd.Timestamp(end, tz=forecast_store.TIMEZONE)]
+    return df.reset_index(drop=True)
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Query the archived 2 hour forecasts')
+    parser.add_argument('--parquet_dir', default=forecast_store.DEFAULT_ROOT)
+    parser.add_argument('--agg_dir', default=DEFAULT_AGG_ROOT)
+    parser.add_argument('--build', action='store_true', help='Update the hourly counts of new or changed months')
+    parser.add_argument('--rebuild', action='store_true', help='Recompute the hourly counts of every month')
+    parser.add_argument('--area')
+    parser.add_argument('--condition', help='e.g. "Thundery Showers"')
+    parser.add_argument('--hour', type=int, action='append', help='Hour of day (0-23), may be repeated')
+    parser.add_argument('--start', help='YYYY-MM-DD')
+    parser.add_argument('--end', help='YYYY-MM-DD')
+    parser.add_argument('--by', choices=['hour', 'date', 'month', 'area'], help='Frequency of every condition by hour, date, month or area')
+    parser.add_argument('--counts', action='store_true', help='With --by, show counts instead of frequencies')
+    args = parser.parse_args()
+
+    if args.build or args.rebuild:
+        build_aggregates(args.parquet_dir, args.agg_dir, force=args.rebuild)
+    if args.condition:
+        if not args.area:
+            parser.error('--condition requires --area')
+        result = condition_frequency(args.area, args.condition, args.start, args.end, args.hour, args.agg_dir)
+        frequency = f"{result['frequency']:.1%}" if result['frequency'] is not None else '-'
+        print(f"{args.area}, {args.condition}: {result['count']}/{result['total']} forecasts ({frequency})")
+    if args.by:
+        table = condition_table(args.area, args.start, args.end, args.by, args.hour,
+                                normalize=not args.counts, agg_root=args.agg_dir)
+        with pd.option_context('display.max_rows', None, 'display.width', 200):
+            print(table.round(3))
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+
+# Columnar storage for historical 2 hour forecasts.
+#
+# Forecasts are stored in long format (one row per area per forecast) as
+# date-partitioned Parquet files:
+#
+#   data/parquet/date=2024-01-01/part-2024-01-01.parquet
+#   data/parquet/date=2024-01-02/part-2024-01-02.parquet
+#
+# Area names and forecast conditions are dictionary-encoded and timestamps are
+# stored as real timestamp columns, so loading a year of history does not
+# reparse text. read_forecasts() pushes date-range and area filters down to
+# pyarrow, so only the matching partitions are opened.
+
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+
+DEFAULT_ROOT = 'data/parquet'
+TIMEZONE = 'Asia/Singapore'
+TIME_COLUMNS = ['timestamp', 'update_timestamp', 'validity_start', 'validity_end']
+
+schema = pa.schema([
+    ('timestamp', pa.timestamp('s', tz=TIMEZONE)),
+    ('update_timestamp', pa.timestamp('s', tz=TIMEZONE)),
+    ('validity_start', pa.timestamp('s', tz=TIMEZONE)),
+    ('validity_end', pa.timestamp('s', tz=TIMEZONE)),
+    ('status', pa.dictionary(pa.int8(), pa.string())),
+    ('area', pa.dictionary(pa.int16(), pa.string())),
+    ('forecast', pa.dictionary(pa.int16(), pa.string())),
+])
+
+partitioning = ds.partitioning(pa.schema([('date', pa.string())]), flavor='hive')
+
+
+# ----- Conversion -----
+def rows_to_long(rows):
+    """
+    Converts the wide rows from nea_weather.get_forecast_rows() (one column per
+    area) into a long DataFrame with one row per (forecast time, area)
+    """
+    df = pd.DataFrame.from_dict(rows, orient='columns')
+    if df.empty:
+        return pd.DataFrame(columns=schema.names)
+    id_columns = [ c for c in TIME_COLUMNS + ['status'] if c in df.columns ]
+    df = df.melt(id_vars=id_columns, var_name='area', value_name='forecast')
+    df = df.dropna(subset=['forecast'])
+    return df.reindex(columns=schema.names)
+
+
+def to_table(df):
+    return pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+
+
+# ----- Write -----
+def write_forecasts(rows, part_name, root=DEFAULT_ROOT):
+    """
+    Writes forecast rows to `root`, one partition per calendar date (by
+    forecast timestamp). Each partition gets a file named part-{part_name},
+    so writing the same source again overwrites instead of duplicating.
+
+    Returns:
+        int: Number of long-format rows written
+    """
+    return write_long(rows_to_long(rows), part_name, root=root)
+
+
+def write_long(df, part_name, root=DEFAULT_ROOT):
+    """
+    Same as write_forecasts(), for rows that are already in long format
+    (time columns may still be ISO 8601 strings)
+    """
+    if df.empty:
+        return 0
+    for column in TIME_COLUMNS:
+        if not pd.api.types.is_datetime64_any_dtype(df[column]):
+            df[column] = pd.to_datetime(df[column].replace('-', None), utc=True, errors='coerce') \
+                .dt.tz_convert(TIMEZONE).dt.floor('s')
+    dates = df['timestamp'].dt.strftime('%Y-%m-%d').fillna('unknown')
+    for date, part in df.groupby(dates, sort=False):
+        directory = os.path.join(root, f'date={date}')
+        os.makedirs(directory, exist_ok=True)
+        filename = os.path.join(directory, f'part-{part_name}.parquet')
+        # Dot-files are ignored by pyarrow.dataset, so readers never see a half-written file
+        tmp_filename = os.path.join(directory, f'.part-{part_name}.parquet.tmp')
+        pq.write_table(to_table(part), tmp_filename)
+        os.replace(tmp_filename, filename)
+    return len(df)
+
+
+# ----- Read -----
+def to_date_str(x):
+    if x is None or isinstance(x, str):
+        return x
+    return x.strftime('%Y-%m-%d')
+
+
+def forecast_dataset(root=DEFAULT_ROOT):
+    return ds.dataset(root, format='parquet', partitioning=partitioning, schema=schema.append(pa.field('date', pa.string())))
+
+
+def read_forecasts(root=DEFAULT_ROOT, start=None, end=None, areas=None, columns=None):
+    """
+    Reads forecasts between `start` and `end` (inclusive dates, as datetime,
+    date or 'YYYY-MM-DD'), optionally only for the given `areas`.
+
+    The date bounds prune whole partitions before any file is opened; the
+    area filter is evaluated by pyarrow while scanning, so pandas only ever
+    sees the matching rows.
+
+    Returns:
+        pd.DataFrame: Long-format forecasts, with categorical area / forecast columns
+    """
+    if not os.path.isdir(root):
+        return pd.DataFrame(columns=schema.names)
+
+    expr = None
+    for condition in [
+        ds.field('date') >= to_date_str(start) if start is not None else None,
+        ds.field('date') <= to_date_str(end) if end is not None else None,
+        ds.field('area').isin(list(areas)) if areas is not None else None,
+    ]:
+        if condition is not None:
+            expr = condition if expr is None else expr & condition
+
+    table = forecast_dataset(root).to_table(columns=columns, filter=expr)
+    return table.to_pandas()
+
+
+def list_dates(root=DEFAULT_ROOT):
+    """
+    Returns the sorted list of dates that have a partition under `root`
+    """
+    if not os.path.isdir(root):
+        return []
+    return sorted(name[len('date='):] for name in os.listdir(root) if name.startswith('date='))
@@ -1,13 +1,22 @@
 #!/usr/bin/env python
 
 import argparse
+import asyncio
+import concurrent.futures
 import datetime
+import functools
 import json
-import math
-import requests
+import nea_http
+import queue
 import re
+import threading
+import time
 import urllib.parse
 
+from collections import OrderedDict
+from nea_geo import area_index
+from nea_model import FORECAST_CONDITIONS, area_table
+from snapshot_store import get_snapshot
 from pytz import timezone
 
 
@@ -43,16 +52,14 @@ def t_query(key):
     """
     Returns the raw text from a query
     """
-    url = urls[key]
-    resp = requests.get(url)
-    return resp.text
+    return default_client.t_query(key)
 
 
 def d_query(key):
     """
-    Returns a dictionary object from a query
+    Returns a dictionary object from a query (see NEAClient.d_query)
     """
-    return json.loads(t_query(key))
+    return default_client.d_query(key)
 
 
 def d_pprint(d, verbose=True):
@@ -89,14 +96,55 @@ def timediff_to_timestr(t_now, tt):
     return txt
 
 
+# Maximum number of feeds fetched at the same time by NEAClient.fetch_feeds()
+FEED_WORKERS = 8
+
+
+class DaemonExecutor(concurrent.futures.Executor):
+    """
+    Small pool of at most `max_workers` daemon threads, started as needed and
+    reused across calls. Threads of a ThreadPoolExecutor are joined when the
+    interpreter exits, even after shutdown(wait=False); daemon threads are
+    not, so a late request never delays the exit of the CLI or the widget.
+    """
+
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        self.queue = queue.SimpleQueue()
+        self.idle = threading.Semaphore(0)
+        self.workers = []
+        self.lock = threading.Lock()
+
+    def submit(self, fn, /, *args, **kwargs):
+        future = concurrent.futures.Future()
+        self.queue.put((future, fn, args, kwargs))
+        if not self.idle.acquire(blocking=False):
+            with self.lock:
+                if len(self.workers) < self.max_workers:
+                    worker = threading.Thread(target=self.work, name=f'nea-feed-{len(self.workers)}', daemon=True)
+                    self.workers.append(worker)
+                    worker.start()
+        return future
+
+    def work(self):
+        while True:
+            future, fn, args, kwargs = self.queue.get()
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(*args, **kwargs))
+                except BaseException as e:
+                    future.set_exception(e)
+            del future, fn, args, kwargs
+            self.idle.release()
+
+
+feed_executor = DaemonExecutor(FEED_WORKERS)
+
+
 # ----- Parsers -----
 def parse_areametadata(area_metadata):
-    d = {}
-    for area in area_metadata: 
-        name = area['name']
-        x = area['label_location']
-        d[name] = [x['latitude'], x['longitude']]
-    return d
+    # Built once per set of areas and shared (see nea_model.AreaTable.as_dict)
+    return area_table(area_metadata).as_dict()
 
 
 def parse_forecasts(forecasts):
@@ -108,19 +156,25 @@ def parse_forecasts(forecasts):
     return d
 
 
-def parse_2hr(d):
-    area_metadata = d['area_metadata']
-    area_metadata = parse_areametadata(area_metadata)
-
+def parse_2hr_snapshot(d):
+    """
+    Returns the AreaTable for the 2hr areas (reused across polls) and a tuple
+    of this poll's forecasts aligned to it, or None if there are no forecasts
+    """
+    table = area_table(d['area_metadata'])
     items = d['items'][0]
-    
-    try:
-        forecasts = items['forecasts']
-        forecasts = parse_forecasts(forecasts)
-        return area_metadata, forecasts
-    except:
+    if 'forecasts' not in items:
         print(f'Error: No "forecasts" key in items={items}')
-        return area_metadata, 'no forecast'
+        return table, None
+    return table, table.align(items['forecasts'])
+
+
+def parse_2hr(d):
+    table, forecasts = parse_2hr_snapshot(d)
+    if forecasts is None:
+        return table.as_dict(), 'no forecast'
+    forecasts = { name: x for name, x in zip(table.names, forecasts) if x is not None }
+    return table.as_dict(), forecasts
 
 
 def parse_readings(d):
@@ -155,53 +209,100 @@ def parse_general_forecast(g):
     return txt
 
 
-def remove_timezone_colon(d):
-    if d[-3:-2] == ':':
-        return d[:-3] + d[-2:]
-    else:
-        return d
+# ----- Formatting -----
+# Emoji for every condition of the NEA forecast vocabulary, by abbreviation
+# (see nea_model.FORECAST_CONDITIONS)
+CONDITION_EMOJI = {
+    'BR': '🌫',
+    'CL': '☁️',
+    'DR': '🌦',
+    'FA': '🌤',
+    'FG': '🌫',
+    'FN': '🌙',
+    'FW': '☀️',
+    'HG': '⛈💨',
+    'HR': '🌧',
+    'HS': '🌧',
+    'HT': '⛈',
+    'HZ': '🌫',
+    'LH': '🌫',
+    'LR': '🌦',
+    'LS': '🌦',
+    'OC': '☁️',
+    'PC': '⛅',
+    'PN': '⛅',
+    'PS': '🌦',
+    'RA': '🌧',
+    'SH': '🌦',
+    'SK': '💨, 🌦',
+    'SN': '🌨',
+    'SR': '💨, 🌧',
+    'SS': '🌨',
+    'SU': '☀️',
+    'SW': '💨',
+    'TL': '⛈',
+    'WC': '💨, ☁️',
+    'WD': '💨',
+    'WF': '💨, 🌤',
+    'WR': '💨, 🌧',
+    'WS': '💨, 🌦'
+}
+# By condition text. Longer phrases are matched first, so 'Heavy Thundery Showers'
+# is not read as 'Thundery Showers', nor 'Partly Cloudy' as 'Cloudy'.
+EMOJI = { text: CONDITION_EMOJI[abbr] for abbr, text in FORECAST_CONDITIONS }
+EMOJI_PATTERN = re.compile('|'.join(re.escape(k) for k in sorted(EMOJI, key=len, reverse=True)))
+REGION_LABELS = [ ('central', 'Central'), ('north', 'North'), ('south', 'South'), ('east', 'East'), ('west', 'West') ]
 
 
+@functools.lru_cache(maxsize=1024)
 def emojify(x):
-    x = re.sub('Thundery Showers', '⛈', x)
-    x = re.sub('Cloudy', '☁️', x)
-    x = re.sub('Fair', '🌤', x)
-    x = re.sub('Windy', '💨', x)
-    return x
+    """
+    Replaces the condition words in `x` by emoji, in a single pass
+    """
+    return EMOJI_PATTERN.sub(lambda m: EMOJI[m.group(0)], x)
+
+
+# Formatted periods, keyed by (start, end, regions..., date of `now`)
+_PERIOD_CACHE_SIZE = 256
+_period_lock = threading.Lock()
+_period_cache = OrderedDict()
+
+
+def format_period(period, now):
+    """
+    Returns (time range text, [emojified forecast per region in REGION_LABELS order])
+    for one period of the 24hr forecast. Results are memoized for the day of `now`.
+    """
+    tt = period['time']
+    regions = period['regions']
+    key = (tt['start'], tt['end']) + tuple(regions[r] for r, label in REGION_LABELS) + (now.date(),)
+    with _period_lock:
+        result = _period_cache.get(key)
+    if result is None:
+        start = datetime.datetime.fromisoformat(tt['start'])
+        end = datetime.datetime.fromisoformat(tt['end'])
+        time_txt = f"{timediff_to_timestr(now, start)} - {timediff_to_timestr(now, end)}"
+        result = (time_txt, [ emojify(x) for x in key[2:-1] ])
+        with _period_lock:
+            _period_cache[key] = result
+            if len(_period_cache) > _PERIOD_CACHE_SIZE:
+                _period_cache.popitem(last=False)
+    return result
 
 
 def parse_periods(periods, by_period=True):
     now = datetime.datetime.now(timezone('Singapore'))
-    fmt = "%Y-%m-%dT%H:%M:%S%z"
-    txt = ""
-    central_txt, north_txt, south_txt, east_txt, west_txt = '[Central]', '[North]', '[South]', '[East]', '[West]'
-    for i, p in enumerate(periods):
-        tt = p['time']
-        tts = remove_timezone_colon(tt['start'])
-        tte = remove_timezone_colon(tt['end'])
-        start = datetime.datetime.strptime(tts, fmt)
-        end = datetime.datetime.strptime(tte, fmt)
-        start_txt = timediff_to_timestr(now, start) + " - " + \
-            timediff_to_timestr(now, end)
-
-        regions = p['regions']
-        west = emojify(regions['west'])
-        east = emojify(regions['east'])
-        central = emojify(regions['central'])
-        south = emojify(regions['south'])
-        north = emojify(regions['north'])
-        if by_period:
-            txt += f"{start_txt}: Central - {central}, North - {north}, South - {south}, East - {east}, West - {west}\n"
-        else:
-            central_txt += f' {central} ({start_txt})'
-            north_txt += f' {north} ({start_txt})'
-            south_txt += f' {south} ({start_txt})'
-            east_txt += f' {east} ({start_txt})'
-            west_txt += f' {west} ({start_txt})'
+    formatted = [ format_period(p, now) for p in periods ]
     if by_period:
-        return txt.strip()
+        return '\n'.join(
+            f"{time_txt}: " + ', '.join(f'{label} - {x}' for (r, label), x in zip(REGION_LABELS, forecasts))
+            for time_txt, forecasts in formatted
+        )
     else:
-        return f'{central_txt}\n{north_txt}\n{south_txt}\n{east_txt}\n{west_txt}'
+        return '\n'.join(
+            ' '.join([ f'[{label}]' ] + [ f'{forecasts[j]} ({time_txt})' for time_txt, forecasts in formatted ])
+            for j, (r, label) in enumerate(REGION_LABELS)
+        )
 
 
 # ----- Location Library -----
@@ -219,75 +320,59 @@ def get_location():
         return [ LATITUDE, LONGITUDE ]
 
 
-def get_nearest_location(x, places):
+def get_nearest_location(x, places, index=None):
     """
     Given a location `x`, and a list of locations, `places`,
-    returns the list index corresponding to the minimum distance,
-    and the minimum distance.
+    returns the nearest place and its distance in km.
+
+    `index` is the nea_geo.area_index(places) to search. Looking it up
+    takes a pass over `places`, so when querying the same places many
+    times, get the index once and pass it in.
     """
-    min_dist, min_i = 1e10, 0
-    for i, place in enumerate(places):
-        name = place['name']
-        label_location = place['label_location']
-        latitude = float(label_location['latitude'])
-        longitude = float(label_location['longitude'])
-        r2 = (x[0] - latitude)**2 + (x[1] - longitude)**2
-        if r2 < min_dist:
-            min_dist = r2
-            min_i = i
-    return places[min_i], math.sqrt(min_dist)
+    if index is None:
+        index = area_index(places)
+    i, dist = index.nearest(float(x[0]), float(x[1]))
+    return places[i], dist
 
 
 # ----- Forecasts -----
-def now_cast():
-    d = d_query('2hr')
-    # print(d['items'][0])
-    if len(d['items'][0]) == 0:
-        print(f'2 hour query returns: {d}')
-        return 'Now: no forecast'
-    
-    area_metadata, forecasts = parse_2hr(d)
-    x = [ float(LATITUDE),
-          float(LONGITUDE) ]
-    
-    place, dist = get_nearest_location(x, d['area_metadata'])
-    x = place['label_location']
-    name = place['name']
-    nowcast = emojify(forecasts[name])
-    txt = f"Now: {nowcast} at {name}"
-    return txt
+# Wrappers around the default client, for the location in LATITUDE / LONGITUDE
+# (now_cast) or from get_location() (the others)
+def now_cast(d=None):
+    return default_client.now_cast(d, location=(LATITUDE, LONGITUDE))
 
 
-def forecast_24hr():
-    d = d_query('24hr')
-    status = d['api_info']['status']
-    items = d['items'][0]
-    general = items['general']
-    periods = items['periods']
-    txt = parse_general_forecast(general)
-    txt += "\n" + parse_periods(periods, by_period=False)
+def forecast_24hr(d=None):
+    return default_client.forecast_24hr(d)
+
+
+def forecast_pm25(d=None):
+    return default_client.forecast_pm25(d, location=get_location())
+
+
+def forecast_psi(d=None):
+    return default_client.forecast_psi(d, location=get_location())
+
+
+def forecast_psi_all(d=None):
+    return default_client.forecast_psi_all(d, location=get_location())
+
+
+def render_now_cast(table, forecasts, i):
+    name = table.names[i]
+    if forecasts is None or forecasts[i] is None:
+        return f'Now: no forecast at {name}'
+    nowcast = emojify(forecasts[i])
+    txt = f"Now: {nowcast} at {name}"
     return txt
 
 
-def forecast_pm25():
-    d = d_query('pm25')
-    region_metadata, pm25 = parse_pm25(d)
-    x = get_location()
-    place, dist = get_nearest_location(x, region_metadata)
-    name = place['name']
-    x = place['label_location']
+def render_pm25(pm25, name):
     txt = f"PM2.5: {pm25[name]} (location = {name})"
     return txt
 
 
-def forecast_psi():
-    d = d_query('psi')
-    region_metadata, readings = parse_psi(d)
-    x = get_location()
-    place, dist = get_nearest_location(x, region_metadata)
-    name = place['name']
-    x = place['label_location']
-    
+def render_psi(readings, name):
     pm10_twenty_four_hourly = readings['pm10_twenty_four_hourly']
     pm25_twenty_four_hourly = readings['pm25_twenty_four_hourly']
     psi_twenty_four_hourly = readings['psi_twenty_four_hourly']
@@ -297,14 +382,7 @@ def forecast_psi():
     return txt
 
 
-def forecast_psi_all():
-    d = d_query('psi')
-    region_metadata, readings = parse_psi(d)
-    x = get_location()
-    place, dist = get_nearest_location(x, region_metadata)
-    name = place['name']
-    x = place['label_location'] 
-
+def render_psi_all(readings, name):
     o3_sub_index = readings['o3_sub_index']
     pm10_twenty_four_hourly = readings['pm10_twenty_four_hourly']
     pm10_sub_index = readings['pm10_sub_index']
@@ -327,6 +405,398 @@ def forecast_psi_all():
     return txt
 
 
+# ----- Dashboard -----
+# Text renderers (NEAClient methods) for the keys in `urls`; other keys are returned as parsed json
+renderers = {
+    '2hr': 'now_cast',
+    '24hr': 'forecast_24hr',
+    'pm25': 'forecast_pm25',
+    'psi': 'forecast_psi'
+}
+
+
+def fetch_feeds(keys, deadline=10.0):
+    """
+    Fetches all `keys` (from `urls`) concurrently (see NEAClient.fetch_feeds)
+    """
+    return default_client.fetch_feeds(keys, deadline)
+
+
+def dashboard(keys=('2hr', '24hr'), deadline=10.0):
+    """
+    Fetches all `keys` (from `urls`) concurrently and renders each one
+    for the current location (see NEAClient.dashboard)
+    """
+    return default_client.dashboard(keys, deadline, location=get_location())
+
+
+def render_batch(users, keys=('2hr', 'pm25', 'psi'), deadline=10.0, feeds=None):
+    """
+    Renders the texts of `keys` for many users at once (see NEAClient.render_batch)
+    """
+    return default_client.render_batch(users, keys, deadline, feeds)
+
+
+# ----- Batch Rendering -----
+def locate_2hr(d):
+    """
+    Returns the nearest-area index for the 2hr feed and a function
+    rendering the text for area i
+    """
+    table, forecasts = parse_2hr_snapshot(d)
+    return table.index, table.names, lambda i: render_now_cast(table, forecasts, i)
+
+
+def locate_readings(parse, render):
+    def locate(d):
+        region_metadata, readings = parse(d)
+        names = [ region['name'] for region in region_metadata ]
+        return area_index(region_metadata), names, lambda i: render(readings, names[i])
+    return locate
+
+
+# Location-dependent renderers, by key: each returns (index, area names, render(i))
+locators = {
+    '2hr': locate_2hr,
+    'pm25': locate_readings(parse_pm25, render_pm25),
+    'psi': locate_readings(parse_psi, render_psi),
+    'psi_all': locate_readings(parse_psi, render_psi_all)
+}
+
+# Number of located feed versions kept by each client (see NEAClient.locate)
+LOCATED_CACHE_SIZE = 16
+
+# Feed keys of the batch keys that are not in `urls`
+feed_keys = {
+    'psi_all': 'psi'
+}
+
+
+def feed_version(d):
+    """
+    Returns the update timestamp of a feed response, or None if it has none
+    """
+    items = d.get('items') or [{}]
+    return items[0].get('update_timestamp') or items[0].get('timestamp')
+
+
+# ----- Client -----
+class NEAClient:
+    """
+    NEA feed client holding its own configuration, HTTP session, render
+    cache and default location, so several clients (or one client used for
+    many locations) can run side by side in one process.
+
+    Feeds are read from the shared snapshot store kept up to date by
+    nea_poller.py when one is configured, and fetched from data.gov.sg otherwise.
+
+    The configuration and location are fixed at construction and every
+    method takes an optional `location`, so a client can be shared across
+    threads; caches and counters are guarded by a lock. Sync methods can be
+    called from asyncio code with asyncio.to_thread(); d_query_async() and
+    fetch_feeds_async() run on the event loop.
+
+    Args:
+        latitude (float): Default latitude for the location-dependent forecasts
+        longitude (float): Default longitude
+        urls (dict): Feed urls by key (defaults to the module's `urls`)
+        session (requests.Session): HTTP session (defaults to the shared nea_http pool)
+        render_cache_size (int): Number of rendered texts kept for render_batch()
+        store (SnapshotStore): Snapshot store to read feeds from (defaults to $NEA_SNAPSHOT_DB, if set)
+    """
+
+    def __init__(self, latitude=None, longitude=None, urls=urls, session=None, render_cache_size=4096, store=None):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.urls = urls
+        self.session = session
+        self.render_cache_size = render_cache_size
+        self.store = store
+        self.render_stats = {'users': 0, 'renders': 0}
+        self._lock = threading.Lock()
+        self._render_cache = OrderedDict()
+        self._located = OrderedDict()
+        self._fetching = {}
+
+    def __repr__(self):
+        return f'NEAClient(latitude={self.latitude}, longitude={self.longitude})'
+
+    def location(self, location=None):
+        """
+        Returns `location` as (latitude, longitude) floats, or the client's own location
+        """
+        latitude, longitude = location if location is not None else (self.latitude, self.longitude)
+        if latitude is None or longitude is None:
+            raise ValueError('No location: pass location=(latitude, longitude) or create the client with one')
+        return float(latitude), float(longitude)
+
+    # ----- Queries -----
+    def snapshot(self, key):
+        """
+        Returns the live snapshot of feed `key` from the snapshot store, or None
+        """
+        if self.store is None:
+            return get_snapshot(key)
+        return self.store.get(key)
+
+    def t_query(self, key):
+        """
+        Returns the raw text from a query
+        """
+        resp = nea_http.get(self.urls[key], session=self.session)
+        return resp.text
+
+    def d_query(self, key):
+        """
+        Returns a dictionary object from a query.
+        Repeated queries are conditional (ETag / Last-Modified), so an unchanged
+        feed is neither downloaded nor parsed again. Do not modify the result.
+        """
+        d = self.snapshot(key)
+        if d is not None:
+            return d
+        url = self.urls[key]
+        status, d = nea_http.get_json_revalidated(url, session=self.session)
+        if d is None:
+            raise ValueError(f'{url} returned status code {status}')
+        return d
+
+    async def d_query_async(self, key):
+        """
+        Async version of d_query(), on the shared aiohttp session of the running loop
+        """
+        d = self.snapshot(key)
+        if d is not None:
+            return d
+        url = self.urls[key]
+        status, d = await nea_http.aget_json_revalidated(url)
+        if d is None:
+            raise ValueError(f'{url} returned status code {status}')
+        return d
+
+    def fetch_feeds(self, keys, deadline=10.0):
+        """
+        Fetches all `keys` (from `urls`) concurrently.
+
+        `deadline` is the number of seconds to wait for each feed, either one
+        value for all feeds or a dict of {key: seconds}. Feeds that are late or
+        fail are returned as None, so the total latency is that of the slowest
+        feed within its deadline instead of the sum of all round trips.
+
+        Feeds are fetched on the shared feed_executor (at most FEED_WORKERS
+        daemon threads, see DaemonExecutor): a late feed is abandoned, its
+        request finishes in the background or is cut off when the process
+        exits, and a feed still queued at its deadline is not fetched at all.
+        A feed whose previous fetch is still running is not requested again:
+        the call waits for that fetch instead, so a slow feed holds at most
+        one thread.
+
+        Returns:
+            dict: {key: parsed json, or None}
+        """
+        t_start = time.monotonic()
+        futures = {}
+        with self._lock:
+            for key in keys:
+                future = self._fetching.get(key)
+                if future is None or future.done():
+                    future = self._fetching[key] = feed_executor.submit(self.d_query, key)
+                futures[key] = future
+
+        results = {}
+        for key, future in futures.items():
+            timeout = deadline.get(key, 10.0) if isinstance(deadline, dict) else deadline
+            try:
+                results[key] = future.result(timeout=max(0, t_start + timeout - time.monotonic()))
+            except concurrent.futures.TimeoutError:
+                future.cancel()
+                print(f'{key}: no response within {timeout}s')
+                results[key] = None
+            except Exception as e:
+                print(f'{key}: query failed ({e})')
+                results[key] = None
+        return results
+
+    async def fetch_feeds_async(self, keys, deadline=10.0):
+        """
+        Async version of fetch_feeds()
+        """
+        async def fetch(key):
+            timeout = deadline.get(key, 10.0) if isinstance(deadline, dict) else deadline
+            try:
+                return await asyncio.wait_for(self.d_query_async(key), timeout)
+            except asyncio.TimeoutError:
+                print(f'{key}: no response within {timeout}s')
+            except Exception as e:
+                print(f'{key}: query failed ({e})')
+            return None
+
+        return dict(zip(keys, await asyncio.gather(*[ fetch(key) for key in keys ])))
+
+    # ----- Forecasts -----
+    def now_cast(self, d=None, location=None):
+        if d is None:
+            d = self.d_query('2hr')
+        if len(d['items'][0]) == 0:
+            print(f'2 hour query returns: {d}')
+            return 'Now: no forecast'
+
+        index, names, render = self.locate('2hr', d)
+        i, dist = index.nearest(*self.location(location))
+        return render(i)
+
+    def forecast_24hr(self, d=None, location=None):
+        if d is None:
+            d = self.d_query('24hr')
+        items = d['items'][0]
+        txt = parse_general_forecast(items['general'])
+        txt += "\n" + parse_periods(items['periods'], by_period=False)
+        return txt
+
+    def forecast_pm25(self, d=None, location=None):
+        if d is None:
+            d = self.d_query('pm25')
+        index, names, render = self.locate('pm25', d)
+        i, dist = index.nearest(*self.location(location))
+        return render(i)
+
+    def forecast_psi(self, d=None, location=None):
+        if d is None:
+            d = self.d_query('psi')
+        index, names, render = self.locate('psi', d)
+        i, dist = index.nearest(*self.location(location))
+        return render(i)
+
+    def forecast_psi_all(self, d=None, location=None):
+        if d is None:
+            d = self.d_query('psi')
+        index, names, render = self.locate('psi_all', d)
+        i, dist = index.nearest(*self.location(location))
+        return render(i)
+
+    def render(self, key, d, location=None):
+        """
+        Renders an already fetched feed (parsed json is returned as it is for keys without a renderer)
+        """
+        name = renderers.get(key)
+        return getattr(self, name)(d, location=location) if name is not None else d
+
+    def dashboard(self, keys=('2hr', '24hr'), deadline=10.0, location=None):
+        """
+        Fetches all `keys` concurrently (see fetch_feeds) and renders each one
+
+        Returns:
+            dict: {key: rendered text (or parsed json if there is no renderer), or None}
+        """
+        results = {}
+        for key, d in self.fetch_feeds(keys, deadline).items():
+            if d is None:
+                results[key] = None
+                continue
+            try:
+                results[key] = self.render(key, d, location)
+            except Exception as e:
+                print(f'{key}: unexpected response ({e})')
+                results[key] = None
+        return results
+
+    def locate(self, key, d):
+        """
+        Returns (nearest-area index, area names, render(i)) for feed response
+        `d` of a location-dependent `key` (see locators). The result is
+        cached by (key, feed version), so that repeated queries against an
+        unchanged feed neither parse it nor look up its index again.
+        """
+        version = feed_version(d)
+        cache_key = (key, version)
+        with self._lock:
+            located = self._located.get(cache_key)
+        if located is None:
+            located = locators[key](d)
+            if version is not None:
+                with self._lock:
+                    self._located[cache_key] = located
+                    if len(self._located) > LOCATED_CACHE_SIZE:
+                        self._located.popitem(last=False)
+        return located
+
+    # ----- Batch Rendering -----
+    def render_area(self, key, version, name, render, i):
+        """
+        Rendered text for one area, cached by (key, feed version, area name)
+        """
+        cache_key = (key, version, name)
+        with self._lock:
+            txt = self._render_cache.get(cache_key)
+        if txt is None:
+            txt = render(i)
+            with self._lock:
+                self.render_stats['renders'] += 1
+                if version is not None:
+                    self._render_cache[cache_key] = txt
+                    if len(self._render_cache) > self.render_cache_size:
+                        self._render_cache.popitem(last=False)
+        return txt
+
+    def render_batch(self, users, keys=('2hr', 'pm25', 'psi'), deadline=10.0, feeds=None):
+        """
+        Renders the texts of `keys` for many users at once.
+
+        Every feed is fetched once (concurrently, see fetch_feeds) and the
+        nearest area of every user is resolved in one pass per feed. Each
+        (area, feed version) is rendered only once and shared by all users in
+        that area, including across calls while the feed is unchanged.
+        Keys without a location (e.g. '24hr') are rendered once for everybody.
+
+        Args:
+            users (list): (user_id, latitude, longitude) tuples
+            keys (tuple): Keys of `urls`, or 'psi_all'
+            feeds (dict): Already fetched {feed key: parsed json}, to skip fetching
+
+        Returns:
+            dict: {user_id: {key: text, or None if the feed failed}}
+        """
+        needed = list(dict.fromkeys(feed_keys.get(key, key) for key in keys))
+        if feeds is None:
+            feeds = self.fetch_feeds(needed, deadline)
+        else:
+            missing = [ key for key in needed if key not in feeds ]
+            feeds = dict(feeds, **(self.fetch_feeds(missing, deadline) if missing else {}))
+
+        points = [ (float(lat), float(lon)) for user_id, lat, lon in users ]
+        results = { user_id: {} for user_id, lat, lon in users }
+        for key in keys:
+            d = feeds.get(feed_keys.get(key, key))
+            texts = None
+            try:
+                if d is None:
+                    pass
+                elif key in locators:
+                    index, names, render = self.locate(key, d)
+                    version = feed_version(d)
+                    # Render each distinct area once, then fan out to its users
+                    nearest = [ i for i, dist in index.nearest_many(points) ]
+                    by_area = { i: self.render_area(key, version, names[i], render, i) for i in set(nearest) }
+                    texts = [ by_area[i] for i in nearest ]
+                else:
+                    texts = [ self.render(key, d) ] * len(users)
+            except Exception as e:
+                print(f'{key}: unexpected response ({e})')
+                texts = None
+
+            for j, (user_id, lat, lon) in enumerate(users):
+                results[user_id][key] = texts[j] if texts is not None else None
+
+        with self._lock:
+            self.render_stats['users'] += len(users)
+        return results
+
+
+# Client behind the module-level functions, sharing the module's `urls`
+default_client = NEAClient()
+render_stats = default_client.render_stats
+
+
 # ----- Main -----
 def main(args):
     if args.key == '2hr':
@@ -361,8 +831,8 @@ if __name__ == "__main__":
     except:
         pass
 
-    weather_txt = now_cast()
-    weather_txt += '\n' + forecast_24hr()
+    feeds = dashboard(['2hr', '24hr'])
+    weather_txt = '\n'.join(txt for txt in feeds.values() if txt)
 
     try:
         v = ui.load_view()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+
+import math
+import threading
+
+from collections import OrderedDict
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+EARTH_RADIUS_KM = 6371
+
+
+# ----- Distances -----
+def haversine(lat1, lon1, lat2, lon2):
+    """
+    Great circle distance in km between two points
+    specified in decimal degrees
+    """
+    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+    a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def haversine_np(lat1, lon1, lat2, lon2):
+    """
+    Vectorized haversine: same as haversine() but takes NumPy arrays
+    (or scalars) and broadcasts them against each other
+    """
+    lat1, lon1, lat2, lon2 = map(np.radians, [lat1, lon1, lat2, lon2])
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+    a = np.sin(dlat/2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon/2)**2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def nearest_points(latitudes, longitudes, ref_latitudes, ref_longitudes, chunk_size=65536):
+    """
+    For each point in (latitudes, longitudes), finds the nearest reference point
+    by haversine distance, in one vectorized pass over an (N, M) distance matrix.
+    Points are processed `chunk_size` rows at a time to bound memory.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: index of the nearest reference point and
+            its distance in km, one entry per input point
+    """
+    latitudes = np.asarray(latitudes, dtype=float).ravel()
+    longitudes = np.asarray(longitudes, dtype=float).ravel()
+    ref_latitudes = np.asarray(ref_latitudes, dtype=float)[np.newaxis, :]
+    ref_longitudes = np.asarray(ref_longitudes, dtype=float)[np.newaxis, :]
+
+    indices = np.empty(len(latitudes), dtype=np.intp)
+    distances = np.empty(len(latitudes), dtype=float)
+    for start in range(0, len(latitudes), chunk_size):
+        end = start + chunk_size
+        d = haversine_np(latitudes[start:end, np.newaxis], longitudes[start:end, np.newaxis],
+                         ref_latitudes, ref_longitudes)
+        i = d.argmin(axis=1)
+        indices[start:end] = i
+        distances[start:end] = d[np.arange(len(i)), i]
+    return indices, distances
+
+
+# ----- Area Metadata -----
+def area_coordinates(area):
+    """
+    Returns (name, latitude, longitude) for an area record in any of the
+    formats used in this project:
+      - NEA area_metadata / region_metadata: {'name', 'label_location': {'latitude', 'longitude'}}
+      - nea_weather.get_area_metadata: {'name', 'latitude', 'longitude'}
+      - nea_tools.convert_weather_data: {'location_name', 'latitude', 'longitude'}
+    """
+    name = area.get('name', area.get('location_name'))
+    location = area.get('label_location', area)
+    return name, float(location['latitude']), float(location['longitude'])
+
+
+# ----- Nearest Area Index -----
+class NearestAreaIndex:
+    """
+    2-d tree over a fixed set of areas, for nearest-area queries in
+    O(log n) instead of a scan over every area.
+
+    Coordinates are projected to km on an equirectangular plane centred on the
+    areas' mean latitude. Over the extent of Singapore this agrees with the
+    haversine distance to well under 0.1%.
+
+    Args:
+        areas (list): Area records (see area_coordinates). Query results are
+            positions in this list.
+    """
+
+    def __init__(self, areas):
+        coords = [ area_coordinates(area) for area in areas ]
+        self.names = [ c[0] for c in coords ]
+        if not coords:
+            raise ValueError('NearestAreaIndex needs at least one area')
+
+        lat_ref = sum(c[1] for c in coords) / len(coords)
+        self._kx = math.radians(1) * EARTH_RADIUS_KM * math.cos(math.radians(lat_ref))
+        self._ky = math.radians(1) * EARTH_RADIUS_KM
+        self._points = [ (c[2] * self._kx, c[1] * self._ky) for c in coords ]
+        self._root = self._build(list(range(len(coords))), 0)
+
+    def _build(self, indices, depth):
+        if not indices:
+            return None
+        axis = depth % 2
+        indices.sort(key=lambda i: self._points[i][axis])
+        mid = len(indices) // 2
+        return (indices[mid], axis,
+                self._build(indices[:mid], depth + 1),
+                self._build(indices[mid+1:], depth + 1))
+
+    def nearest(self, latitude, longitude):
+        """
+        Returns (index, distance_km) of the area nearest to the given point
+        """
+        qx, qy = longitude * self._kx, latitude * self._ky
+        q = (qx, qy)
+        best_i, best_d2 = -1, float('inf')
+        stack = [ self._root ]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            i, axis, left, right = node
+            px, py = self._points[i]
+            d2 = (px - qx)**2 + (py - qy)**2
+            if d2 < best_d2:
+                best_i, best_d2 = i, d2
+            diff = q[axis] - self._points[i][axis]
+            near, far = (left, right) if diff < 0 else (right, left)
+            # Visit the far side only if the splitting plane is closer than the best so far
+            if diff * diff < best_d2:
+                stack.append(far)
+            stack.append(near)
+        return best_i, math.sqrt(best_d2)
+
+    def nearest_many(self, points):
+        """
+        Batched version of nearest(): takes an iterable of (latitude, longitude)
+        and returns a list of (index, distance_km)
+        """
+        nearest = self.nearest
+        return [ nearest(lat, lon) for lat, lon in points ]
+
+
+# ----- Area Cache -----
+# Objects derived from a set of areas (the nearest-area index, nea_model's
+# AreaTable), shared by everything that uses the same areas. Entries are keyed
+# by the areas' content, names and coordinates, so a list that is modified in
+# place, or a new list describing the same areas, is always looked up by what
+# it contains now.
+AREA_CACHE_SIZE = 8
+_area_lock = threading.Lock()
+_area_cache = OrderedDict()
+
+
+def area_fingerprint(areas):
+    """
+    Returns the content key of `areas`: a tuple of (name, latitude, longitude)
+    """
+    return tuple(area_coordinates(area) for area in areas)
+
+
+def cached_for_areas(areas, kind, build):
+    """
+    Returns the object of type `kind` (e.g. 'index') for `areas`, calling
+    build(fingerprint) only the first time a set of areas is seen. The
+    `AREA_CACHE_SIZE` most recently used sets of areas are kept.
+    """
+    fingerprint = area_fingerprint(areas)
+    with _area_lock:
+        entry = _area_cache.get(fingerprint)
+        if entry is not None and kind in entry:
+            _area_cache.move_to_end(fingerprint)
+            return entry[kind]
+
+    value = build(fingerprint)
+    with _area_lock:
+        entry = _area_cache.setdefault(fingerprint, {})
+        # Another thread may have built it meanwhile: keep the first one
+        value = entry.setdefault(kind, value)
+        _area_cache.move_to_end(fingerprint)
+        if len(_area_cache) > AREA_CACHE_SIZE:
+            _area_cache.popitem(last=False)
+    return value
+
+
+def area_index(areas):
+    """
+    Returns a NearestAreaIndex for `areas`, reusing an earlier index when
+    called again with a list describing the same areas (see cached_for_areas).
+    The tree is only rebuilt when the area metadata actually changes, but the
+    lookup itself is a pass over `areas`: call it once per snapshot of the
+    areas and keep the index for the queries, not once per query.
+
+    Indices returned by the index refer to positions in `areas`.
+    """
+    return cached_for_areas(areas, 'index', lambda fingerprint: NearestAreaIndex(areas))
@@ -0,0 +1,356 @@
+#!/usr/bin/env python
+
+# Shared HTTP client for every NEA / data.gov.sg, OneMap, Nominatim and
+# OpenWeatherMap fetch in this project.
+#
+# One requests.Session is shared per process, so connections are pooled per
+# host and kept alive between calls instead of paying a new TCP + TLS
+# handshake every time. Every request gets connect/read timeouts, retries with
+# jittered exponential backoff, gzip, and its latency recorded in a per-host
+# histogram (see latency_histograms()).
+#
+# aget_json() is the asyncio equivalent, on a shared aiohttp session per
+# event loop (aiohttp is only imported when it is used).
+#
+# get_json_revalidated() / aget_json_revalidated() add HTTP revalidation for
+# polled feeds: the ETag / Last-Modified of each URL is remembered, later
+# requests are conditional, and a 304 is answered with the already parsed
+# object (see revalidation_stats() for bytes and parse time saved).
+
+import asyncio
+import json
+import random
+import threading
+import time
+import urllib.parse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from collections import OrderedDict
+
+
+DEFAULT_TIMEOUT = (5, 30)   # (connect, read) seconds
+DEFAULT_RETRIES = 2
+DEFAULT_BACKOFF = 0.5       # seconds, doubled on each retry
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Upper bounds (ms) of the latency histogram buckets
+LATENCY_BUCKETS_MS = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float('inf')]
+
+_session = None
+_session_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_latency = {}
+
+
+def get_session():
+    """
+    Returns the shared requests.Session, creating it on first use
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                session.headers.update({
+                    'Accept-Encoding': 'gzip, deflate',
+                    'User-Agent': 'NEA Weather App/1.0'
+                })
+                _session = session
+    return _session
+
+
+def record_latency(host, seconds, status):
+    ms = seconds * 1000
+    with _stats_lock:
+        h = _latency.get(host)
+        if h is None:
+            h = _latency[host] = {'count': 0, 'errors': 0, 'sum_ms': 0.0, 'max_ms': 0.0,
+                                  'buckets': [0] * len(LATENCY_BUCKETS_MS)}
+        h['count'] += 1
+        h['sum_ms'] += ms
+        h['max_ms'] = max(h['max_ms'], ms)
+        if status is None or status >= 400:
+            h['errors'] += 1
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if ms <= bound:
+                h['buckets'][i] += 1
+                break
+
+
+def latency_histograms():
+    """
+    Returns the request latency histogram for each host, e.g.
+    {'api-open.data.gov.sg': {'count': 12, 'errors': 0, 'mean_ms': 85.2, 'max_ms': 240.1,
+                              'buckets': {'<=10ms': 0, '<=25ms': 0, ..., '>10000ms': 0}}}
+    """
+    result = {}
+    with _stats_lock:
+        for host, h in _latency.items():
+            labels = [ f'<={b}ms' for b in LATENCY_BUCKETS_MS[:-1] ] + [ f'>{LATENCY_BUCKETS_MS[-2]}ms' ]
+            result[host] = {
+                'count': h['count'],
+                'errors': h['errors'],
+                'mean_ms': h['sum_ms'] / h['count'] if h['count'] else 0.0,
+                'max_ms': h['max_ms'],
+                'buckets': dict(zip(labels, h['buckets']))
+            }
+    return result
+
+
+def get(url, params=None, headers=None, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF,
+        session=None):
+    """
+    GET `url` through the shared session (or `session`, if given).
+
+    Connection errors, timeouts and 429/5xx responses are retried up to
+    `retries` times, sleeping backoff * 2**attempt seconds (with +/-50% jitter)
+    in between. Other responses are returned as they are.
+
+    Returns:
+        requests.Response: The last response received
+    Raises:
+        requests.RequestException: If every attempt failed without a response
+    """
+    session = session or get_session()
+    host = urllib.parse.urlsplit(url).netloc
+    for attempt in range(retries + 1):
+        t0 = time.perf_counter()
+        try:
+            response = session.get(url, params=params, headers=headers, timeout=timeout)
+        except requests.RequestException:
+            record_latency(host, time.perf_counter() - t0, None)
+            if attempt >= retries:
+                raise
+        else:
+            record_latency(host, time.perf_counter() - t0, response.status_code)
+            if response.status_code not in RETRY_STATUS_CODES or attempt >= retries:
+                return response
+        time.sleep(backoff * 2**attempt * random.uniform(0.5, 1.5))
+
+
+# ----- Async Client -----
+# aiohttp sessions are bound to an event loop, so one shared session is kept per
+# loop. Each session is closed when its loop shuts down (see _close_at_shutdown),
+# so asyncio.run() calls do not leak sessions, connectors or dead loops.
+_async_sessions = {}
+
+
+async def _close_at_shutdown(loop, session):
+    # Pending async generators are finalized by loop.shutdown_asyncgens(), which
+    # asyncio.run() calls before closing the loop: the session is closed there,
+    # while the loop can still run the connector's cleanup
+    try:
+        yield
+    finally:
+        if _async_sessions.get(loop, (None,))[0] is session:
+            del _async_sessions[loop]
+        await session.close()
+
+
+def get_async_session():
+    """
+    Returns the shared aiohttp.ClientSession for the running event loop,
+    creating it on first use
+    """
+    import aiohttp
+
+    loop = asyncio.get_running_loop()
+    entry = _async_sessions.get(loop)
+    if entry is None or entry[0].closed:
+        # Loops closed without shutdown_asyncgens() (no asyncio.run) cannot close
+        # their session any more: at least stop keeping them alive
+        for other in [ x for x in _async_sessions if x.is_closed() ]:
+            del _async_sessions[other]
+        connector = aiohttp.TCPConnector(limit=64, limit_per_host=32, keepalive_timeout=60)
+        session = aiohttp.ClientSession(
+            connector=connector,
+            headers={'Accept-Encoding': 'gzip, deflate', 'User-Agent': 'NEA Weather App/1.0'}
+        )
+        closer = _close_at_shutdown(loop, session)
+        # Start the generator, so that the loop tracks it until shutdown
+        loop.create_task(closer.__anext__())
+        entry = _async_sessions[loop] = (session, closer)
+    return entry[0]
+
+
+async def close_async_session():
+    entry = _async_sessions.pop(asyncio.get_running_loop(), None)
+    if entry is not None:
+        await entry[0].close()
+
+
+async def aget_json(url, params=None, headers=None, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF):
+    """
+    Async version of get() for use inside an event loop, returning the parsed
+    json body instead of a response object. Retries, timeouts and latency
+    histograms behave the same way as for get().
+
+    Returns:
+        tuple[int, object]: (status code, parsed json or None if the body is not json)
+    Raises:
+        aiohttp.ClientError / asyncio.TimeoutError: If every attempt failed without a response
+    """
+    import aiohttp
+
+    session = get_async_session()
+    host = urllib.parse.urlsplit(url).netloc
+    client_timeout = aiohttp.ClientTimeout(sock_connect=timeout[0], sock_read=timeout[1])
+    for attempt in range(retries + 1):
+        t0 = time.perf_counter()
+        try:
+            async with session.get(url, params=params, headers=headers, timeout=client_timeout) as response:
+                status = response.status
+                try:
+                    data = await response.json(content_type=None)
+                except ValueError:
+                    data = None
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            record_latency(host, time.perf_counter() - t0, None)
+            if attempt >= retries:
+                raise
+        else:
+            record_latency(host, time.perf_counter() - t0, status)
+            if status not in RETRY_STATUS_CODES or attempt >= retries:
+                return status, data
+        await asyncio.sleep(backoff * 2**attempt * random.uniform(0.5, 1.5))
+
+
+# ----- Conditional Requests -----
+REVALIDATION_CACHE_SIZE = 64
+
+_validated = OrderedDict()
+_revalidation_stats = {'requests': 0, 'not_modified': 0, 'bytes_saved': 0, 'parse_seconds_saved': 0.0}
+
+
+def revalidation_key(url, params):
+    return url if not params else url + '?' + urllib.parse.urlencode(sorted(params.items()))
+
+
+def conditional_headers(key, headers=None):
+    """
+    Returns (headers, entry): the request headers with the validators of the
+    remembered entry for `key` (or None). The entry is what a 304 refers to,
+    so it is kept by the caller even if it gets evicted during the request.
+    """
+    headers = dict(headers or {})
+    with _stats_lock:
+        entry = _validated.get(key)
+    if entry is not None:
+        if entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+    return headers, entry
+
+
+def not_modified(key, entry):
+    """
+    Returns the parsed object of `entry` for a 304 response, remembers it
+    again if it was evicted meanwhile, and counts what was saved
+    """
+    with _stats_lock:
+        if key not in _validated:
+            _validated[key] = entry
+            if len(_validated) > REVALIDATION_CACHE_SIZE:
+                _validated.popitem(last=False)
+        _validated.move_to_end(key)
+        _revalidation_stats['not_modified'] += 1
+        _revalidation_stats['bytes_saved'] += entry['bytes']
+        _revalidation_stats['parse_seconds_saved'] += entry['parse_seconds']
+        return entry['data']
+
+
+def parse_and_store(key, body, etag, last_modified):
+    """
+    Parses a 200 response body and, if it came with validators, remembers it
+    """
+    t0 = time.perf_counter()
+    data = json.loads(body)
+    parse_seconds = time.perf_counter() - t0
+    if etag or last_modified:
+        with _stats_lock:
+            _validated[key] = {'etag': etag, 'last_modified': last_modified, 'data': data,
+                               'bytes': len(body), 'parse_seconds': parse_seconds}
+            _validated.move_to_end(key)
+            if len(_validated) > REVALIDATION_CACHE_SIZE:
+                _validated.popitem(last=False)
+    return data
+
+
+def get_json_revalidated(url, params=None, headers=None, **kwargs):
+    """
+    Same as get() followed by .json(), but sends If-None-Match /
+    If-Modified-Since when the URL has been fetched before, and returns the
+    previously parsed object on 304 Not Modified.
+
+    The returned object may be shared between callers: do not modify it.
+
+    Returns:
+        tuple[int, object]: (status code, parsed json or None if the request failed)
+    """
+    key = revalidation_key(url, params)
+    with _stats_lock:
+        _revalidation_stats['requests'] += 1
+    headers, entry = conditional_headers(key, headers)
+    response = get(url, params=params, headers=headers, **kwargs)
+    if response.status_code == 304:
+        # Without an entry, the 304 answers validators of the caller's own
+        if entry is None:
+            return 304, None
+        return 200, not_modified(key, entry)
+    if response.status_code != 200:
+        return response.status_code, None
+    return 200, parse_and_store(key, response.content, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+
+
+async def aget_json_revalidated(url, params=None, headers=None, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF):
+    """
+    Async version of get_json_revalidated()
+    """
+    import aiohttp
+
+    key = revalidation_key(url, params)
+    with _stats_lock:
+        _revalidation_stats['requests'] += 1
+    session = get_async_session()
+    host = urllib.parse.urlsplit(url).netloc
+    client_timeout = aiohttp.ClientTimeout(sock_connect=timeout[0], sock_read=timeout[1])
+    headers, entry = conditional_headers(key, headers)
+    for attempt in range(retries + 1):
+        t0 = time.perf_counter()
+        try:
+            async with session.get(url, params=params, headers=headers, timeout=client_timeout) as response:
+                status = response.status
+                body = await response.read() if status == 200 else None
+                etag, last_modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            record_latency(host, time.perf_counter() - t0, None)
+            if attempt >= retries:
+                raise
+        else:
+            record_latency(host, time.perf_counter() - t0, status)
+            if status not in RETRY_STATUS_CODES or attempt >= retries:
+                break
+        await asyncio.sleep(backoff * 2**attempt * random.uniform(0.5, 1.5))
+
+    if status == 304:
+        if entry is None:
+            return 304, None
+        return 200, not_modified(key, entry)
+    if status != 200:
+        return status, None
+    return 200, parse_and_store(key, body, etag, last_modified)
+
+
+def revalidation_stats():
+    """
+    Returns the number of revalidated requests, how many were answered with
+    304 Not Modified, and the response bytes and json parse time this saved
+    """
+    with _stats_lock:
+        return dict(_revalidation_stats)
@@ -0,0 +1,439 @@
+#!/usr/bin/env python
+
+# Reference tables and compact per-poll data for the NEA feeds.
+#
+# The area_metadata (2hr forecast areas) and region_metadata (PSI / PM2.5
+# regions) in every response are static reference data. area_table() turns
+# them into an interned, versioned AreaTable that is built once and reused for
+# every poll with the same areas; per-poll data is then just a tuple of values
+# aligned to the table's area order.
+#
+# ForecastSnapshot / RegionForecastSnapshot store one poll as small-int
+# condition codes (see condition_code) in byte arrays, with validity as epoch
+# seconds, and only turn into dicts / json at the API boundary. They also keep
+# the timestamp strings as published and the few forecast values that do not
+# render back from their code (abbreviations, unusual {'code', 'text'} pairs),
+# so the dicts they turn into are the ones they were built from.
+
+import datetime
+import hashlib
+import itertools
+import sys
+import threading
+
+from array import array
+
+from nea_geo import area_index, cached_for_areas
+
+
+SGT = datetime.timezone(datetime.timedelta(hours=8))
+
+
+# ----- Area Table -----
+class AreaTable:
+    """
+    Immutable table of areas (name, latitude, longitude), in the order of the
+    area_metadata it was built from.
+
+    Attributes:
+        names (tuple): Area names
+        latitudes, longitudes (tuple): Label locations as floats
+        positions (dict): {name: position in the table}
+        digest (str): sha1 of the table contents, for change detection
+        version (int): Increases every time a table with new contents is built
+    """
+
+    def __init__(self, coords, digest, version):
+        self.names = tuple(sys.intern(c[0]) for c in coords)
+        self.latitudes = tuple(c[1] for c in coords)
+        self.longitudes = tuple(c[2] for c in coords)
+        self.positions = { name: i for i, name in enumerate(self.names) }
+        self.digest = digest
+        self.version = version
+        self._index = None
+        self._as_dict = None
+
+    def __len__(self):
+        return len(self.names)
+
+    def __repr__(self):
+        return f'<AreaTable v{self.version} {len(self)} areas {self.digest[:8]}>'
+
+    def records(self):
+        return [ {'name': name, 'latitude': lat, 'longitude': lon}
+                 for name, lat, lon in zip(self.names, self.latitudes, self.longitudes) ]
+
+    @property
+    def index(self):
+        """
+        NearestAreaIndex over the table (shared with nea_geo.area_index)
+        """
+        if self._index is None:
+            self._index = area_index(self.records())
+        return self._index
+
+    def as_dict(self):
+        """
+        Returns {name: [latitude, longitude]} (the format of lib_nea.parse_areametadata).
+        The dict is built once per table and shared: do not modify it.
+        """
+        if self._as_dict is None:
+            self._as_dict = { name: [lat, lon] for name, lat, lon in zip(self.names, self.latitudes, self.longitudes) }
+        return self._as_dict
+
+    def align(self, items, key='area', value='forecast'):
+        """
+        Returns a tuple with one value per area in table order (None for areas
+        missing from `items`), from a list of dicts such as the NEA
+        'forecasts' list [{'area': ..., 'forecast': ...}]. String values are interned.
+        """
+        values = [ None ] * len(self.names)
+        positions = self.positions
+        for item in items:
+            i = positions.get(item[key])
+            if i is not None:
+                x = item[value]
+                values[i] = sys.intern(x) if isinstance(x, str) else x
+        return tuple(values)
+
+
+_table_versions = itertools.count(1)
+
+
+def table_digest(coords):
+    h = hashlib.sha1()
+    for name, lat, lon in coords:
+        h.update(f'{name}\t{lat!r}\t{lon!r}\n'.encode('utf-8'))
+    return h.hexdigest()
+
+
+def build_table(coords):
+    return AreaTable(coords, table_digest(coords), next(_table_versions))
+
+
+def area_table(area_metadata):
+    """
+    Returns the interned AreaTable for `area_metadata` (any record format
+    accepted by nea_geo.area_coordinates). Tables live in the same cache as
+    nea_geo.area_index, keyed by the areas' names and coordinates: calling it
+    again with a list describing the same areas returns the same table object,
+    and a new table (with a new version) is only built when the areas change.
+    """
+    return cached_for_areas(area_metadata, 'table', build_table)
+
+
+# ----- Forecast Conditions -----
+# NEA forecast vocabulary: (abbreviation used by the v2 APIs, text).
+# Code 0 means "no forecast"; conditions not in this list get codes >= 128
+# assigned at runtime (see condition_code).
+FORECAST_CONDITIONS = [
+    ('BR', 'Mist'),
+    ('CL', 'Cloudy'),
+    ('DR', 'Drizzle'),
+    ('FA', 'Fair (Day)'),
+    ('FG', 'Fog'),
+    ('FN', 'Fair (Night)'),
+    ('FW', 'Fair & Warm'),
+    ('HG', 'Heavy Thundery Showers with Gusty Winds'),
+    ('HR', 'Heavy Rain'),
+    ('HS', 'Heavy Showers'),
+    ('HT', 'Heavy Thundery Showers'),
+    ('HZ', 'Hazy'),
+    ('LH', 'Slightly Hazy'),
+    ('LR', 'Light Rain'),
+    ('LS', 'Light Showers'),
+    ('OC', 'Overcast'),
+    ('PC', 'Partly Cloudy (Day)'),
+    ('PN', 'Partly Cloudy (Night)'),
+    ('PS', 'Passing Showers'),
+    ('RA', 'Moderate Rain'),
+    ('SH', 'Showers'),
+    ('SK', 'Strong Winds, Showers'),
+    ('SN', 'Snow'),
+    ('SR', 'Strong Winds, Rain'),
+    ('SS', 'Snow Showers'),
+    ('SU', 'Sunny'),
+    ('SW', 'Strong Winds'),
+    ('TL', 'Thundery Showers'),
+    ('WC', 'Windy, Cloudy'),
+    ('WD', 'Windy'),
+    ('WF', 'Windy, Fair'),
+    ('WR', 'Windy, Rain'),
+    ('WS', 'Windy, Showers'),
+    # Texts used by the 24hr feed and older (v1) payloads for the same codes
+    ('FA', 'Fair'),
+    ('FW', 'Fair and Warm'),
+    ('PC', 'Partly Cloudy'),
+    ('HG', 'Thundery Showers with Gusty Winds'),
+]
+
+condition_texts = [ None ] + [ sys.intern(text) for abbr, text in FORECAST_CONDITIONS ]
+condition_abbrs = [ None ] + [ abbr for abbr, text in FORECAST_CONDITIONS ]
+condition_codes = { text: i for i, text in enumerate(condition_texts) if text }
+for i, abbr in enumerate(condition_abbrs):
+    if abbr:
+        condition_codes.setdefault(abbr, i)
+
+EXTRA_CONDITION_BASE = 128
+_condition_lock = threading.Lock()
+
+
+def condition_code(x):
+    """
+    Returns the small-int code of a forecast condition, given its text,
+    its abbreviation, or a v2 {'code': ..., 'text': ...} dict.
+    Unknown conditions are added to the vocabulary on first sight.
+    """
+    if x is None:
+        return 0
+    abbr = None
+    if isinstance(x, dict):
+        abbr = x.get('code')
+        x = x.get('text') or abbr
+    code = condition_codes.get(x)
+    if code is None:
+        with _condition_lock:
+            code = condition_codes.get(x)
+            if code is None:
+                code = max(EXTRA_CONDITION_BASE, len(condition_texts))
+                if code > 255:
+                    raise ValueError(f'Too many distinct forecast conditions to encode {x!r}')
+                condition_texts.extend([ None ] * (code + 1 - len(condition_texts)))
+                condition_abbrs.extend([ None ] * (code + 1 - len(condition_abbrs)))
+                condition_texts[code] = sys.intern(x)
+                condition_abbrs[code] = abbr
+                condition_codes[x] = code
+    return code
+
+
+def condition_text(code):
+    return condition_texts[code]
+
+
+def parse_epoch(value):
+    """
+    ISO 8601 timestamp (e.g. '2024-07-10T14:00:00+08:00') to integer epoch seconds, 0 if missing
+    """
+    if not value or value == '-':
+        return 0
+    return int(datetime.datetime.fromisoformat(value).timestamp())
+
+
+def format_epoch(t):
+    if not t:
+        return None
+    return datetime.datetime.fromtimestamp(t, SGT).isoformat()
+
+
+# ----- Snapshots -----
+class ForecastSnapshot:
+    """
+    One poll of the 2hr forecast: a condition code per area of `table`
+    (array of unsigned bytes) plus the validity as epoch seconds.
+    A snapshot of 47 areas takes about 200 bytes, against several kB for the
+    equivalent list of dicts; convert with to_records() only when needed.
+
+    `period` holds the (start, end) strings as published and `overrides`
+    ({position: forecast}, or None) the forecasts that condition_text() of
+    their code would not reproduce, for to_records().
+    """
+    __slots__ = ('table', 'codes', 'start', 'end', 'updated', 'period', 'overrides',
+                 '_records', '_record_positions', '_records_index')
+
+    def __init__(self, table, codes, start=0, end=0, updated=0, period=None, overrides=None):
+        self.table = table
+        self.codes = codes
+        self.start = start
+        self.end = end
+        self.updated = updated
+        self.period = period or (format_epoch(start), format_epoch(end))
+        self.overrides = overrides
+        self._records = None
+        self._record_positions = None
+        self._records_index = None
+
+    @classmethod
+    def from_item(cls, table, item):
+        """
+        Builds a snapshot from one entry of the 2hr feed's 'items' list
+        (v1 and v2 have the same layout)
+        """
+        codes = array('B', bytes(len(table)))
+        overrides = {}
+        positions = table.positions
+        for forecast in item.get('forecasts', []):
+            i = positions.get(forecast['area'])
+            if i is not None:
+                x = forecast['forecast']
+                codes[i] = condition_code(x)
+                if x is not None and condition_texts[codes[i]] != x:
+                    overrides[i] = x
+        valid_period = item.get('valid_period', {})
+        start, end = valid_period.get('start'), valid_period.get('end')
+        return cls(table, codes, parse_epoch(start), parse_epoch(end), parse_epoch(item.get('update_timestamp')),
+                   (start, end), overrides or None)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __eq__(self, other):
+        return isinstance(other, ForecastSnapshot) and self.table is other.table and \
+            self.codes == other.codes and (self.start, self.end) == (other.start, other.end)
+
+    def __hash__(self):
+        return hash((self.table.digest, bytes(self.codes), self.start, self.end))
+
+    def forecast(self, i):
+        """
+        Forecast text for the area at position `i` of the table (None if there is none)
+        """
+        return condition_texts[self.codes[i]]
+
+    def to_records(self):
+        """
+        Returns the list of dicts used by nea_tools (location_name, latitude,
+        longitude, forecast, start, end) for the areas that have a forecast,
+        with the forecasts and start / end strings as published.
+        Built once per snapshot: do not modify it.
+        """
+        if self._records is None:
+            table = self.table
+            start, end = self.period
+            overrides = self.overrides or {}
+            self._records = [
+                {'location_name': table.names[i], 'latitude': table.latitudes[i],
+                 'longitude': table.longitudes[i], 'forecast': overrides.get(i, condition_texts[code]),
+                 'start': start, 'end': end}
+                for i, code in enumerate(self.codes) if code
+            ]
+        return self._records
+
+    def record(self, i):
+        """
+        The record of to_records() for the area at position `i` of the table,
+        or None if that area has no forecast
+        """
+        if self._record_positions is None:
+            # Records are the areas with a forecast, in table order
+            positions = itertools.count()
+            self._record_positions = [ next(positions) if code else None for code in self.codes ]
+        j = self._record_positions[i]
+        return self.to_records()[j] if j is not None else None
+
+    def records_index(self):
+        """
+        NearestAreaIndex over to_records() (the areas that have a forecast),
+        built once per snapshot; query results are positions in to_records()
+        """
+        if self._records_index is None:
+            self._records_index = area_index(self.to_records())
+        return self._records_index
+
+
+REGIONS = ('west', 'east', 'central', 'south', 'north')
+
+MISSING = object()
+
+
+def render_condition(code, as_object=False):
+    """
+    Forecast of a condition code as its text, or as a v2 {'code', 'text'} dict
+    """
+    if as_object:
+        return {'code': condition_abbrs[code], 'text': condition_texts[code]}
+    return condition_texts[code]
+
+
+class RegionForecastSnapshot:
+    """
+    One poll of the 24hr forecast: the time periods as epoch seconds and a
+    condition code per (period, region), stored period-major in one byte array.
+    The 'general' block (a single small dict), the 'timePeriod' dicts and the
+    timestamp strings are kept as they are; `overrides` ({position in codes:
+    forecast}, or None) holds the forecasts that their code would not render
+    back to, including regions listed without a forecast.
+    """
+    __slots__ = ('timestamp', 'updated', 'date', 'general', 'starts', 'ends', 'texts', 'codes', 'as_objects',
+                 'stamps', 'time_periods', 'overrides', '_dict')
+
+    def __init__(self, timestamp, updated, date, general, starts, ends, texts, codes, as_objects,
+                 stamps=None, time_periods=None, overrides=None):
+        self.timestamp = timestamp
+        self.updated = updated
+        self.date = date
+        self.general = general
+        self.starts = starts
+        self.ends = ends
+        self.texts = texts
+        self.codes = codes
+        self.as_objects = as_objects
+        self.stamps = stamps or (format_epoch(timestamp), format_epoch(updated))
+        self.time_periods = time_periods
+        self.overrides = overrides
+        self._dict = None
+
+    @classmethod
+    def from_record(cls, record):
+        """
+        Builds a snapshot from data['data']['records'][0] of the v2 24hr feed
+        """
+        starts, ends, texts, codes = array('q'), array('q'), [], array('B')
+        time_periods, values = [], []
+        for period in record.get('periods', []):
+            time_period = period.get('timePeriod', {})
+            time_periods.append(time_period)
+            starts.append(parse_epoch(time_period.get('start')))
+            ends.append(parse_epoch(time_period.get('end')))
+            texts.append(time_period.get('text'))
+            regions = period.get('regions', {})
+            for region in REGIONS:
+                x = regions.get(region, MISSING)
+                values.append(x)
+                codes.append(condition_code(None if x is MISSING else x))
+
+        as_objects = any(isinstance(x, dict) for x in values)
+        overrides = {}
+        for i, x in enumerate(values):
+            if x is not MISSING and render_condition(codes[i], as_objects) != x:
+                overrides[i] = x
+        timestamp, updated = record.get('timestamp'), record.get('updatedTimestamp')
+        return cls(parse_epoch(timestamp), parse_epoch(updated), record.get('date'), record.get('general', {}),
+                   starts, ends, tuple(texts), codes, as_objects,
+                   (timestamp, updated), tuple(time_periods), overrides or None)
+
+    def forecast(self, period, region):
+        return condition_texts[self.codes[period * len(REGIONS) + REGIONS.index(region)]]
+
+    def to_dict(self):
+        """
+        Returns the structure produced by nea_tools.organize_weather_by_region().
+        Built once per snapshot: do not modify it.
+        """
+        if self._dict is not None:
+            return self._dict
+        result = {
+            'timestamp': self.stamps[0],
+            'date': self.date,
+            'updatedTimestamp': self.stamps[1],
+            'general': self.general,
+            'regions': { region: {'forecasts': []} for region in REGIONS }
+        }
+        overrides = self.overrides or {}
+        for p in range(len(self.starts)):
+            if self.time_periods is not None:
+                time_period = self.time_periods[p]
+            else:
+                time_period = {'start': format_epoch(self.starts[p]), 'end': format_epoch(self.ends[p])}
+                if self.texts[p] is not None:
+                    time_period['text'] = self.texts[p]
+            for r, region in enumerate(REGIONS):
+                i = p * len(REGIONS) + r
+                if i in overrides:
+                    forecast = overrides[i]
+                elif self.codes[i]:
+                    forecast = render_condition(self.codes[i], self.as_objects)
+                else:
+                    continue
+                result['regions'][region]['forecasts'].append({'timePeriod': time_period, 'forecast': forecast})
+        self._dict = result
+        return result
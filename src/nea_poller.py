@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+
+# Long-running poller for every NEA feed (the v1 urls of lib_nea and the v2
+# feeds of forecast_feeds.py), writing each response to the shared
+# SnapshotStore that lib_nea, nea_tools and the agent tools read from:
+#
+#   python nea_poller.py --db data/nea-snapshots.sqlite3
+#   NEA_SNAPSHOT_DB=data/nea-snapshots.sqlite3 python lib_nea.py --key 2hr
+#
+# Each feed is polled on its own schedule, a few minutes after NEA usually
+# publishes. When a poll finds the feed unchanged (NEA is late), it is polled
+# again every minute until the new version shows up. Polls are conditional
+# requests (see nea_http.get_json_revalidated), so an unchanged feed costs a
+# 304 without a body.
+
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+import nea_http
+from forecast_feeds import url_list as v2_urls
+from lib_nea import urls
+from snapshot_store import SnapshotStore, default_db_file
+
+
+logger = logging.getLogger('nea_poller')
+
+# (interval, offset) in seconds: each feed is polled every `interval` seconds,
+# `offset` seconds past each multiple of the interval in Singapore time
+schedules = {
+    '2hr': (1800, 300),             # every 30 minutes, at :05 and :35
+    '24hr': (6 * 3600, 20400),      # 05:40, 11:40, 17:40, 23:40
+    '4d': (12 * 3600, 20700),       # 05:45, 17:45
+    'temp': (300, 60),              # every 5 minutes
+    'psi': (3600, 600),             # hourly, at :10
+    'pm25': (3600, 600),
+    'uv': (3600, 300),
+    '2hr-realtime': (1800, 300),
+    '24hr-realtime': (6 * 3600, 20400),
+    '4day-realtime': (12 * 3600, 20700)
+}
+
+SGT_OFFSET = 8 * 3600
+RETRY_INTERVAL = 60     # seconds between polls of a feed that has not been updated yet
+
+
+def feed_urls():
+    return dict(urls, **v2_urls)
+
+
+def next_slot(now, interval, offset):
+    """
+    Returns the first scheduled poll time (epoch seconds) after `now`
+    """
+    local = now + SGT_OFFSET
+    k = (local - offset) // interval + 1
+    return k * interval + offset - SGT_OFFSET
+
+
+def snapshot_version(data):
+    """
+    Returns the update timestamp of a v1 or v2 feed response, or None
+    """
+    payload = data.get('data', data) if isinstance(data, dict) else {}
+    for key, field in [ ('items', 'update_timestamp'), ('items', 'timestamp'),
+                        ('records', 'updatedTimestamp'), ('records', 'timestamp') ]:
+        entries = payload.get(key)
+        if entries and entries[0].get(field):
+            return entries[0][field]
+    return None
+
+
+def export_json(export_dir, feed, data):
+    """
+    Writes a snapshot to {export_dir}/{feed}.json (atomically), for consumers
+    that read plain files, such as a locally served copy of the web front-end
+    """
+    filename = os.path.join(export_dir, f'{feed}.json')
+    tmp_filename = filename + '.tmp'
+    with open(tmp_filename, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_filename, filename)
+
+
+class Poller:
+    """
+    Polls `feeds` on their schedules and writes them to `store`.
+
+    Args:
+        store (SnapshotStore): Where snapshots are written
+        feeds (list): Feed names (keys of `schedules`), all feeds by default
+        export_dir (str): Optional directory to also write {feed}.json files to
+        workers (int): Number of feeds fetched concurrently when several are due
+    """
+
+    def __init__(self, store, feeds=None, export_dir=None, workers=4):
+        self.store = store
+        self.urls = feed_urls()
+        self.feeds = list(feeds or schedules)
+        unknown = [ feed for feed in self.feeds if feed not in schedules or feed not in self.urls ]
+        if unknown:
+            raise ValueError(f'Unknown feeds: {unknown}')
+        self.export_dir = export_dir
+        self.workers = workers
+        self.versions = {}
+        self.due = { feed: 0 for feed in self.feeds }
+        self.stats = { feed: {'polls': 0, 'updates': 0, 'unchanged': 0, 'errors': 0} for feed in self.feeds }
+        self._lock = threading.Lock()
+
+    def poll(self, feed):
+        """
+        Fetches one feed and stores it if it changed.
+
+        Returns:
+            float: When the feed should be polled next (epoch seconds)
+        """
+        interval, offset = schedules[feed]
+        url = self.urls[feed]
+        now = time.time()
+        slot = next_slot(now, interval, offset)
+        expires = slot + min(interval, 600)
+        with self._lock:
+            stats = self.stats[feed]
+            stats['polls'] += 1
+
+        try:
+            status, data = nea_http.get_json_revalidated(url)
+        except Exception as e:
+            logger.warning('poll_failed feed=%s error=%s', feed, e)
+            data = None
+        if data is None:
+            with self._lock:
+                stats['errors'] += 1
+            return min(now + RETRY_INTERVAL, slot)
+
+        version = snapshot_version(data)
+        if version is not None and version == self.versions.get(feed):
+            # NEA has not published the next version yet: keep serving the
+            # current one and look again shortly, until half the interval is over
+            self.store.touch(feed, expires)
+            with self._lock:
+                stats['unchanged'] += 1
+            previous_slot = slot - interval
+            if now - previous_slot < interval / 2:
+                return min(now + RETRY_INTERVAL, slot)
+            return slot
+
+        self.store.put(feed, data, expires, url=url, version=version)
+        if self.export_dir:
+            export_json(self.export_dir, feed, data)
+        self.versions[feed] = version
+        with self._lock:
+            stats['updates'] += 1
+        logger.info('updated feed=%s version=%s next=%s', feed, version,
+                    time.strftime('%H:%M:%S', time.localtime(slot)))
+        return slot
+
+    def run_once(self, feeds=None):
+        """
+        Polls `feeds` (all feeds by default) concurrently, once
+        """
+        feeds = feeds or self.feeds
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(feeds))) as executor:
+            for feed, due in zip(feeds, executor.map(self.poll, feeds)):
+                self.due[feed] = due
+
+    def run(self, stop=None):
+        """
+        Polls every feed when it is due, until `stop` (a threading.Event) is set
+        """
+        stop = stop or threading.Event()
+        logger.info('poller_started feeds=%s store=%s', ','.join(self.feeds), self.store.db_file)
+        while not stop.is_set():
+            now = time.time()
+            due = [ feed for feed in self.feeds if self.due[feed] <= now ]
+            if due:
+                self.run_once(due)
+                continue
+            stop.wait(max(0.0, min(self.due.values()) - now))
+
+    def get_stats(self):
+        with self._lock:
+            return { feed: dict(stats) for feed, stats in self.stats.items() }
+
+
+def main(args):
+    db_file = args.db or default_db_file()
+    if not db_file:
+        raise SystemExit('Set NEA_SNAPSHOT_DB or pass --db')
+    if args.export_dir:
+        os.makedirs(args.export_dir, exist_ok=True)
+
+    poller = Poller(SnapshotStore(db_file), args.feeds.split(',') if args.feeds else None,
+                    export_dir=args.export_dir, workers=args.workers)
+    if args.once:
+        poller.run_once()
+    else:
+        try:
+            poller.run()
+        except KeyboardInterrupt:
+            pass
+    print(json.dumps(poller.get_stats(), indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Poll the NEA feeds into a shared snapshot store')
+    parser.add_argument('--db', help='SQLite snapshot store (default: $NEA_SNAPSHOT_DB)')
+    parser.add_argument('--feeds', help=f'Comma separated feeds (default: all of {",".join(schedules)})')
+    parser.add_argument('--export_dir', help='Also write each snapshot to {export_dir}/{feed}.json')
+    parser.add_argument('--workers', type=int, default=4, help='Feeds fetched concurrently')
+    parser.add_argument('--once', action='store_true', help='Poll every feed once and exit')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s %(message)s')
+    main(args)
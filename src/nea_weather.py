@@ -4,17 +4,32 @@
 #   curl -s https://api.data.gov.sg/v1/environment/2-hour-weather-forecast | jq "."
 #   python sg_weather.py --start "2024-01-03" --end "2024-01-08" --get_forecasts
 #   python sg_weather.py --start "2024-01-01" --end "2024-01-08" --parse_forecasts
+#   python sg_weather.py --start "2023-01-01" --end "2024-01-01" --backfill_forecasts --workers 8 --rate 4
+#   python sg_weather.py --start "2024-01-01" --end "2024-02-01" --get_temperature --workers 8 --rate 4
+#   python sg_weather.py --start "2020-01-01" --end "2025-01-01" --get_air_quality --workers 8 --rate 4
 
 import argparse
 import datetime
+import glob
+import hashlib
 import json
+import logging
+import nea_http
 import os
 import pandas as pd
+import random
 import requests
+import threading
 import time
+import warnings
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from nea_model import ForecastSnapshot, area_table
 
 base_url = 'https://api.data.gov.sg/v1/'
 
+logger = logging.getLogger('nea_weather')
+
 
 
 # ----- Setup -----
@@ -49,11 +64,11 @@ def get_datetime_array(start_dt=datetime.datetime(2024, 1, 1, 0, 0, 0),
 def get_forecast_json(date='', date_time=''):
     url = base_url + 'environment/2-hour-weather-forecast'
     if date != '':
-        response = requests.get(url + f'?date={date}')
+        response = nea_http.get(url, params={'date': date})
     elif date_time != '':
-        response = requests.get(url + f'?date_time={date_time}')
+        response = nea_http.get(url, params={'date_time': date_time})
     else:
-        response = requests.get(url)
+        response = nea_http.get(url)
         
     if response.status_code == 200:
         return json.loads(response.text)
@@ -62,18 +77,20 @@ def get_forecast_json(date='', date_time=''):
         return None
 
 
-def get_temperature_json(date=''):
+def get_temperature_json(date='', date_time=''):
     url = base_url + 'environment/air-temperature'
     if date != '':
-        response = requests.get(url + f'?date={date}')
+        response = nea_http.get(url, params={'date': date})
+    elif date_time != '':
+        response = nea_http.get(url, params={'date_time': date_time})
     else:
-        response = requests.get(url)
+        response = nea_http.get(url)
         
     if response.status_code == 200:
         return json.loads(response.text)
     else:
         print(f'Error parsing json data. Status code: {response.status_code}')
-        return response.content.decode('utf-8')
+        return None
 
 
 
@@ -111,30 +128,20 @@ def get_timedata(items):
     return x
 
 
-def get_forecasts(data):
-    if 'items' not in data:
-        return None
-
-    forecast_data = []
-    for item in data['items']:
-        if 'forecasts' not in item:
-            continue
+def get_forecast_row(item, status):
+    forecast_item = get_timedata(item)
+    forecast_item['status'] = status
+    for forecast in item['forecasts']:
+        forecast_item[forecast['area']] = forecast['forecast']
+    return forecast_item
 
-        forecast_item = {'timestamp': '-', 'update_timestamp': '-', 'validity_start': '-', 'validity_end': '-'}
-        for key in ['update_timestamp', 'timestamp', 'valid_period']:
-            if key in item:
-                if key == 'valid_period':
-                    forecast_item['validity_start'] = item[key]['start']
-                    forecast_item['validity_end'] = item[key]['end']
-                else:
-                    forecast_item[key] = item[key]
 
-        forecast_item['status'] = data['api_info']['status']
-        for forecast in item['forecasts']:
-            forecast_item[forecast['area']] = forecast['forecast']
-        forecast_data.append(forecast_item)
+def get_forecast_rows(data):
+    if 'items' not in data:
+        return None
 
-    return forecast_data
+    status = data['api_info']['status']
+    return [ get_forecast_row(item, status) for item in data['items'] if 'forecasts' in item ]
 
 
 def get_forecasts(start_dt, end_dt, increment=86400):
@@ -150,56 +157,842 @@ def get_forecasts(start_dt, end_dt, increment=86400):
         time.sleep(1)
 
 
-def parse_forecasts(csv_file, start_dt, end_dt, increment=86400):
+# ----- Concurrent Backfill -----
+class TokenBucket:
+    """
+    Thread-safe token bucket rate limiter: allows `rate` requests per second
+    on average, with bursts of up to `capacity` requests.
+    """
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.t_last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                t = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (t - self.t_last) * self.rate)
+                self.t_last = t
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def forecast_filename(date):
+    return f'data/forecast-{date}.json'
+
+
+def fetch_day(endpoint, date, bucket, max_retries=3, backoff=1.0):
+    """
+    Fetches one day of a v1 `endpoint` (e.g. 'environment/air-temperature'),
+    retrying non-200 responses and connection errors up to `max_retries` times
+    with jittered exponential backoff.
+    Returns the parsed json, or None if every attempt failed.
+    """
+    url = base_url + endpoint
+    for attempt in range(max_retries + 1):
+        bucket.acquire()
+        try:
+            # Retries are handled here, so that every attempt goes through the token bucket
+            response = nea_http.get(url, params={'date': date}, timeout=(5, 60), retries=0)
+            if response.status_code == 200:
+                return response.json()
+            error = f'Status code: {response.status_code}'
+        except (requests.RequestException, ValueError) as e:
+            error = str(e)
+
+        if attempt < max_retries:
+            time.sleep(backoff * 2**attempt * random.uniform(0.5, 1.5))
+    print(f'{date}: giving up after {max_retries + 1} attempts. {error}')
+    return None
+
+
+def fetch_forecast_day(date, bucket, max_retries=3, backoff=1.0):
+    """
+    Fetches the 2 hour forecasts for one day (see fetch_day)
+    """
+    return fetch_day('environment/2-hour-weather-forecast', date, bucket, max_retries, backoff)
+
+
+def save_forecast_day(date, data):
+    """
+    Writes data/forecast-{date}.json atomically, so an interrupted backfill
+    never leaves a truncated file behind that would be skipped on resume
+    """
+    filename = forecast_filename(date)
+    tmp_filename = f'{filename}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_filename, 'w') as f:
+        f.write(json.dumps(data, indent=2, default=str))
+    os.replace(tmp_filename, filename)
+
+
+def backfill_day(date, bucket, max_retries):
+    data = fetch_forecast_day(date, bucket, max_retries=max_retries)
+    if data is None:
+        return False
+    save_forecast_day(date, data)
+    return True
+
+
+def backfill_forecasts(start_dt, end_dt, workers=4, rate=2.0, max_retries=3, increment=86400):
+    """
+    Concurrent version of get_forecasts(start_dt, end_dt): downloads
+    data/forecast-{date}.json for every day in the range using a pool of
+    `workers` threads, sharing a token bucket limited to `rate` requests/second.
+
+    Days that already have a file are skipped, so re-running the same command
+    after an interruption resumes where it stopped.
+
+    Returns:
+        list: Dates that could not be downloaded
+    """
     datetime_array = get_datetime_array(start_dt, end_dt, increment)
-    new_df = []
-    for x in datetime_array:
-        date = x.strftime('%Y-%m-%d')
-        with open(f'data/forecast-{date}.json') as f:
-            data = json.load(f)
-            if 'items' in data:
-                td = get_timedata(data['items'][0])
-                print(f"----- Timestamp: {td['timestamp']}. Update_timestamp: {td['update_timestamp']}. Valid: {td['validity_start']} to {td['validity_end']} -----")
-
-            forecast_data = get_forecasts(data)
-            if forecast_data is None:
-                print(f'----- {x} BAD FORMATTING. THIS ENTRY WILL BE SKIPPED -----')
-                print(json.dumps(data, indent=2, default=str))
-                print(f'----- {x} BAD FORMATTING. THIS ENTRY WILL BE SKIPPED -----')
+    dates = [ x.strftime('%Y-%m-%d') for x in datetime_array ]
+    todo = [ date for date in dates if not os.path.isfile(forecast_filename(date)) ]
+    print(f'{len(dates) - len(todo)} of {len(dates)} days already downloaded. Fetching {len(todo)} days.')
+
+    bucket = TokenBucket(rate)
+    failed = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = { executor.submit(backfill_day, date, bucket, max_retries): date for date in todo }
+        for i, future in enumerate(as_completed(futures)):
+            date = futures[future]
+            try:
+                ok = future.result()
+            except Exception as e:
+                print(f'{date}: {e}')
+                ok = False
+            if not ok:
+                failed.append(date)
+            if (i + 1) % 50 == 0:
+                print(f'{i + 1}/{len(todo)} days done, {len(failed)} failed')
+
+    if failed:
+        print(f'{len(failed)} days failed: {sorted(failed)}. Re-run to retry them.')
+    return sorted(failed)
+
+
+def parse_forecasts(csv_file, start_dt, end_dt, increment=86400):
+    """
+    Adds the forecasts of the data/forecast-*.json files in the date range to
+    `csv_file` (one row per forecast, one column per area), in bounded memory.
+    Same as ingest_forecasts(): only new or changed files are read, and
+    forecasts already in the csv are not appended again.
+
+    Returns:
+        int: Number of rows appended
+    """
+    return ingest_forecasts(csv_file, start_dt, end_dt, increment)
+
+
+# ----- Streaming Pipeline -----
+# data/forecast-*.json files -> forecast items -> flat row tuples -> batches -> sink
+# Only one file and one batch are held in memory at a time, however long the range.
+FORECAST_COLUMNS = ('timestamp', 'update_timestamp', 'validity_start', 'validity_end', 'status', 'area', 'forecast')
+
+
+class RateLimitedLog:
+    """
+    Emits at most `burst` messages per key every `interval` seconds, and
+    reports how many were suppressed the next time a message gets through.
+    """
+    def __init__(self, log=logger, burst=5, interval=60):
+        self.log = log
+        self.burst = burst
+        self.interval = interval
+        self.windows = {}
+
+    def warning(self, key, msg, *args):
+        t = time.monotonic()
+        t_start, n, suppressed = self.windows.get(key, (t, 0, 0))
+        if t - t_start > self.interval:
+            t_start, n = t, 0
+        if n < self.burst:
+            if suppressed:
+                msg += ' (%d similar messages suppressed)'
+                args = args + (suppressed,)
+            self.log.warning(msg, *args)
+            self.windows[key] = (t_start, n + 1, 0)
+        else:
+            self.windows[key] = (t_start, n, suppressed + 1)
+
+
+def iter_forecast_files(start_dt=None, end_dt=None, increment=86400):
+    """
+    Yields the existing data/forecast-{date}.json files in the date range
+    (every file, in date order, if no range is given)
+    """
+    if start_dt is None or end_dt is None:
+        yield from sorted(glob.glob(forecast_filename('*')))
+        return
+    for x in get_datetime_array(start_dt, end_dt, increment):
+        filename = forecast_filename(x.strftime('%Y-%m-%d'))
+        if os.path.isfile(filename):
+            yield filename
+        else:
+            logger.debug('missing_file file=%s', filename)
+
+
+def iter_forecast_items(filenames, log=None):
+    """
+    Yields (status, item) for every forecast item in the given files.
+    Unreadable files and payloads without forecasts are logged (rate-limited)
+    by file name and top-level keys, not dumped.
+    """
+    log = log or RateLimitedLog()
+    for filename in filenames:
+        try:
+            with open(filename) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            log.warning('unreadable', 'unreadable_file file=%s error=%s', filename, e)
+            continue
+
+        if 'items' not in data:
+            log.warning('bad_payload', 'bad_payload file=%s keys=%s', filename, sorted(data)[:5])
+            continue
+        status = data.get('api_info', {}).get('status', '-')
+        n_items = 0
+        for item in data['items']:
+            if 'forecasts' in item:
+                n_items += 1
+                yield status, item
+        logger.debug('parsed_file file=%s items=%d', filename, n_items)
+
+
+def iter_forecast_snapshots(filenames, log=None):
+    """
+    Yields a compact ForecastSnapshot for every forecast item in the given
+    files. Files with the same area metadata share one interned area table,
+    so a year of 2hr history fits in a few MB.
+    """
+    log = log or RateLimitedLog()
+    for filename in filenames:
+        try:
+            with open(filename) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            log.warning('unreadable', 'unreadable_file file=%s error=%s', filename, e)
+            continue
+
+        if 'items' not in data or not data.get('area_metadata'):
+            log.warning('bad_payload', 'bad_payload file=%s keys=%s', filename, sorted(data)[:5])
+            continue
+        table = area_table(data['area_metadata'])
+        for item in data['items']:
+            if 'forecasts' in item:
+                yield ForecastSnapshot.from_item(table, item)
+
+
+def iter_forecast_rows(items):
+    """
+    Flattens (status, item) pairs into one tuple per area, with the fields
+    in FORECAST_COLUMNS
+    """
+    for status, item in items:
+        td = get_timedata(item)
+        head = (td['timestamp'], td['update_timestamp'], td['validity_start'], td['validity_end'], status)
+        for forecast in item['forecasts']:
+            yield head + (forecast['area'], forecast['forecast'])
+
+
+def batched(iterable, batch_size):
+    batch = []
+    for x in iterable:
+        batch.append(x)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class CsvSink:
+    """
+    Appends batches of row tuples to a long-format csv (one row per area per
+    forecast). Like ingest_forecasts(), it keeps a manifest of the files
+    already streamed (unchanged files are skipped) and the keys of the
+    forecasts already written (see load_keys), so re-running never appends
+    the same forecast twice.
+
+    Each file is committed by saving the manifest once its rows and keys are
+    written. Rows and keys of a file that was interrupted are rolled back
+    when the manifest is next loaded, and the file is streamed again.
+    """
+    def __init__(self, csv_file):
+        self.csv_file = csv_file
+        if os.path.isfile(csv_file) and os.path.getsize(csv_file) > 0:
+            self.check_columns(tuple(pd.read_csv(csv_file, nrows=0).columns))
+        self.manifest = load_manifest(csv_file)
+        # A rollback can leave an empty csv, whose header is then written again
+        self.header = not os.path.isfile(csv_file) or os.path.getsize(csv_file) == 0
+        if not os.path.isfile(manifest_filename(csv_file)):
+            # Commit the empty csv, so that a first run that is interrupted is rolled back too
+            save_manifest(csv_file, self.manifest)
+        self.seen = load_keys(csv_file)
+        self.new_keys = []
+        self.entries = {}
+
+    def check_columns(self, columns):
+        if columns != FORECAST_COLUMNS:
+            raise SystemExit(f'{self.csv_file} is not a long-format forecast csv (columns: {", ".join(columns[:5])}, ...). '
+                             'Pass another --long_file.')
+
+    def new_files(self, filenames):
+        new_files = find_new_forecast_files(self.manifest, filenames)
+        self.entries = { os.path.basename(filename): entry for filename, entry in new_files }
+        return [ filename for filename, entry in new_files ]
+
+    def filter_items(self, items):
+        for status, item in items:
+            td = get_timedata(item)
+            key = (td['timestamp'], td['update_timestamp'])
+            if key in self.seen:
                 continue
-            new_df = new_df + forecast_data
+            self.seen.add(key)
+            self.new_keys.append(key)
+            yield status, item
 
-    if os.path.isfile(csv_file):
-        df = pd.read_csv(csv_file, index_col=0)
-    else:
-        df = pd.DataFrame()
+    def rows(self, items):
+        return iter_forecast_rows(items)
+
+    def write(self, batch):
+        df = pd.DataFrame.from_records(batch, columns=FORECAST_COLUMNS)
+        df.to_csv(self.csv_file, mode='a', header=self.header, index=False)
+        self.header = False
+        self.manifest['rows'] += len(batch)
+
+    def end_file(self, filename):
+        write_keys(self.csv_file, self.new_keys)
+        self.new_keys = []
+        name = os.path.basename(filename)
+        self.manifest['files'][name] = self.entries[name]
+        save_manifest(self.csv_file, self.manifest)
+
+    def close(self):
+        pass
+
+
+class WideCsvSink(CsvSink):
+    """
+    Writes the forecasts to a wide csv, one row per forecast and one column
+    per area (the format of --file). Rows are buffered per source file (a
+    few hundred forecasts) and appended when the file is done. When an area
+    shows up that the csv has no column for, the csv is first rewritten with
+    the new column, in chunks (see widen_csv).
+    """
+    def __init__(self, csv_file):
+        self.columns = None
+        self.rows_buffer = []
+        super().__init__(csv_file)
+
+    def check_columns(self, columns):
+        if not { 'timestamp', 'update_timestamp' } <= set(columns):
+            raise SystemExit(f'{self.csv_file} is not a forecast csv (columns: {", ".join(columns[:5])}, ...). '
+                             'Move it away or pass another --file.')
+        # The first column is the row number
+        self.columns = list(columns[1:])
+
+    def rows(self, items):
+        for status, item in items:
+            yield get_forecast_row(item, status)
+
+    def write(self, batch):
+        self.rows_buffer.extend(batch)
+
+    def end_file(self, filename):
+        if self.rows_buffer:
+            df = pd.DataFrame.from_records(self.rows_buffer)
+            self.rows_buffer = []
+            df.index = range(self.manifest['rows'], self.manifest['rows'] + len(df))
+            if self.header:
+                self.columns = list(df.columns)
+                df.to_csv(self.csv_file)
+                self.header = False
+            else:
+                new_columns = [ c for c in df.columns if c not in self.columns ]
+                if new_columns:
+                    self.columns += new_columns
+                    tmp_filename = widen_csv(self.csv_file, self.columns)
+                    # Commit the size of the rewritten csv before it replaces the
+                    # original, so that a rollback never truncates it
+                    save_manifest(self.csv_file, self.manifest, csv_size=os.path.getsize(tmp_filename))
+                    os.replace(tmp_filename, self.csv_file)
+                df.reindex(columns=self.columns).to_csv(self.csv_file, mode='a', header=False)
+            self.manifest['rows'] += len(df)
+        super().end_file(filename)
+
+
+def widen_csv(csv_file, columns, chunksize=100000):
+    """
+    Writes a copy of a wide forecast csv with the given columns (existing
+    columns keep their values, new ones are empty), `chunksize` rows at a
+    time, next to it
+
+    Returns:
+        str: Name of the copy, to be renamed over `csv_file`
+    """
+    tmp_filename = f'{csv_file}.tmp'
+    header = True
+    for chunk in pd.read_csv(csv_file, index_col=0, dtype=str, keep_default_na=False, chunksize=chunksize):
+        chunk.reindex(columns=columns).to_csv(tmp_filename, mode='w' if header else 'a', header=header)
+        header = False
+    if header:
+        pd.DataFrame(columns=columns).to_csv(tmp_filename)
+    return tmp_filename
+
+
+class ParquetSink:
+    """
+    Writes batches of row tuples to the Parquet store in forecast_store.py.
+    Rows are buffered per source file and written when the file is done,
+    into part-{file date}.parquet of each date partition they fall in, as
+    with --to_parquet. A date that shows up in several files (e.g. the first
+    forecast of the next day) gets one part per file instead of one part
+    overwriting the other.
+    """
+    def __init__(self, root):
+        import forecast_store
+        self.forecast_store = forecast_store
+        self.root = root
+        self.rows_buffer = []
 
-    new_df = pd.DataFrame.from_dict(new_df, orient='columns')
-    concat_df = pd.concat((df, new_df), axis='index', join='outer')
-    concat_df.to_csv(csv_file)
-    return concat_df
+    def new_files(self, filenames):
+        return list(filenames)
+
+    def filter_items(self, items):
+        return items
+
+    def rows(self, items):
+        return iter_forecast_rows(items)
+
+    def write(self, batch):
+        self.rows_buffer.extend(batch)
+
+    def end_file(self, filename):
+        if self.rows_buffer:
+            df = pd.DataFrame.from_records(self.rows_buffer, columns=FORECAST_COLUMNS)
+            part_name = os.path.basename(filename)[len('forecast-'):-len('.json')]
+            self.forecast_store.write_long(df, part_name, root=self.root)
+        self.rows_buffer = []
+
+    def close(self):
+        pass
+
+
+def stream_forecasts(sink, start_dt=None, end_dt=None, batch_size=10000, increment=86400):
+    """
+    Runs the streaming pipeline over the archived forecast files and writes
+    the rows to `sink` (CsvSink, WideCsvSink or ParquetSink) in batches of
+    `batch_size`, one file at a time.
+
+    Returns:
+        int: Number of rows written
+    """
+    n_rows = 0
+    log = RateLimitedLog()
+    filenames = sink.new_files(iter_forecast_files(start_dt, end_dt, increment))
+    try:
+        for filename in filenames:
+            items = sink.filter_items(iter_forecast_items([ filename ], log))
+            for batch in batched(sink.rows(items), batch_size):
+                sink.write(batch)
+                n_rows += len(batch)
+            sink.end_file(filename)
+    finally:
+        sink.close()
+    logger.info('stream_done files=%d rows=%d', len(filenames), n_rows)
+    return n_rows
+
+
+# ----- Incremental Ingestion -----
+def manifest_filename(csv_file):
+    return f'{csv_file}.manifest.json'
+
+
+def keys_filename(csv_file):
+    return f'{csv_file}.keys'
+
+
+def load_manifest(csv_file):
+    """
+    The manifest records which data/forecast-*.json files have been ingested
+    into `csv_file` (with their mtime, size and sha1) and the number of rows
+    written. The (timestamp, update_timestamp) keys already present are kept
+    in a separate append-only file (see load_keys), so the manifest does not
+    grow with the history.
+
+    A csv without a manifest (e.g. written by an older version) is indexed
+    once (row count and keys) so that ingesting appends to it instead of
+    replacing it.
+
+    Saving the manifest commits the csv and keys files at their current
+    sizes (see save_manifest). Anything appended to them after the last
+    commit, by a run that was interrupted, is truncated away here.
+    """
+    filename = manifest_filename(csv_file)
+    if not os.path.isfile(csv_file):
+        if os.path.isfile(keys_filename(csv_file)):
+            os.remove(keys_filename(csv_file))
+        return {'files': {}, 'rows': 0}
+
+    if os.path.isfile(filename):
+        with open(filename) as f:
+            manifest = json.load(f)
+        rollback_uncommitted(csv_file, manifest)
+        if 'keys' in manifest:
+            # Manifests written before the keys moved to their own file
+            write_keys(csv_file, manifest.pop('keys'), mode='w')
+            save_manifest(csv_file, manifest)
+        return manifest
+
+    try:
+        df = pd.read_csv(csv_file, usecols=['timestamp', 'update_timestamp'], dtype=str)
+    except ValueError as e:
+        raise SystemExit(f'{csv_file} exists but has no timestamp/update_timestamp columns ({e}). '
+                         'Move it away or pass another --file.')
+    keys = df.drop_duplicates()
+    write_keys(csv_file, zip(keys['timestamp'], keys['update_timestamp']), mode='w')
+    manifest = {'files': {}, 'rows': len(df)}
+    save_manifest(csv_file, manifest)
+    print(f'Indexed {len(df)} existing rows of {csv_file}')
+    return manifest
+
+
+def load_keys(csv_file):
+    """
+    Returns the set of (timestamp, update_timestamp) keys already in `csv_file`
+    """
+    filename = keys_filename(csv_file)
+    if not os.path.isfile(filename):
+        return set()
+    with open(filename) as f:
+        return set(tuple(line.rstrip('\n').split('\t')) for line in f if line.strip())
+
+
+def write_keys(csv_file, keys, mode='a'):
+    with open(keys_filename(csv_file), mode) as f:
+        for timestamp, update_timestamp in keys:
+            f.write(f'{timestamp}\t{update_timestamp}\n')
+
+
+def save_manifest(csv_file, manifest, csv_size=None):
+    """
+    Saves the manifest together with the current sizes of the csv and keys
+    files (or `csv_size` for a csv about to be replaced): this is the commit
+    point of everything written to them so far
+    """
+    for key, x in [ ('csv_size', csv_file), ('keys_size', keys_filename(csv_file)) ]:
+        manifest[key] = os.path.getsize(x) if os.path.isfile(x) else 0
+    if csv_size is not None:
+        manifest['csv_size'] = csv_size
+    filename = manifest_filename(csv_file)
+    with open(f'{filename}.tmp', 'w') as f:
+        json.dump(manifest, f)
+    os.replace(f'{filename}.tmp', filename)
+
+
+def rollback_uncommitted(csv_file, manifest):
+    """
+    Truncates the csv and keys files to the sizes recorded at the last
+    commit, dropping rows and keys appended by an interrupted run
+    """
+    for key, x in [ ('csv_size', csv_file), ('keys_size', keys_filename(csv_file)) ]:
+        size = manifest.get(key)
+        if size is not None and os.path.isfile(x) and os.path.getsize(x) > size:
+            logger.warning('rollback file=%s bytes=%d', x, os.path.getsize(x) - size)
+            with open(x, 'r+b') as f:
+                f.truncate(size)
+
+
+def file_sha1(filename):
+    h = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def find_new_forecast_files(manifest, filenames):
+    """
+    Returns the files that are not in the manifest, or whose contents changed
+    since they were ingested. Files are only hashed when their mtime or size
+    differ from the manifest entry.
+    """
+    new_files = []
+    for filename in filenames:
+        st = os.stat(filename)
+        entry = manifest['files'].get(os.path.basename(filename))
+        if entry is not None and entry['mtime'] == st.st_mtime and entry['size'] == st.st_size:
+            continue
+        sha1 = file_sha1(filename)
+        if entry is not None and entry['sha1'] == sha1:
+            entry['mtime'], entry['size'] = st.st_mtime, st.st_size
+            continue
+        new_files.append((filename, {'mtime': st.st_mtime, 'size': st.st_size, 'sha1': sha1}))
+    return new_files
+
+
+def ingest_forecasts(csv_file, start_dt=None, end_dt=None, increment=86400):
+    """
+    Streams the data/forecast-*.json files that have not been ingested yet
+    (or that have changed) into the wide csv `csv_file` (see WideCsvSink),
+    dropping forecasts whose (timestamp, update_timestamp) is already in it.
+    The existing csv is only re-read when a new area adds a column.
+
+    With no start/end dates, every file in data/ is considered.
+
+    Returns:
+        int: Number of rows appended
+    """
+    sink = WideCsvSink(csv_file)
+    n_rows = stream_forecasts(sink, start_dt, end_dt, increment=increment)
+    print(f'{len(sink.entries)} new or changed files, {n_rows} rows appended to {csv_file}')
+    return n_rows
+
+
+
+# ----- Parquet Storage -----
+def export_parquet(root, start_dt=None, end_dt=None, increment=86400):
+    """
+    Converts data/forecast-*.json files into the date-partitioned Parquet
+    store in forecast_store.py (all files if no date range is given).
+    Re-exporting a date overwrites its partition files.
+    """
+    import forecast_store
+
+    filenames = list(iter_forecast_files(start_dt, end_dt, increment))
+
+    n_rows = 0
+    for filename in filenames:
+        with open(filename) as f:
+            data = json.load(f)
+        forecast_data = get_forecast_rows(data)
+        if forecast_data is None:
+            print(f'{filename}: bad formatting, skipped')
+            continue
+        part_name = os.path.basename(filename)[len('forecast-'):-len('.json')]
+        n_rows += forecast_store.write_forecasts(forecast_data, part_name, root=root)
+    print(f'Wrote {n_rows} rows from {len(filenames)} files to {root}')
+    return n_rows
 
 
 
 # ----- Air Temperature -----
-def temperature_main(start_dt, end_dt, csv_file):
-    if os.path.isfile(csv_file):
-        df = pd.read_csv(csv_file, index_col=0)
-    else:
-        df = pd.DataFrame()
+# One reading per station per minute. Each day is fetched, decoded into a long
+# (station_id, timestamp, value) table and written to its own partition of the
+# Parquet store in temperature_store.py, whose manifest records how complete
+# every day is. Days missing from the manifest or incomplete are fetched again
+# on the next run.
+TEMPERATURE_COLUMNS = ('station_id', 'timestamp', 'value')
 
-    datetime_array = get_datetime_array(start_dt, end_dt)
-    new_df = []
-    for x in datetime_array:
-        date_time = x.isoformat()
-        data = get_temperature_json(date_time)
-        print(json.dumps(data, indent=2, default=str))
-        time.sleep(1)
 
-    new_df = pd.DataFrame(new_df)
-    concat_df = pd.concat((df, new_df), axis='index', join='outer')
-    concat_df.to_csv(csv_file)
-    return concat_df
+def get_temperature_stations(data):
+    stations = []
+    for station in data.get('metadata', {}).get('stations', []):
+        location = station.get('location', {})
+        stations.append({
+            'station_id': station['id'],
+            'name': station.get('name'),
+            'latitude': location.get('latitude'),
+            'longitude': location.get('longitude')
+        })
+    return stations
+
+
+def get_temperature_rows(data):
+    """
+    Decodes an air-temperature response into a long DataFrame with one row
+    per (station_id, timestamp, value), or None if it has no items
+    """
+    if 'items' not in data:
+        return None
+    station_ids, timestamps, values = [], [], []
+    for item in data['items']:
+        timestamp = item.get('timestamp')
+        for reading in item.get('readings', []):
+            station_ids.append(reading['station_id'])
+            timestamps.append(timestamp)
+            values.append(reading.get('value'))
+    return pd.DataFrame({'station_id': station_ids, 'timestamp': timestamps,
+                         'value': pd.to_numeric(pd.Series(values, dtype='object'), errors='coerce')},
+                        columns=TEMPERATURE_COLUMNS)
+
+
+def ingest_temperature_day(date, bucket, max_retries, root):
+    """
+    Fetches, decodes and stores one day of readings.
+    Returns (stations, completeness), or None if the day could not be fetched.
+    """
+    import temperature_store
+
+    data = fetch_day('environment/air-temperature', date, bucket, max_retries=max_retries)
+    if data is None:
+        return None
+    df = get_temperature_rows(data)
+    if df is None:
+        logger.warning('bad_payload date=%s keys=%s', date, sorted(data)[:5])
+        return None
+    temperature_store.write_readings(df, date, root=root)
+    completeness = temperature_store.day_completeness(df.dropna(subset=['value']))
+    completeness['fetched'] = time.time()
+    return get_temperature_stations(data), completeness
+
+
+def ingest_temperatures(start_dt, end_dt, root='data/temperature', workers=4, rate=2.0, max_retries=3, refetch=False):
+    """
+    Downloads the air temperature readings of every day in the range into the
+    Parquet store at `root`, using a pool of `workers` threads sharing a token
+    bucket limited to `rate` requests/second.
+
+    Days that are already complete are skipped (unless `refetch` is True), so
+    re-running the same command resumes an interrupted run and fills the gaps.
+
+    Returns:
+        list: Dates that are still missing or incomplete
+    """
+    import temperature_store
+
+    dates = [ x.strftime('%Y-%m-%d') for x in get_datetime_array(start_dt, end_dt) ]
+    manifest = temperature_store.load_manifest(root)
+    todo = dates if refetch else temperature_store.incomplete_dates(dates, manifest)
+    print(f'{len(dates) - len(todo)} of {len(dates)} days already complete (or empty). Fetching {len(todo)} days.')
+
+    bucket = TokenBucket(rate)
+    stations = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = { executor.submit(ingest_temperature_day, date, bucket, max_retries, root): date for date in todo }
+        for i, future in enumerate(as_completed(futures)):
+            date = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f'{date}: {e}')
+                result = None
+            if result is not None:
+                for station in result[0]:
+                    stations[station['station_id']] = station
+                manifest[date] = result[1]
+            if (i + 1) % 50 == 0:
+                temperature_store.save_manifest(manifest, root)
+                print(f'{i + 1}/{len(todo)} days done')
+
+    if stations:
+        temperature_store.update_stations(list(stations.values()), root)
+    temperature_store.save_manifest(manifest, root)
+
+    gaps = temperature_store.incomplete_dates(dates, manifest)
+    if gaps:
+        print(f'{len(gaps)} days missing or incomplete: {gaps}. Re-run to retry them.')
+    return gaps
+
+
+def temperature_main(start_dt, end_dt, csv_file=None, **kwargs):
+    """
+    Deprecated: use ingest_temperatures(), which takes the Parquet store
+    directory as its third argument. This keeps the old signature: the
+    readings are ingested into the store (keyword arguments are passed on)
+    and, if `csv_file` is given, the readings of the range are also written
+    to it as a long-format csv.
+
+    Returns:
+        list: Dates that are still missing or incomplete
+    """
+    import temperature_store
+
+    warnings.warn('temperature_main() is deprecated, use ingest_temperatures()', DeprecationWarning, stacklevel=2)
+    gaps = ingest_temperatures(start_dt, end_dt, **kwargs)
+    if csv_file is not None:
+        dates = get_datetime_array(start_dt, end_dt)
+        df = temperature_store.read_readings(kwargs.get('root', temperature_store.DEFAULT_ROOT), dates[0], dates[-1])
+        df.to_csv(csv_file, index=False)
+    return gaps
+
+
+
+# ----- PSI / PM2.5 / UV -----
+# Hourly readings by region and metric. Each day is fetched and decoded in a
+# worker thread; the main thread writes the readings into the dense per-year
+# arrays of air_quality_store.py and saves them, with the per-day manifest
+# used to skip complete days (and re-fetch incomplete ones) on the next run.
+def fetch_air_quality_day(feed, date, bucket, max_retries):
+    """
+    Fetches and decodes one day of `feed` ('psi', 'pm25' or 'uv').
+    Returns the decoded arrays (see air_quality_store.decode), or None.
+    """
+    import air_quality_store
+
+    data = fetch_day(air_quality_store.FEEDS[feed]['endpoint'], date, bucket, max_retries=max_retries)
+    if data is None:
+        return None
+    if 'items' not in data:
+        logger.warning('bad_payload feed=%s date=%s keys=%s', feed, date, sorted(data)[:5])
+        return None
+    return air_quality_store.decode(feed, data)
+
+
+def air_quality_main(start_dt, end_dt, feeds=('psi', 'pm25', 'uv'), root='data/air-quality',
+                     workers=4, rate=2.0, max_retries=3, refetch=False, save_every=100):
+    """
+    Downloads the PSI, PM2.5 and UV index readings of every day in the range
+    into the arrays at `root`, using a pool of `workers` threads sharing a
+    token bucket limited to `rate` requests/second.
+
+    Days that are already complete are skipped (unless `refetch` is True), so
+    a backfill can be resumed, and running it again up to today only fetches
+    the days since the last run. Past days whose gaps persist after
+    air_quality_store.MAX_ATTEMPTS fetches are skipped as well.
+
+    Returns:
+        dict: {feed: dates that are still missing or incomplete and will be
+            retried}
+    """
+    import air_quality_store
+
+    dates = [ x.strftime('%Y-%m-%d') for x in get_datetime_array(start_dt, end_dt) ]
+    manifest = air_quality_store.load_manifest(root)
+    todo = []
+    for feed in feeds:
+        feed_dates = dates if refetch else air_quality_store.incomplete_dates(feed, dates, manifest)
+        print(f'{feed}: {len(dates) - len(feed_dates)} of {len(dates)} days already complete (or given up on). Fetching {len(feed_dates)} days.')
+        todo.extend((feed, date) for date in feed_dates)
+
+    def save(arrays):
+        for (feed, year), values in arrays.items():
+            air_quality_store.save_year(feed, year, values, root)
+        air_quality_store.save_manifest(manifest, root)
+
+    bucket = TokenBucket(rate)
+    arrays = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = { executor.submit(fetch_air_quality_day, feed, date, bucket, max_retries): (feed, date)
+                    for feed, date in todo }
+        for i, future in enumerate(as_completed(futures)):
+            feed, date = futures[future]
+            try:
+                decoded = future.result()
+            except Exception as e:
+                print(f'{feed} {date}: {e}')
+                decoded = None
+            if decoded is not None:
+                air_quality_store.apply(arrays, feed, decoded, root)
+                hours = air_quality_store.hours_by_date(decoded).get(date, 0)
+                air_quality_store.record(manifest, feed, date, hours, time.time())
+            if (i + 1) % save_every == 0:
+                save(arrays)
+                print(f'{i + 1}/{len(todo)} days done')
+    save(arrays)
+
+    gaps = { feed: air_quality_store.incomplete_dates(feed, dates, manifest) for feed in feeds }
+    for feed, feed_gaps in gaps.items():
+        if feed_gaps:
+            print(f'{feed}: {len(feed_gaps)} days missing or incomplete: {feed_gaps}. Re-run to retry them.')
+    return gaps
 
 
 
@@ -209,13 +1002,43 @@ if __name__ == '__main__':
     parser.add_argument('--end', default='2024-01-07')
     parser.add_argument('--file', default='forecasts.csv')
     parser.add_argument('--get_forecasts', action='store_true')
+    parser.add_argument('--backfill_forecasts', action='store_true', help='Concurrent, resumable version of --get_forecasts')
+    parser.add_argument('--workers', type=int, default=4, help='Number of download threads for --backfill_forecasts, --get_temperature and --get_air_quality')
+    parser.add_argument('--rate', type=float, default=2.0, help='Maximum requests per second for --backfill_forecasts, --get_temperature and --get_air_quality')
+    parser.add_argument('--retries', type=int, default=3, help='Retries per day for --backfill_forecasts, --get_temperature and --get_air_quality')
     parser.add_argument('--parse_forecasts', action='store_true')
+    parser.add_argument('--incremental', action='store_true', help='Ignored: --parse_forecasts always only ingests new data/forecast-*.json files')
+    parser.add_argument('--to_parquet', action='store_true', help='Convert data/forecast-*.json files to date-partitioned Parquet')
+    parser.add_argument('--stream_forecasts', choices=['csv', 'parquet'], help='Stream data/forecast-*.json files to a long-format csv (--long_file) or Parquet (--parquet_dir) in bounded memory')
+    parser.add_argument('--long_file', default='forecasts-long.csv', help='Long-format csv written by --stream_forecasts csv')
+    parser.add_argument('--batch_size', type=int, default=10000)
+    parser.add_argument('--parquet_dir', default='data/parquet')
+    parser.add_argument('--get_temperature', action='store_true', help='Download air temperature readings to --temperature_dir, skipping complete days')
+    parser.add_argument('--temperature_dir', default='data/temperature')
+    parser.add_argument('--refetch', action='store_true', help='With --get_temperature or --get_air_quality, also fetch days that are already complete')
+    parser.add_argument('--get_air_quality', action='store_true', help='Download PSI, PM2.5 and UV index readings to --air_quality_dir, skipping complete days')
+    parser.add_argument('--air_quality_feeds', default='psi,pm25,uv')
+    parser.add_argument('--air_quality_dir', default='data/air-quality')
     args = parser.parse_args()
 
+    logging.basicConfig(format='%(asctime)s %(levelname)s %(name)s %(message)s', level=logging.INFO)
     start_dt = datetime.datetime.strptime(args.start, '%Y-%m-%d')
     end_dt = datetime.datetime.strptime(args.end, '%Y-%m-%d')
 
     if args.get_forecasts:
         get_forecasts(start_dt, end_dt)
+    if args.backfill_forecasts:
+        backfill_forecasts(start_dt, end_dt, workers=args.workers, rate=args.rate, max_retries=args.retries)
     if args.parse_forecasts:
         parse_forecasts(args.file, start_dt, end_dt)
+    if args.to_parquet:
+        export_parquet(args.parquet_dir, start_dt, end_dt)
+    if args.stream_forecasts:
+        sink = CsvSink(args.long_file) if args.stream_forecasts == 'csv' else ParquetSink(args.parquet_dir)
+        stream_forecasts(sink, start_dt, end_dt, batch_size=args.batch_size)
+    if args.get_temperature:
+        ingest_temperatures(start_dt, end_dt, args.temperature_dir, workers=args.workers, rate=args.rate,
+                            max_retries=args.retries, refetch=args.refetch)
+    if args.get_air_quality:
+        air_quality_main(start_dt, end_dt, args.air_quality_feeds.split(','), args.air_quality_dir,
+                         workers=args.workers, rate=args.rate, max_retries=args.retries, refetch=args.refetch)
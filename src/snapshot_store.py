@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+
+# Shared local store for the latest snapshot of every NEA feed.
+#
+# nea_poller.py is the only writer: it fetches each feed on NEA's publishing
+# schedule and puts the response here. Readers (lib_nea, nea_tools and the
+# agent tools) get it from the store instead of data.gov.sg, so upstream load
+# stays the same however many readers run.
+#
+# The store is a SQLite database in WAL mode, so readers in other processes
+# never block the poller or each other. Each reader keeps the parsed object
+# of the last version it read, so an unchanged snapshot is not parsed again.
+#
+# Readers only use the store when NEA_SNAPSHOT_DB is set (see default_store),
+# and fall back to the network when a snapshot is missing or has expired
+# (e.g. the poller is not running).
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+def default_db_file():
+    return os.getenv('NEA_SNAPSHOT_DB')
+
+
+class SnapshotStore:
+    """
+    Latest snapshot per feed, in a SQLite database in WAL mode.
+
+    Args:
+        db_file (str): Path to the SQLite database
+    """
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self.stats = {'hits': 0, 'parsed': 0, 'stale': 0, 'misses': 0, 'writes': 0}
+        self._parsed = {}
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_file, check_same_thread=False, timeout=10)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS snapshots ('
+            ' feed TEXT PRIMARY KEY,'
+            ' url TEXT,'
+            ' version TEXT,'
+            ' fetched REAL NOT NULL,'
+            ' expires REAL NOT NULL,'
+            ' body TEXT NOT NULL)'
+        )
+        self._db.commit()
+
+    def __repr__(self):
+        return f'SnapshotStore({self.db_file!r})'
+
+    def put(self, feed, data, expires, url=None, version=None):
+        """
+        Stores `data` (parsed json) as the latest snapshot of `feed`, valid
+        until `expires` (epoch seconds)
+        """
+        body = json.dumps(data, separators=(',', ':'))
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?, ?, ?)',
+                (feed, url, version, time.time(), expires, body)
+            )
+            self._db.commit()
+            self.stats['writes'] += 1
+
+    def touch(self, feed, expires):
+        """
+        Extends the validity of the current snapshot of `feed`, when a poll
+        found it unchanged
+        """
+        with self._lock:
+            self._db.execute('UPDATE snapshots SET expires = ? WHERE feed = ?', (expires, feed))
+            self._db.commit()
+
+    def get(self, feed, allow_stale=False):
+        """
+        Returns the latest snapshot of `feed` (parsed json), or None if there
+        is none or it has expired (unless allow_stale is True).
+        The returned object is shared between callers: do not modify it.
+        """
+        with self._lock:
+            row = self._db.execute('SELECT fetched, expires FROM snapshots WHERE feed = ?', (feed,)).fetchone()
+            if row is None:
+                self.stats['misses'] += 1
+                return None
+            fetched, expires = row
+            if expires <= time.time() and not allow_stale:
+                self.stats['stale'] += 1
+                return None
+
+            cached = self._parsed.get(feed)
+            if cached is not None and cached[0] == fetched:
+                self.stats['hits'] += 1
+                return cached[1]
+
+            row = self._db.execute('SELECT fetched, body FROM snapshots WHERE feed = ?', (feed,)).fetchone()
+            if row is None:
+                self.stats['misses'] += 1
+                return None
+            data = json.loads(row[1])
+            self._parsed[feed] = (row[0], data)
+            self.stats['parsed'] += 1
+            return data
+
+    def feeds(self):
+        """
+        Returns {feed: {'url', 'version', 'fetched', 'expires'}} for every stored feed
+        """
+        with self._lock:
+            rows = self._db.execute('SELECT feed, url, version, fetched, expires FROM snapshots ORDER BY feed').fetchall()
+        return { feed: {'url': url, 'version': version, 'fetched': fetched, 'expires': expires}
+                 for feed, url, version, fetched, expires in rows }
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_default_store = None
+_default_lock = threading.Lock()
+
+
+def default_store():
+    """
+    Returns the SnapshotStore at $NEA_SNAPSHOT_DB, or None if it is not set
+    """
+    global _default_store
+    db_file = default_db_file()
+    if not db_file:
+        return None
+    with _default_lock:
+        if _default_store is None or _default_store.db_file != db_file:
+            _default_store = SnapshotStore(db_file)
+    return _default_store
+
+
+def get_snapshot(feed):
+    """
+    Returns the live snapshot of `feed` from the default store, or None
+    (no store configured, no snapshot, expired, or the store is unreadable)
+    """
+    store = default_store()
+    if store is None:
+        return None
+    try:
+        return store.get(feed)
+    except sqlite3.Error as e:
+        print(f'Snapshot store error ({store.db_file}): {e}')
+        return None
@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+
+# Columnar storage for historical air temperature readings.
+#
+# The air-temperature feed has one reading per station per minute. Readings
+# are stored in long format (station_id, timestamp, value) as date-partitioned
+# Parquet files, next to a table of the stations and a completeness manifest:
+#
+#   data/temperature/readings/date=2024-01-01/part-2024-01-01.parquet
+#   data/temperature/stations.parquet
+#   data/temperature/completeness.json
+#
+# Station ids are dictionary-encoded, timestamps are real timestamp columns and
+# values are float32, so a station-year is a few MB and loads without parsing.
+# The manifest records, for every fetched date, how many of the day's minutes
+# have readings, so that incomplete days can be fetched again. Days NEA has no
+# readings for are recorded with zero coverage and not fetched again.
+
+import datetime
+import json
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+
+DEFAULT_ROOT = 'data/temperature'
+TIMEZONE = 'Asia/Singapore'
+MINUTES_PER_DAY = 1440
+COMPLETE_COVERAGE = 0.95        # fraction of the day's minutes needed for a day to count as complete
+
+schema = pa.schema([
+    ('station_id', pa.dictionary(pa.int16(), pa.string())),
+    ('timestamp', pa.timestamp('s', tz=TIMEZONE)),
+    ('value', pa.float32()),
+])
+
+station_schema = pa.schema([
+    ('station_id', pa.string()),
+    ('name', pa.string()),
+    ('latitude', pa.float64()),
+    ('longitude', pa.float64()),
+])
+
+partitioning = ds.partitioning(pa.schema([('date', pa.string())]), flavor='hive')
+
+
+# ----- Write -----
+def readings_dir(root=DEFAULT_ROOT):
+    return os.path.join(root, 'readings')
+
+
+def write_readings(df, date, root=DEFAULT_ROOT):
+    """
+    Writes the readings of one date (a long DataFrame with the columns of
+    `schema`, timestamps as ISO 8601 strings or datetimes) to its partition,
+    replacing what was there
+
+    Returns:
+        int: Number of readings written
+    """
+    df = df.copy()
+    if not pd.api.types.is_datetime64_any_dtype(df['timestamp']):
+        df['timestamp'] = pd.to_datetime(df['timestamp'], utc=True, errors='coerce')
+    df['timestamp'] = df['timestamp'].dt.tz_convert(TIMEZONE).dt.floor('s')
+    df = df.dropna(subset=['timestamp', 'value']) \
+        .drop_duplicates(subset=['station_id', 'timestamp']) \
+        .sort_values(['station_id', 'timestamp'])
+    # An empty frame has no dtype to go by (station_id comes out as float64)
+    table = pa.Table.from_pandas(df.astype({'station_id': str}), schema=schema, preserve_index=False) \
+        if len(df) else schema.empty_table()
+
+    directory = os.path.join(readings_dir(root), f'date={date}')
+    os.makedirs(directory, exist_ok=True)
+    filename = os.path.join(directory, f'part-{date}.parquet')
+    # Dot-files are ignored by pyarrow.dataset, so readers never see a half-written file
+    tmp_filename = os.path.join(directory, f'.part-{date}.parquet.tmp')
+    pq.write_table(table, tmp_filename)
+    os.replace(tmp_filename, filename)
+    return len(df)
+
+
+def stations_filename(root=DEFAULT_ROOT):
+    return os.path.join(root, 'stations.parquet')
+
+
+def read_stations(root=DEFAULT_ROOT):
+    filename = stations_filename(root)
+    if not os.path.isfile(filename):
+        return pd.DataFrame(columns=station_schema.names)
+    return pq.read_table(filename).to_pandas()
+
+
+def update_stations(stations, root=DEFAULT_ROOT):
+    """
+    Adds new stations (and the latest name / location of known ones) to the
+    station table. `stations` is a list of dicts with the fields of station_schema.
+    """
+    df = pd.concat([ read_stations(root), pd.DataFrame(stations, columns=station_schema.names) ])
+    df = df.drop_duplicates(subset=['station_id'], keep='last').sort_values('station_id')
+    os.makedirs(root, exist_ok=True)
+    filename = stations_filename(root)
+    tmp_filename = filename + '.tmp'
+    pq.write_table(pa.Table.from_pandas(df, schema=station_schema, preserve_index=False), tmp_filename)
+    os.replace(tmp_filename, filename)
+
+
+# ----- Completeness -----
+def manifest_filename(root=DEFAULT_ROOT):
+    return os.path.join(root, 'completeness.json')
+
+
+def load_manifest(root=DEFAULT_ROOT):
+    """
+    Returns {date: {'readings', 'stations', 'minutes', 'coverage', 'complete', 'fetched'}}
+    """
+    filename = manifest_filename(root)
+    if not os.path.isfile(filename):
+        return {}
+    with open(filename) as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, root=DEFAULT_ROOT):
+    os.makedirs(root, exist_ok=True)
+    filename = manifest_filename(root)
+    tmp_filename = filename + '.tmp'
+    with open(tmp_filename, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_filename, filename)
+
+
+def day_completeness(df):
+    """
+    Summarizes how complete one day of readings is: the number of readings
+    and stations, and the fraction of the day's minutes that have a reading
+    """
+    minutes = int(df['timestamp'].nunique()) if len(df) else 0
+    coverage = minutes / MINUTES_PER_DAY
+    return {
+        'readings': int(len(df)),
+        'stations': int(df['station_id'].nunique()) if len(df) else 0,
+        'minutes': minutes,
+        'coverage': round(coverage, 4),
+        'complete': coverage >= COMPLETE_COVERAGE
+    }
+
+
+def is_done(date, entry):
+    """
+    A day is done when it is complete, or when it had no readings at all
+    although it was already over when it was fetched (NEA has no data for it)
+    """
+    if entry is None:
+        return False
+    if entry.get('complete'):
+        return True
+    fetched = datetime.date.fromtimestamp(entry.get('fetched', 0)).isoformat()
+    return entry.get('readings') == 0 and date < fetched
+
+
+def incomplete_dates(dates, manifest):
+    """
+    Returns the dates that were never fetched or were incomplete
+    """
+    return [ date for date in dates if not is_done(date, manifest.get(date)) ]
+
+
+# ----- Read -----
+def to_date_str(x):
+    if x is None or isinstance(x, str):
+        return x
+    return x.strftime('%Y-%m-%d')
+
+
+def read_readings(root=DEFAULT_ROOT, start=None, end=None, stations=None, columns=None):
+    """
+    Reads the readings between `start` and `end` (inclusive dates, as
+    datetime, date or 'YYYY-MM-DD'), optionally only for the given `stations`.
+
+    Returns:
+        pd.DataFrame: Long-format readings, with a categorical station_id column
+    """
+    directory = readings_dir(root)
+    if not os.path.isdir(directory):
+        return pd.DataFrame(columns=schema.names)
+
+    expr = None
+    for condition in [
+        ds.field('date') >= to_date_str(start) if start is not None else None,
+        ds.field('date') <= to_date_str(end) if end is not None else None,
+        ds.field('station_id').isin(list(stations)) if stations is not None else None,
+    ]:
+        if condition is not None:
+            expr = condition if expr is None else expr & condition
+
+    dataset = ds.dataset(directory, format='parquet', partitioning=partitioning,
+                         schema=schema.append(pa.field('date', pa.string())))
+    return dataset.to_table(columns=columns or schema.names, filter=expr).to_pandas()
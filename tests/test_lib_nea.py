@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+
+# Offline checks of src/lib_nea.py
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+import lib_nea
+import nea_model
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('Thundery Showers', '⛈'),
+    ('Heavy Thundery Showers', '⛈'),
+    ('Heavy Thundery Showers with Gusty Winds', '⛈💨'),
+    ('Partly Cloudy', '⛅'),
+    ('Partly Cloudy (Night)', '⛅'),
+    ('Cloudy', '☁️'),
+    ('Fair', '🌤'),
+    ('Fair (Night)', '🌙'),
+    ('Fair & Warm', '☀️'),
+    ('Windy', '💨'),
+    ('Windy, Cloudy', '💨, ☁️'),
+    ('Light Rain', '🌦'),
+    ('Moderate Rain', '🌧'),
+    ('Slightly Hazy', '🌫'),
+    ('Thundery Showers over the west', '⛈ over the west'),
+])
+def test_emojify(text, expected):
+    assert lib_nea.emojify(text) == expected
+
+
+def test_emojify_covers_the_vocabulary():
+    for abbr, text in nea_model.FORECAST_CONDITIONS:
+        assert lib_nea.emojify(text) == lib_nea.CONDITION_EMOJI[abbr], text
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+# Offline checks of src/nea_model.py against the benchmark fixtures
+
+import copy
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from benchmarks.common import load_fixture
+from nea_model import ForecastSnapshot, REGIONS, RegionForecastSnapshot, area_table
+
+
+def expected_records(data):
+    """
+    The list of dicts nea_tools.convert_weather_data() returned before snapshots
+    """
+    item = data['data']['items'][0]
+    forecasts = { x['area']: x['forecast'] for x in item['forecasts'] }
+    return [ {'location_name': area['name'], 'latitude': area['label_location']['latitude'],
+              'longitude': area['label_location']['longitude'], 'forecast': forecasts[area['name']],
+              'start': item['valid_period']['start'], 'end': item['valid_period']['end']}
+             for area in data['data']['area_metadata'] if forecasts.get(area['name']) is not None ]
+
+
+def expected_dict(record):
+    """
+    The dict nea_tools.organize_weather_by_region() returned before snapshots
+    """
+    result = {
+        'timestamp': record.get('timestamp'),
+        'date': record.get('date'),
+        'updatedTimestamp': record.get('updatedTimestamp'),
+        'general': record.get('general', {}),
+        'regions': { region: {'forecasts': []} for region in REGIONS }
+    }
+    for period in record.get('periods', []):
+        for region in REGIONS:
+            if region in period.get('regions', {}):
+                result['regions'][region]['forecasts'].append(
+                    {'timePeriod': period.get('timePeriod', {}), 'forecast': period['regions'][region]})
+    return result
+
+
+def to_records(data):
+    return ForecastSnapshot.from_item(area_table(data['data']['area_metadata']), data['data']['items'][0]).to_records()
+
+
+def test_2hr_records_round_trip():
+    data = load_fixture('2hr-realtime.json')
+    assert to_records(data) == expected_records(data)
+
+
+def test_2hr_records_keep_published_strings():
+    """
+    Timestamps in another offset or with fractional seconds, abbreviations and
+    unknown conditions come back as published
+    """
+    data = copy.deepcopy(load_fixture('2hr-realtime.json'))
+    item = data['data']['items'][0]
+    item['valid_period'] = {'start': '2024-07-10T06:00:00.250Z', 'end': '2024-07-10T08:00:00Z'}
+    item['forecasts'][0]['forecast'] = 'TL'
+    item['forecasts'][1]['forecast'] = 'Partly Cloudy'
+    item['forecasts'][2]['forecast'] = 'Sleet'
+    records = to_records(data)
+    assert records == expected_records(data)
+    assert records[0]['start'] == '2024-07-10T06:00:00.250Z'
+
+
+def test_24hr_dict_round_trip():
+    record = load_fixture('24hr-realtime.json')['data']['records'][0]
+    assert RegionForecastSnapshot.from_record(record).to_dict() == expected_dict(record)
+
+
+def test_24hr_dict_keeps_published_values():
+    record = copy.deepcopy(load_fixture('24hr-realtime.json')['data']['records'][0])
+    record['timestamp'] = '2024-07-10T06:00:00.5Z'
+    record['updatedTimestamp'] = '2024-07-10T14:00:00+07:00'
+    periods = record['periods']
+    periods[0]['timePeriod']['extra'] = 'kept'
+    regions = periods[0]['regions']
+    regions['west'] = {'code': 'XX', 'text': 'Thundery Showers'}
+    regions['east'] = 'Thundery Showers'
+    regions['north'] = None
+    del regions['south']
+    snapshot = RegionForecastSnapshot.from_record(record)
+    assert snapshot.to_dict() == expected_dict(record)
+    assert snapshot.timestamp == 1720591200
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+
+# Offline checks of mcp/nea_tools.py against the benchmark fixtures
+# (HTTP is stubbed by benchmarks/common.py). Skipped when the mcp
+# dependencies (strands, numpy) are not installed.
+
+import math
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from benchmarks.common import SkipNotImplemented, import_nea_tools, load_fixture, random_points
+
+
+@pytest.fixture(scope='module')
+def nea_tools():
+    pytest.importorskip('numpy')
+    try:
+        return import_nea_tools()
+    except SkipNotImplemented as e:
+        pytest.skip(str(e))
+
+
+def test_batch_regions_and_areas_match_scalar(nea_tools):
+    """
+    get_regions_and_areas_from_coordinates() gives the same region, nearest
+    area and distances as the scalar functions
+    """
+    weather_data_2hr = nea_tools.convert_weather_data(load_fixture('2hr-realtime.json'))
+    points = random_points(2000)
+    latitudes = [ lat for lat, lon in points ]
+    longitudes = [ lon for lat, lon in points ]
+    batch = nea_tools.get_regions_and_areas_from_coordinates(latitudes, longitudes, weather_data_2hr)
+
+    for k, (lat, lon) in enumerate(points):
+        region = nea_tools.get_region_from_coordinates(lat, lon)
+        coords = nea_tools.region_coordinates[region]
+        assert batch['region'][k] == region, (lat, lon)
+        assert math.isclose(batch['region_distance'][k],
+                            nea_tools.haversine_distance(lat, lon, coords['latitude'], coords['longitude']),
+                            rel_tol=1e-9, abs_tol=1e-9)
+
+        area_distances = [ nea_tools.haversine_distance(lat, lon, float(location['latitude']), float(location['longitude']))
+                           for location in weather_data_2hr ]
+        i = min(range(len(area_distances)), key=area_distances.__getitem__)
+        assert math.isclose(batch['area_distance'][k], area_distances[i], rel_tol=1e-9, abs_tol=1e-9)
+        assert batch['area'][k] == weather_data_2hr[i]['location_name'], (lat, lon)
+
+
+def test_batch_without_areas(nea_tools):
+    batch = nea_tools.get_regions_and_areas_from_coordinates([ 1.3 ], [ 103.8 ], [])
+    assert batch['area'][0] is None
+    assert batch['region'][0] == nea_tools.get_region_from_coordinates(1.3, 103.8)